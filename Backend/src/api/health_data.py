@@ -1,16 +1,23 @@
-import joblib
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+import functools
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 import logging
 from pydantic import BaseModel, Field, ConfigDict
 import pickle
 import numpy as np
 
 from sklearn.preprocessing import StandardScaler
-from typing import Dict, Annotated, List
+from typing import Dict, Annotated, List, Literal, Optional, Tuple
 import os
-import pandas as pd
+from src.core.config import settings
 from src.core.database import db
-from src.auth.utils import get_current_user
+from src.core.metrics import stage_timer
+from src.ml.batcher import MicroBatcher, QueueFullError
+from src.ml.cache import PredictionCache, canonical_key
+from src.ml.executor import InferenceExecutor, ExecutorBusyError, limit_native_threads
+from src.ml.inference import AGE_ENCODING, build_feature_matrix, explain_risk
+from src.ml.registry import ModelRegistry, ModelVersion
+from src.auth.utils import get_current_admin, get_current_user
 from src.models.user import User
 from src.models.prediction import Prediction, PredictionCreate
 from datetime import datetime
@@ -22,38 +29,20 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Initialize model variables
-model = None
-scaler = None
-feature_names = None
-
-try:
-    model_path = './src/ml/models/diaHealth_012.joblib'
-    if not os.path.exists(model_path):
-        logger.warning(f"Model file not found at {model_path}. Please run the training script first.")
-    else:
-        logger.info(f"NumPy version: {np.__version__}")
-        logger.info("Loading model file...")
-        
-        with open(model_path, 'rb') as f:
-            model_data = joblib.load(f)
-            
-        model = model_data['model']
-        scaler = model_data['scaler']
-        feature_names = model_data['feature_names']
-        
-        logger.info("Model components loaded successfully")
-        logger.info(f"Feature names: {feature_names}")
-        logger.info(f"Model type: {type(model)}")
+# Keep BLAS/OpenMP pools small so concurrent inference jobs don't oversubscribe the CPU
+limit_native_threads(settings.INFERENCE_NATIVE_THREADS)
 
-
-    
-except Exception as e:
-    logger.error(f"Error in model initialization: {str(e)}")
-    logger.error(f"Error type: {type(e)}")
-    model = None
-    scaler = None
-    feature_names = None
+# Serves the latest (or pinned) versioned artifact from the models directory;
+# loading starts in the app lifespan so it doesn't block startup
+model_registry = ModelRegistry(
+    settings.MODELS_DIR,
+    engine=settings.INFERENCE_ENGINE,
+    table_max_error=settings.RISK_TABLE_MAX_ERROR,
+    native_threads=settings.INFERENCE_NATIVE_THREADS,
+    poll_seconds=settings.MODEL_REGISTRY_POLL_SECONDS,
+    keep_loaded=settings.MODEL_REGISTRY_KEEP_LOADED,
+    explain=settings.PREDICTION_EXPLANATIONS_ENABLED
+)
 
 class HealthDataInput(BaseModel):
     model_config = ConfigDict(title="Health Data Input")
@@ -62,81 +51,171 @@ class HealthDataInput(BaseModel):
     Stroke: Annotated[int, Field(ge=0, le=1)]
     HeartDiseaseorAttack: Annotated[int, Field(ge=0, le=1)]
     Sex: Annotated[int, Field(ge=0, le=1)]
-    Age: Annotated[int, Field(ge=1, le=120)]
+    Age: Annotated[int, Field(ge=1, le=120, description="Age in years; scored as its BRFSS 5-year age group (under 18 as 18-24)")]
 
 class RiskPredictionResponse(BaseModel):
-    model_config = ConfigDict(title="Risk Prediction Response")
+    model_config = ConfigDict(title="Risk Prediction Response", protected_namespaces=())
     
+    id: Annotated[Optional[str], Field(description="Id of the stored prediction, as listed by /predictions")] = None
     risk_probability: Annotated[float, Field(description="Probability of having diabetes (0-1)")]
     risk_level: Annotated[str, Field(description="Risk level classification (No Diabetes, Prediabetes, or Diabetes)")]
     confidence_score: Annotated[float, Field(description="Model's confidence in the prediction (0-1)")]
-    feature_importance: Annotated[Dict[str, float], Field(description="Importance score of each feature in the prediction")]
+    feature_importance: Annotated[Dict[str, float], Field(description="Contribution of each feature to risk_probability for this prediction (TreeSHAP), largest magnitude first")]
+    baseline_risk_probability: Annotated[Optional[float], Field(description="Model's average risk_probability; adding all feature contributions to it gives risk_probability")] = None
+    model_version: Annotated[Optional[str], Field(description="Model version that produced the prediction")] = None
+    tier: Annotated[Optional[str], Field(description="Model tier that produced the prediction: full ensemble or fast distilled student")] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+RISK_LEVELS = ["No Diabetes", "Prediabetes", "Diabetes"]
+MAX_BATCH_SIZE = 10000
+
+# "full" runs the ensemble; "fast" runs the version's distilled student when it has one
+TIERS = ("full", "fast")
+Tier = Literal["full", "fast"]
+TierQuery = Query(
+    description="full: the ensemble; fast: the distilled single-model student (lower latency, "
+                "slightly less accurate). Falls back to full if the served version has no student."
+)
+
+# (model version, tier served, class probabilities, per-feature contributions or None)
+Scored = Tuple[ModelVersion, str, np.ndarray, Optional[np.ndarray]]
+
+def score_features(features: np.ndarray, tier: str = "full") -> Scored:
+    """
+    Run the raw feature matrix through the requested tier of the currently
+    served model version in one probability pass and explain all rows in one
+    batch. The version and tier are returned with the result, so a request
+    that started before a hot-swap still reports the model that scored it.
+    """
+    model = model_registry.current
+    served_tier, prepared = model.tier(tier)
+    probabilities = prepared.predict_proba(features)
+    contributions = prepared.explain(features) if settings.PREDICTION_EXPLANATIONS_ENABLED else None
+    return model, served_tier, probabilities, contributions
+
+def summarize_probabilities(probabilities: np.ndarray):
+    """Return (risk_probability, risk_level, confidence_score) for one row of class probabilities."""
+    risk_level = RISK_LEVELS[int(np.argmax(probabilities))]
+    confidence_score = float(np.max(probabilities))
+    # Probability for class 2 (Diabetes)
+    risk_probability = float(probabilities[2])
+    return risk_probability, risk_level, confidence_score
+
+# Runs inference off the event loop on a bounded thread pool
+executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue_depth=settings.INFERENCE_MAX_QUEUE_DEPTH,
+    timeout_seconds=settings.INFERENCE_TIMEOUT_SECONDS
+)
+
+async def run_scoring(features: np.ndarray, tier: str = "full") -> Scored:
+    """Score a raw feature matrix on the inference executor."""
+    return await executor.run(score_features, features, tier)
+
+async def run_batched_scoring(features: np.ndarray, tier: str = "full") -> List[Scored]:
+    """Score a micro-batch, pairing every output row with the model version and tier that produced it."""
+    model, served_tier, probabilities, contributions = await run_scoring(features, tier)
+    return [
+        (model, served_tier, probabilities[i], None if contributions is None else contributions[i])
+        for i in range(len(probabilities))
+    ]
+
+# Coalesce concurrent /predict calls into one predict_proba call per tier
+batchers = {
+    tier: MicroBatcher(
+        functools.partial(run_batched_scoring, tier=tier),
+        window_ms=settings.PREDICT_BATCH_WINDOW_MS,
+        max_batch_size=settings.PREDICT_MAX_BATCH_SIZE,
+        max_queue_depth=settings.PREDICT_MAX_QUEUE_DEPTH
+    )
+    for tier in TIERS
+}
+
+async def score_batch(features: np.ndarray, tier: str = "full") -> Scored:
+    """Score a raw feature matrix, translating overload and timeouts into HTTP errors."""
+    try:
+        return await run_scoring(features, tier)
+    except ExecutorBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Prediction timed out"
+        )
+
+async def score_row(features: np.ndarray, tier: str = "full") -> Scored:
+    """Score a single (1, 5) feature row, through the micro-batcher when enabled."""
+    if not settings.PREDICT_BATCHING_ENABLED:
+        model, served_tier, probabilities, contributions = await score_batch(features, tier)
+        return model, served_tier, probabilities[0], None if contributions is None else contributions[0]
+    try:
+        return await batchers[tier].submit(features[0])
+    except (QueueFullError, ExecutorBusyError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Prediction timed out"
+        )
+
+# Recent results by canonical feature row, scoped to the served model version
+prediction_cache = PredictionCache(
+    settings.PREDICTION_CACHE_SIZE if settings.PREDICTION_CACHE_ENABLED else 0
+)
+
+def cache_version(model: ModelVersion) -> str:
+    """Cache scope of a model version; also changes when its student does."""
+    return model.sha256 if model.student is None else f"{model.sha256}+{model.student.version}"
+
+async def score_row_cached(features: np.ndarray, tier: str = "full") -> Scored:
+    """Score a single (1, 5) feature row, reusing the cached result for a repeated row."""
+    if prediction_cache.max_entries == 0:
+        return await score_row(features, tier)
+
+    current = model_registry.current
+    key = (tier,) + canonical_key(features[0], settings.PREDICTION_CACHE_BMI_DECIMALS)
+    cached = prediction_cache.get(cache_version(current), key)
+    if cached is not None:
+        return (current,) + cached
+
+    model, served_tier, probabilities, contributions = await score_row(features, tier)
+    prediction_cache.put(cache_version(model), key, (served_tier, probabilities, contributions))
+    return model, served_tier, probabilities, contributions
+
+def ensure_model_loaded():
+    if model_registry.current is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=model_registry.last_error or "Model is still loading"
+        )
+
 @router.post(
     "/predict",
     response_model=RiskPredictionResponse,
     summary="Predict Diabetes Risk",
-    description="Predicts diabetes risk based on input health data and returns risk assessment with feature importance."
+    description="Predicts diabetes risk based on input health data and returns risk assessment with each feature's contribution to it."
 )
 async def predict_diabetes_risk(
     health_data: HealthDataInput,
+    tier: Annotated[Tier, TierQuery] = "full",
     current_user: User = Depends(get_current_user)
 ):
     try:
-        if not model or not scaler or not feature_names:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Model not loaded. Please ensure the model is trained and available."
-            )
-        
-        # Calculate BMI from height and weight
-        height_m = health_data.Height / 100  # Convert cm to m
-        bmi = health_data.Weight / (height_m * height_m)
+        ensure_model_loaded()
         
-        # Convert input data to DataFrame with correct feature order
-        input_data = np.array([[
-            bmi,  # Calculate BMI from height and weight
-            health_data.Stroke,
-            health_data.HeartDiseaseorAttack,
-            health_data.Sex,
-            health_data.Age
-        ]])
-        input_df = pd.DataFrame(input_data, columns=feature_names)
-        
-        # Scale the input data using pre-trained scaler
-        scaled_data = scaler.transform(input_df)
-        # Convert scaled data back to DataFrame with feature names
-        scaled_df = pd.DataFrame(scaled_data, columns=feature_names)
-        
-        # Get prediction probabilities from model
-        predictions = model.predict(scaled_df)
-        probabilities = model.predict_proba(scaled_df)[0]
-        
-        # Get feature importance
-        estimators = model.estimators_
-        if len(estimators) > 0 and hasattr(estimators[0], 'feature_importances_'):
-            feature_importance = dict(zip(feature_names, estimators[0].feature_importances_))
-        else:
-            feature_importance = dict(zip(feature_names, [1.0/len(feature_names)] * len(feature_names)))
-        
-        # Sort feature importance by value
-        feature_importance = dict(sorted(
-            feature_importance.items(),
-            key=lambda x: x[1],
-            reverse=True
-        ))
-        
-        # Determine risk level
-        max_prob_idx = np.argmax(probabilities)
-        risk_levels = ["No Diabetes", "Prediabetes", "Diabetes"]
-        risk_level = risk_levels[max_prob_idx]
-        
-        # Calculate confidence score
-        confidence_score = float(max(probabilities))
-        
-        # Get probability for the highest risk (diabetes)
-        risk_probability = float(probabilities[2])  # Probability for class 2 (Diabetes)
+        # Build the feature row, score and explain it (or reuse the cached result)
+        with stage_timer("features"):
+            features = build_feature_matrix([health_data])
+        with stage_timer("inference"):
+            model, served_tier, probabilities, contributions = await score_row_cached(features, tier)
+            feature_importance, baseline_risk_probability = explain_risk(model.tier(served_tier)[1], contributions)
+        risk_probability, risk_level, confidence_score = summarize_probabilities(probabilities)
         
         # Create prediction result
         prediction = PredictionCreate(
@@ -146,13 +225,17 @@ async def predict_diabetes_risk(
             confidence_score=confidence_score,
             feature_importance=feature_importance,
             input_data=health_data.model_dump(),
+            model_version=model.name,
+            tier=served_tier,
+            age_encoding=AGE_ENCODING,
             created_at=datetime.now().astimezone()  # Store with timezone info
         )
         
         # Store prediction in database
-        result = await db.get_database().predictions.insert_one(
-            prediction.model_dump(by_alias=True)
-        )
+        with stage_timer("db_write"):
+            result = await db.get_database().predictions.insert_one(
+                prediction.model_dump(by_alias=True)
+            )
         
         return RiskPredictionResponse(
             id=str(result.inserted_id),
@@ -160,9 +243,14 @@ async def predict_diabetes_risk(
             risk_level=risk_level,
             confidence_score=confidence_score,
             feature_importance=feature_importance,
+            baseline_risk_probability=baseline_risk_probability,
+            model_version=prediction.model_version,
+            tier=prediction.tier,
             created_at=prediction.created_at
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error predicting diabetes risk: {str(e)}")
         raise HTTPException(
@@ -170,6 +258,110 @@ async def predict_diabetes_risk(
             detail=f"Error predicting diabetes risk: {str(e)}"
         )
 
+@router.post(
+    "/predict/batch",
+    response_model=List[RiskPredictionResponse],
+    summary="Predict Diabetes Risk (Batch)",
+    description="Scores and explains many health data records in a single ensemble call and stores all predictions at once."
+)
+async def predict_diabetes_risk_batch(
+    health_data: List[HealthDataInput],
+    tier: Annotated[Tier, TierQuery] = "full",
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        ensure_model_loaded()
+        
+        if not health_data or len(health_data) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Batch must contain between 1 and {MAX_BATCH_SIZE} records"
+            )
+        
+        # Score and explain every record with one vectorized call
+        with stage_timer("features"):
+            features = build_feature_matrix(health_data)
+        with stage_timer("inference"):
+            model, served_tier, probabilities, contributions = await score_batch(features, tier)
+        prepared = model.tier(served_tier)[1]
+        
+        created_at = datetime.now().astimezone()
+        predictions = []
+        baselines = []
+        for i, record in enumerate(health_data):
+            risk_probability, risk_level, confidence_score = summarize_probabilities(probabilities[i])
+            feature_importance, baseline_risk_probability = explain_risk(
+                prepared, None if contributions is None else contributions[i]
+            )
+            baselines.append(baseline_risk_probability)
+            predictions.append(PredictionCreate(
+                user_id=str(current_user.id),
+                risk_probability=risk_probability,
+                risk_level=risk_level,
+                confidence_score=confidence_score,
+                feature_importance=feature_importance,
+                input_data=record.model_dump(),
+                model_version=model.name,
+                tier=served_tier,
+                age_encoding=AGE_ENCODING,
+                created_at=created_at
+            ))
+        
+        # Store all predictions in one round trip; inserted_ids follows the documents' order
+        with stage_timer("db_write"):
+            result = await db.get_database().predictions.insert_many(
+                [prediction.model_dump(by_alias=True) for prediction in predictions],
+                ordered=False
+            )
+        
+        return [
+            RiskPredictionResponse(
+                id=str(inserted_id),
+                risk_probability=prediction.risk_probability,
+                risk_level=prediction.risk_level,
+                confidence_score=prediction.confidence_score,
+                feature_importance=prediction.feature_importance,
+                baseline_risk_probability=baseline_risk_probability,
+                model_version=prediction.model_version,
+                tier=prediction.tier,
+                created_at=prediction.created_at
+            )
+            for prediction, baseline_risk_probability, inserted_id in zip(predictions, baselines, result.inserted_ids)
+        ]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting diabetes risk for batch: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error predicting diabetes risk: {str(e)}"
+        )
+
+@router.get(
+    "/batcher/stats",
+    summary="Prediction Batcher Statistics",
+    description="Returns each tier's micro-batcher configuration, current queue depth and batching counters."
+)
+async def get_batcher_stats(current_user: User = Depends(get_current_admin)):
+    return {tier: batcher.stats() for tier, batcher in batchers.items()}
+
+@router.get(
+    "/executor/stats",
+    summary="Inference Executor Statistics",
+    description="Returns the inference thread pool size, queue depth and rejection/timeout counters."
+)
+async def get_executor_stats(current_user: User = Depends(get_current_admin)):
+    return executor.stats()
+
+@router.get(
+    "/cache/stats",
+    summary="Prediction Cache Statistics",
+    description="Returns the result cache size, model version and hit/miss/eviction counters."
+)
+async def get_cache_stats(current_user: User = Depends(get_current_admin)):
+    return prediction_cache.stats()
+
 @router.get(
     "/predictions",
     response_model=List[Prediction],
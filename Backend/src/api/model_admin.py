@@ -0,0 +1,102 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, status, Depends
+import logging
+
+from src.api.health_data import model_registry
+from src.auth.utils import get_current_admin
+from src.models.user import User
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def registry_state() -> dict:
+    return {
+        **model_registry.stats(),
+        "versions": model_registry.list_versions()
+    }
+
+@router.get(
+    "",
+    summary="List Model Versions",
+    description="Lists the versioned model artifacts, which one is served and which one is pinned."
+)
+async def list_model_versions(current_user: User = Depends(get_current_admin)):
+    return registry_state()
+
+@router.post(
+    "/{version}/pin",
+    summary="Pin Model Version",
+    description="Loads and warms up the given version if needed, then serves it until unpinned."
+)
+async def pin_model_version(version: str, current_user: User = Depends(get_current_admin)):
+    try:
+        # Loading can take seconds, so keep it off the event loop
+        await asyncio.to_thread(model_registry.pin, version)
+        logger.info(f"{current_user.email} pinned model version {version}")
+        return registry_state()
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e).strip("'")
+        )
+    except Exception as e:
+        logger.error(f"Error pinning model version {version}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error pinning model version: {str(e)}"
+        )
+
+@router.post(
+    "/unpin",
+    summary="Unpin Model Version",
+    description="Clears the pin and goes back to serving the latest version."
+)
+async def unpin_model_version(current_user: User = Depends(get_current_admin)):
+    try:
+        await asyncio.to_thread(model_registry.unpin)
+        logger.info(f"{current_user.email} unpinned the model version")
+        return registry_state()
+    except Exception as e:
+        logger.error(f"Error unpinning model version: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error unpinning model version: {str(e)}"
+        )
+
+@router.post(
+    "/rollback",
+    summary="Roll Back Model Version",
+    description="Serves and pins the version that was active before the current one."
+)
+async def rollback_model_version(current_user: User = Depends(get_current_admin)):
+    try:
+        version = await asyncio.to_thread(model_registry.rollback)
+        logger.info(f"{current_user.email} rolled back to model version {version.name}")
+        return registry_state()
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e).strip("'")
+        )
+    except LookupError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error rolling back model version: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error rolling back model version: {str(e)}"
+        )
+
+@router.post(
+    "/refresh",
+    summary="Rescan Model Versions",
+    description="Rescans the models directory now instead of waiting for the next background poll."
+)
+async def refresh_model_versions(current_user: User = Depends(get_current_admin)):
+    await asyncio.to_thread(model_registry.refresh)
+    return registry_state()
@@ -2,6 +2,6 @@
 Authentication utility functions and dependencies.
 """
 
-from .auth import get_current_user, security
+from .auth import get_current_user, get_current_admin, security
 
-__all__ = ['get_current_user', 'security'] 
\ No newline at end of file
+__all__ = ['get_current_user', 'get_current_admin', 'security'] 
\ No newline at end of file
@@ -1,6 +1,8 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
+from src.core.config import settings
 from src.core.database import db
+from src.core.metrics import stage_timer
 from src.models.user import User
 from src.auth.services.token import TokenService
 import logging
@@ -12,14 +14,16 @@ async def get_current_user(credentials = Depends(security)):
 
     try:
         token = credentials.credentials
-        token_data = TokenService.verify_token(token)
+        with stage_timer("auth"):
+            token_data = TokenService.verify_token(token)
         if not token_data or not token_data.email:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
             
-        user = await db.get_database().users.find_one({"email": token_data.email})
+        with stage_timer("db_read"):
+            user = await db.get_database().users.find_one({"email": token_data.email})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -34,4 +38,13 @@ async def get_current_user(credentials = Depends(security)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        )
+
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
@@ -0,0 +1,342 @@
+"""
+Microbenchmarks of model inference, saved as JSON and compared across runs.
+
+`run` loads a training artifact (diaHealth_012.joblib by default) and measures:
+
+    single_row  latency of one row per call (p50, p99, mean) for each engine
+    batch       time per batch and rows per second for batch sizes 1 to 10k
+    members     each ensemble member on its own, single row and per row in a batch
+    stages      each stage of a /predict call: the served path (feature row,
+                predict_proba, TreeSHAP explanation, contribution sort) and, as
+                a fixed reference, the original handler (DataFrame building,
+                scaler.transform, predict followed by predict_proba, importance sort)
+
+Rows are random but seeded, so two runs score the same inputs. Native thread
+pools are capped as in serving (--threads, default 1). The result records the
+artifact's sha256 and the environment (Python, library versions, CPU).
+
+`compare` lines up two results and flags every latency that grew, or
+throughput that fell, by more than --threshold; it exits with status 1 when it
+finds a regression, so it can gate CI.
+
+Usage (from the Backend directory):
+    python -m src.benchmarks.inference run
+    python -m src.benchmarks.inference run --engines ensemble compiled student --out before.json
+    python -m src.benchmarks.inference compare before.json after.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.ml.executor import limit_native_threads, pin_model_threads
+from src.ml.inference import PreparedModel, build_feature_matrix, explain_risk, file_sha256, load_prepared_model
+
+BENCHMARKS_DIR = Path(__file__).parent
+DEFAULT_MODEL = BENCHMARKS_DIR.parent / "ml" / "models" / "diaHealth_012.joblib"
+RESULTS_DIR = BENCHMARKS_DIR / "results"
+ENGINES = ("ensemble", "compiled", "cascade", "table", "student")
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+MEMBER_BATCH_ROWS = 1000
+# Seconds of work each batch size is repeated for (at least MIN_REPEATS times)
+BATCH_BUDGET_SECONDS = 0.5
+MIN_REPEATS = 3
+
+
+def synthetic_records(n: int, seed: int = 42) -> List[SimpleNamespace]:
+    """Random request bodies in the API's input ranges."""
+    rng = np.random.default_rng(seed)
+    return [
+        SimpleNamespace(
+            Height=float(height), Weight=float(weight), Stroke=int(stroke),
+            HeartDiseaseorAttack=int(heart), Sex=int(sex), Age=int(age)
+        )
+        for height, weight, stroke, heart, sex, age in zip(
+            rng.uniform(145, 200, n), rng.uniform(40, 140, n), rng.random(n) < 0.05,
+            rng.random(n) < 0.1, rng.integers(0, 2, n), rng.integers(18, 121, n)
+        )
+    ]
+
+
+def time_calls(fn: Callable[[int], object], iterations: int, warmup: int = 20) -> np.ndarray:
+    """Seconds taken by each of `iterations` calls fn(i), after `warmup` untimed calls."""
+    for i in range(warmup):
+        fn(i)
+    seconds = np.empty(iterations)
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        seconds[i] = time.perf_counter() - started
+    return seconds
+
+
+def latency_summary(seconds: np.ndarray) -> dict:
+    return {
+        "p50_ms": float(np.percentile(seconds, 50) * 1000),
+        "p99_ms": float(np.percentile(seconds, 99) * 1000),
+        "mean_ms": float(seconds.mean() * 1000),
+        "iterations": int(len(seconds)),
+    }
+
+
+def single_row(prepared: PreparedModel, X: np.ndarray, iterations: int) -> dict:
+    return latency_summary(time_calls(lambda i: prepared.predict_proba(X[i % len(X)][np.newaxis, :]), iterations))
+
+
+def batch_throughput(predict_proba: Callable[[np.ndarray], np.ndarray], X: np.ndarray, sizes=BATCH_SIZES) -> Dict[str, dict]:
+    """Best time per batch and the matching rows per second, for each batch size."""
+    results = {}
+    for size in sizes:
+        batch = np.resize(X, (size, X.shape[1]))
+        predict_proba(batch)
+        started = time.perf_counter()
+        predict_proba(batch)
+        once = time.perf_counter() - started
+        repeats = max(MIN_REPEATS, int(BATCH_BUDGET_SECONDS / max(once, 1e-6)))
+        best = min(time_calls(lambda i: predict_proba(batch), repeats, warmup=0))
+        results[str(size)] = {"ms": best * 1000, "rows_per_second": size / best, "repeats": repeats}
+    return results
+
+
+def member_costs(prepared: PreparedModel, X: np.ndarray, iterations: int) -> Dict[str, dict]:
+    """Single-row latency and per-row batch cost of every member, on already scaled rows."""
+    scaled = prepared.scale(X)
+    batch = np.resize(scaled, (MEMBER_BATCH_ROWS, scaled.shape[1]))
+    costs = {}
+    for name, predict_proba, weight in prepared.members:
+        single = time_calls(lambda i: predict_proba(scaled[i % len(scaled)][np.newaxis, :]), iterations)
+        best = min(time_calls(lambda i: predict_proba(batch), MIN_REPEATS, warmup=1))
+        costs[name] = {
+            **latency_summary(single),
+            "weight": weight,
+            "batch_rows": MEMBER_BATCH_ROWS,
+            "batch_us_per_row": best / MEMBER_BATCH_ROWS * 1e6,
+        }
+    return costs
+
+
+def served_stages(prepared: PreparedModel, records: List[SimpleNamespace], iterations: int) -> Dict[str, dict]:
+    """Per-stage latency of one /predict call as the API serves it (without the cache and micro-batcher)."""
+    features = [build_feature_matrix([record]) for record in records]
+    stages = {
+        "build_features": time_calls(lambda i: build_feature_matrix([records[i % len(records)]]), iterations),
+        "predict_proba": time_calls(lambda i: prepared.predict_proba(features[i % len(features)]), iterations),
+    }
+    if prepared.explainer is not None:
+        contributions = [prepared.explain(row) for row in features[:256]]
+        stages["explain"] = time_calls(lambda i: prepared.explain(features[i % len(features)]), iterations)
+        stages["importance_sort"] = time_calls(lambda i: explain_risk(prepared, contributions[i % len(contributions)][0]), iterations)
+    else:
+        stages["importance_sort"] = time_calls(lambda i: explain_risk(prepared, None), iterations)
+    return {stage: latency_summary(seconds) for stage, seconds in stages.items()}
+
+
+def legacy_stages(model_data: dict, records: List[SimpleNamespace], iterations: int) -> Dict[str, dict]:
+    """
+    Per-stage latency of the original /predict handler on the same artifact:
+    a DataFrame per request, scaler.transform, predict then predict_proba on
+    the VotingClassifier, and a sort of the first member's importances.
+    """
+    model, scaler, feature_names = model_data["model"], model_data["scaler"], model_data["feature_names"]
+
+    def dataframe(record):
+        height_m = record.Height / 100
+        bmi = record.Weight / (height_m * height_m)
+        row = np.array([[bmi, record.Stroke, record.HeartDiseaseorAttack, record.Sex, record.Age]])
+        return pd.DataFrame(row, columns=feature_names)
+
+    def transform(frame):
+        return pd.DataFrame(scaler.transform(frame), columns=feature_names)
+
+    def importance_sort():
+        estimators = model.estimators_
+        if len(estimators) > 0 and hasattr(estimators[0], "feature_importances_"):
+            importance = dict(zip(feature_names, estimators[0].feature_importances_))
+        else:
+            importance = dict(zip(feature_names, [1.0 / len(feature_names)] * len(feature_names)))
+        return dict(sorted(importance.items(), key=lambda item: item[1], reverse=True))
+
+    n = min(len(records), 256)
+    frames = [dataframe(record) for record in records[:n]]
+    scaled = [transform(frame) for frame in frames]
+    stages = {
+        "dataframe": time_calls(lambda i: dataframe(records[i % len(records)]), iterations),
+        "scaler_transform": time_calls(lambda i: transform(frames[i % n]), iterations),
+        "predict": time_calls(lambda i: model.predict(scaled[i % n]), iterations),
+        "predict_proba": time_calls(lambda i: model.predict_proba(scaled[i % n]), iterations),
+        "importance_sort": time_calls(lambda i: importance_sort(), iterations),
+    }
+    return {stage: latency_summary(seconds) for stage, seconds in stages.items()}
+
+
+def load_engine(model_path: Path, engine: str, explain: bool = False) -> PreparedModel:
+    if engine == "student":
+        from src.ml.distill import student_path_for
+        return load_prepared_model(student_path_for(model_path), explain=explain)
+    # Accept any recorded table error, so the table is measured whenever it exists
+    return load_prepared_model(model_path, engine=engine, table_max_error=float("inf"), explain=explain)
+
+
+def environment(threads: int) -> dict:
+    import lightgbm
+    import sklearn
+    import xgboost
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+        "xgboost": xgboost.__version__,
+        "lightgbm": lightgbm.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "native_threads": threads,
+    }
+
+
+def run(model_path: Path, engines: List[str], iterations: int, threads: int, seed: int) -> dict:
+    limit_native_threads(threads)
+    records = synthetic_records(max(iterations, 1000), seed)
+    X = build_feature_matrix(records)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "model": {"path": str(model_path), "sha256": file_sha256(model_path)},
+        "settings": {"iterations": iterations, "seed": seed, "batch_sizes": list(BATCH_SIZES)},
+        "environment": environment(threads),
+        "single_row": {},
+        "batch": {},
+    }
+
+    for engine in engines:
+        started = time.perf_counter()
+        prepared = load_engine(model_path, engine)
+        pin_model_threads(prepared.model, threads)
+        report["single_row"][engine] = {"engine": prepared.engine_name, **single_row(prepared, X, iterations)}
+        report["batch"][engine] = batch_throughput(prepared.predict_proba, X)
+        print(f"  {engine:<10} {report['single_row'][engine]['p50_ms']:8.3f} ms p50  ({time.perf_counter() - started:.1f}s)")
+
+    with open(model_path, "rb") as f:
+        model_data = joblib.load(f)
+    pin_model_threads(model_data["model"], threads)
+    report["stages"] = {"legacy": legacy_stages(model_data, records, iterations)}
+
+    # PreparedModel strips the members' feature names, so it gets its own copy after the legacy run
+    prepared = load_engine(model_path, "ensemble", explain=True)
+    pin_model_threads(prepared.model, threads)
+    report["members"] = member_costs(prepared, X, iterations)
+    report["stages"]["served"] = served_stages(prepared, records, iterations)
+    return report
+
+
+# Metrics where a larger value is better; every other compared metric is a cost
+HIGHER_IS_BETTER = ("rows_per_second", "requests_per_second")
+COMPARED_SUFFIXES = ("_ms", "_us_per_row") + HIGHER_IS_BETTER
+
+
+RESULT_SECTIONS = ("single_row", "batch", "members", "stages")
+
+
+def flatten_metrics(report: dict, sections=RESULT_SECTIONS) -> Dict[str, float]:
+    """Every timing in a result, keyed by its dotted path (e.g. single_row.ensemble.p50_ms)."""
+    metrics = {}
+
+    def visit(node, path):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                visit(value, path + [key])
+            elif isinstance(value, (int, float)) and key.endswith(COMPARED_SUFFIXES):
+                metrics[".".join(path + [key])] = float(value)
+
+    for section in sections:
+        visit(report.get(section, {}), [section])
+    return metrics
+
+
+def compare(baseline: dict, candidate: dict, threshold: float, sections=RESULT_SECTIONS) -> List[dict]:
+    """Relative change of every metric both results have; `regression` marks changes for the worse beyond threshold."""
+    before, after = flatten_metrics(baseline, sections), flatten_metrics(candidate, sections)
+    changes = []
+    for metric in sorted(before.keys() & after.keys()):
+        if before[metric] <= 0:
+            continue
+        change = after[metric] / before[metric] - 1
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        changes.append({
+            "metric": metric,
+            "before": before[metric],
+            "after": after[metric],
+            "change": change,
+            "regression": worse > threshold,
+        })
+    return changes
+
+
+def _load_result(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inference microbenchmarks and regression checks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark a model artifact and save the result")
+    run_parser.add_argument("--model", default=str(DEFAULT_MODEL), help="Training artifact (.joblib)")
+    run_parser.add_argument("--engines", nargs="+", choices=ENGINES, default=["ensemble", "compiled"])
+    run_parser.add_argument("--iterations", type=int, default=2000, help="Calls per single-row measurement")
+    run_parser.add_argument("--threads", type=int, default=1, help="Native threads, as INFERENCE_NATIVE_THREADS")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--out", default=None, help="JSON result (default: results/inference-<time>.json)")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    compare_parser.add_argument("--all", action="store_true", help="List every metric, not only the regressions")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(Path(args.model), args.engines, args.iterations, args.threads, args.seed)
+        out_path = Path(args.out) if args.out else RESULTS_DIR / f"inference-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, out_path)
+        print(f"Wrote {out_path}")
+        return 0
+
+    baseline, candidate = _load_result(args.baseline), _load_result(args.candidate)
+    if baseline["model"]["sha256"] != candidate["model"]["sha256"]:
+        print("Note: the results are for different model artifacts")
+    differing = sorted(
+        key for key in baseline["environment"].keys() | candidate["environment"].keys()
+        if baseline["environment"].get(key) != candidate["environment"].get(key)
+    )
+    if differing:
+        print(f"Note: the environments differ in {', '.join(differing)}")
+
+    changes = compare(baseline, candidate, args.threshold)
+    regressions = [change for change in changes if change["regression"]]
+    for change in changes if args.all else regressions:
+        flag = "REGRESSION" if change["regression"] else ""
+        print(f"{change['metric']:<56} {change['before']:12.4f} {change['after']:12.4f} {change['change']:+8.1%}  {flag}")
+    print(f"{len(regressions)} of {len(changes)} metrics regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+End-to-end load test of the API, without a MongoDB server or Google sign-in.
+
+`run` boots the app (src.main) with uvicorn in this process, backed by the
+in-process Motor stand-in (memory_mongo.py) or, with --mongodb-url, by a real
+server such as a local mongod. It seeds synthetic users, mints each one an
+access token with TokenService.create_access_token, waits for /readyz and
+then keeps --concurrency requests in flight for --duration seconds. Each
+request goes to one of /health/predict, /health/predictions and /auth/me,
+picked at random by --mix weights, for a random user. Every call goes through
+the real get_current_user, so it decodes the JWT and looks the user up;
+/predict also stores its prediction.
+
+Per endpoint it reports requests, errors by status, throughput and latency
+percentiles, with the server's settings and model version, as JSON. Requests
+sent during the first --warmup seconds are not counted.
+
+The load generator shares the process, and so the CPU, with the server. To
+measure a deployment-like server instead, start `serve` (the same app, stand-in
+and seeded users, in its own process) or a real server, and point `run --url`
+at it. Tokens are signed with this process's SECRET_KEY, which must match the
+server's. `compare` flags regressions between two results, as in inference.py.
+
+Usage (from the Backend directory):
+    python -m src.benchmarks.loadtest run --concurrency 32 --duration 30
+    python -m src.benchmarks.loadtest run --mix predict=1 --db-latency-ms 1
+    python -m src.benchmarks.loadtest run --mongodb-url mongodb://localhost:27017
+    python -m src.benchmarks.loadtest serve --port 8001
+    python -m src.benchmarks.loadtest run --url http://localhost:8001 --concurrency 64
+    python -m src.benchmarks.loadtest compare before.json after.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+# Settings the app requires; placeholders are used for any not set in the environment or .env.prod
+REQUIRED_SETTINGS = {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "SECRET_KEY": "loadtest-secret-key",
+    "GOOGLE_CLIENT_ID": "loadtest",
+    "GOOGLE_CLIENT_SECRET": "loadtest",
+}
+# Settings that shape server performance, recorded with the results
+SERVER_SETTINGS = (
+    "INFERENCE_ENGINE", "INFERENCE_WORKERS", "INFERENCE_NATIVE_THREADS", "PREDICT_BATCHING_ENABLED",
+    "PREDICT_BATCH_WINDOW_MS", "PREDICTION_CACHE_ENABLED", "PREDICTION_EXPLANATIONS_ENABLED",
+)
+ENDPOINTS = {
+    "predict": ("POST", "/health/predict"),
+    "predictions": ("GET", "/health/predictions"),
+    "me": ("GET", "/auth/me"),
+}
+DEFAULT_MIX = "predict=8,predictions=1,me=1"
+READY_TIMEOUT_SECONDS = 300
+
+
+def configure_environment(mongodb_url: Optional[str] = None):
+    """Fill in placeholders for required settings before src.core.config is imported."""
+    from dotenv import dotenv_values
+
+    if mongodb_url:
+        os.environ["MONGODB_URL"] = mongodb_url
+    defined = set(os.environ) | set(dotenv_values(".env.prod"))
+    for name, value in REQUIRED_SETTINGS.items():
+        if name not in defined:
+            os.environ[name] = value
+
+
+def user_email(index: int) -> str:
+    return f"loadtest-{index:05d}@example.com"
+
+
+async def seed_users(database, n_users: int) -> int:
+    """Create the synthetic users that do not exist yet, as Google sign-in would; returns how many were new."""
+    from src.models.user import UserCreate
+
+    created = 0
+    for i in range(n_users):
+        if await database.users.find_one({"email": user_email(i)}) is None:
+            user = UserCreate(email=user_email(i), name=f"Load Test {i}")
+            await database.users.insert_one(user.model_dump(by_alias=True))
+            created += 1
+    return created
+
+
+def prepare_database(mongodb_url: Optional[str], n_users: int, latency_ms: float) -> str:
+    """Install the stand-in (unless a server URL is given) and seed the users; returns a description of the backend."""
+    from src.core.config import settings
+    from src.core.database import Database
+
+    if mongodb_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        async def seed():
+            client = AsyncIOMotorClient(mongodb_url)
+            try:
+                return await seed_users(client[settings.MONGODB_DB_NAME], n_users)
+            finally:
+                client.close()
+
+        asyncio.run(seed())
+        return "mongodb"
+
+    from src.benchmarks.memory_mongo import MemoryClient
+
+    # The lifespan's connect_to_database keeps a client that is already set
+    client = MemoryClient(latency_ms)
+    Database.client, Database.db = client, client[settings.MONGODB_DB_NAME]
+    asyncio.run(seed_users(Database.db, n_users))
+    return "memory"
+
+
+class BackgroundServer:
+    """The app served by uvicorn on a thread of this process."""
+
+    def __init__(self, host: str, port: int):
+        import uvicorn
+        from src.main import app
+
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="loadtest-server", daemon=True)
+
+    def __enter__(self) -> "BackgroundServer":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def wait_until_ready(url: str, timeout: float = READY_TIMEOUT_SECONDS) -> dict:
+    """Poll /readyz until the model is loaded and the database answers; returns its body."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = httpx.get(f"{url}/readyz", timeout=5)
+            if response.status_code == 200:
+                return response.json()
+            body = response.json()
+        except httpx.HTTPError as e:
+            body = {"error": str(e)}
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} not ready after {timeout:.0f}s: {body}")
+        time.sleep(0.5)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name.strip()!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def random_health_data(rng: random.Random) -> dict:
+    return {
+        "Height": round(rng.uniform(145, 200), 1),
+        "Weight": round(rng.uniform(40, 140), 1),
+        "Stroke": int(rng.random() < 0.05),
+        "HeartDiseaseorAttack": int(rng.random() < 0.1),
+        "Sex": rng.randint(0, 1),
+        "Age": rng.randint(1, 13),
+    }
+
+
+async def drive(
+    url: str,
+    tokens: List[str],
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    tier: str,
+    timeout: float
+) -> Dict[str, List[Tuple[float, str]]]:
+    """Keep `concurrency` requests in flight for warmup + duration seconds; returns (seconds, status) per endpoint."""
+    from src.core.config import settings
+
+    names, weights = list(mix), list(mix.values())
+    samples: Dict[str, List[Tuple[float, str]]] = {name: [] for name in names}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url + settings.API_V1_STR, limits=limits, timeout=timeout) as client:
+        measure_from = time.perf_counter() + warmup
+        end = measure_from + duration
+
+        async def worker(index: int):
+            rng = random.Random(seed + index)
+            while time.perf_counter() < end:
+                name = rng.choices(names, weights)[0]
+                method, path = ENDPOINTS[name]
+                headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+                body = random_health_data(rng) if name == "predict" else None
+                params = {"tier": tier} if name == "predict" else None
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, params=params, headers=headers)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if started >= measure_from:
+                    samples[name].append((time.perf_counter() - started, status))
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples
+
+
+def summarize(samples: List[Tuple[float, str]], duration: float) -> dict:
+    """Throughput, status counts and latency percentiles (of successful requests) for one endpoint."""
+    statuses = Counter(status for _, status in samples)
+    ok = np.array([seconds for seconds, status in samples if status.startswith("2")])
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "statuses": dict(statuses),
+        "requests_per_second": len(ok) / duration,
+    }
+    if len(ok):
+        summary.update({
+            "p50_ms": float(np.percentile(ok, 50) * 1000),
+            "p90_ms": float(np.percentile(ok, 90) * 1000),
+            "p99_ms": float(np.percentile(ok, 99) * 1000),
+            "max_ms": float(ok.max() * 1000),
+            "mean_ms": float(ok.mean() * 1000),
+        })
+    return summary
+
+
+def run(args) -> dict:
+    configure_environment(args.mongodb_url)
+    from src.auth.services.token import TokenService
+    from src.core.config import settings
+
+    # The app logs at INFO; one httpx line per request would swamp the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    mix = parse_mix(args.mix)
+    tokens = [TokenService.create_access_token(user_email(i)) for i in range(args.users)]
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            url, backend = args.url.rstrip("/"), "external"
+            if args.mongodb_url:
+                prepare_database(args.mongodb_url, args.users, 0)
+        else:
+            backend = prepare_database(args.mongodb_url, args.users, args.db_latency_ms)
+            url = stack.enter_context(BackgroundServer(args.host, args.port)).url
+
+        ready = wait_until_ready(url)
+        print(f"Driving {url} with {args.concurrency} concurrent requests for {args.duration:.0f}s ({args.warmup:.0f}s warm-up)...")
+        samples = asyncio.run(drive(
+            url, tokens, mix, args.concurrency, args.duration, args.warmup, args.seed, args.tier, args.timeout
+        ))
+
+    endpoints = {name: summarize(endpoint_samples, args.duration) for name, endpoint_samples in samples.items()}
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "target": {
+            "url": url,
+            "database": backend,
+            "db_latency_ms": args.db_latency_ms if backend == "memory" else None,
+            "model": ready.get("model", {}).get("version"),
+            # Only known for a server running in this process
+            "settings": None if args.url else {name: getattr(settings, name) for name in SERVER_SETTINGS},
+        },
+        "load": {
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "mix": mix,
+            "users": args.users,
+            "tier": args.tier,
+            "seed": args.seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "endpoints": endpoints,
+        "total": summarize([sample for endpoint in samples.values() for sample in endpoint], args.duration),
+    }
+
+
+def serve(args):
+    """Serve the app on the stand-in (or --mongodb-url) with the synthetic users seeded, until interrupted."""
+    configure_environment(args.mongodb_url)
+    import uvicorn
+    from src.main import app
+
+    backend = prepare_database(args.mongodb_url, args.users, args.db_latency_ms)
+    print(f"Serving with the {backend} database and {args.users} load-test users on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+def _print_report(report: dict):
+    print(f"{'endpoint':<12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, result in rows:
+        latency = "".join(f" {result.get(key, float('nan')):9.2f}" for key in ("p50_ms", "p90_ms", "p99_ms", "max_ms"))
+        print(f"{name:<12} {result['requests']:9d} {result['errors']:7d} {result['requests_per_second']:9.1f}{latency}")
+        errors = {status: count for status, count in result["statuses"].items() if not status.startswith("2")}
+        if errors and name != "total":
+            print(f"{'':<12} errors: {errors}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test of the API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_backend_options(command):
+        command.add_argument("--mongodb-url", default=None, help="Use this MongoDB server instead of the in-process stand-in")
+        command.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated round trip per stand-in call")
+        command.add_argument("--users", type=int, default=100, help="Synthetic users to seed and sign requests for")
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=8765)
+
+    run_parser = commands.add_parser("run", help="Run a load test and save the result")
+    add_backend_options(run_parser)
+    run_parser.add_argument("--url", default=None, help="Drive an already running server instead of booting one")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights, e.g. predict=8,predictions=1,me=1")
+    run_parser.add_argument("--tier", choices=["full", "fast"], default="full", help="Tier requested from /predict")
+    run_parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as failed")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--out", default=None, help="JSON result (default: results/loadtest-<time>.json)")
+
+    serve_parser = commands.add_parser("serve", help="Serve the app with the load-test database and users")
+    add_backend_options(serve_parser)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args)
+        return 0
+
+    if args.command == "compare":
+        from src.benchmarks.inference import compare
+
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        changes = compare(baseline, candidate, args.threshold, sections=("endpoints", "total"))
+        regressions = [change for change in changes if change["regression"]]
+        for change in regressions:
+            print(f"{change['metric']:<40} {change['before']:12.2f} {change['after']:12.2f} {change['change']:+8.1%}  REGRESSION")
+        print(f"{len(regressions)} of {len(changes)} metrics regressed by more than {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    report = run(args)
+    _print_report(report)
+    out_path = Path(args.out) if args.out else RESULTS_DIR / f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, out_path)
+    print(f"Wrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
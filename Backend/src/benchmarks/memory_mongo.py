@@ -0,0 +1,163 @@
+"""
+In-process stand-in for the parts of Motor the API uses, for load tests
+without a MongoDB server.
+
+Collections keep documents in memory and answer the calls the app makes:
+find_one, find (with sort and limit, iterated with async for or to_list),
+insert_one, insert_many, count_documents and create_index, plus the
+database's ping command. Filters are equality matches on top-level fields;
+anything else raises NotImplementedError rather than silently matching
+nothing. Every call yields to the event loop, and `latency_ms` adds a sleep
+per call to stand in for the network round trip to a real server.
+
+Install it by setting the client before the app's lifespan connects, which
+then keeps it:
+
+    client = MemoryClient(latency_ms=1.0)
+    Database.client, Database.db = client, client[settings.MONGODB_DB_NAME]
+"""
+import asyncio
+from typing import Dict, Iterator, List, Optional, Union
+
+from bson import ObjectId
+from pymongo.results import InsertManyResult, InsertOneResult
+
+
+def _matches(document: dict, query: Optional[dict]) -> bool:
+    for field, value in (query or {}).items():
+        if field.startswith("$") or (isinstance(value, dict) and any(key.startswith("$") for key in value)):
+            raise NotImplementedError(f"MemoryCollection only supports equality filters, got {field}: {value}")
+        if document.get(field) != value:
+            return False
+    return True
+
+
+def _project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return dict(document)
+    included = {field for field, keep in projection.items() if keep}
+    if included:
+        return {field: value for field, value in document.items() if field in included or field == "_id"}
+    return {field: value for field, value in document.items() if field not in projection}
+
+
+class MemoryCursor:
+    """Result of MemoryCollection.find; sort and limit apply when it is iterated."""
+
+    def __init__(self, collection: "MemoryCollection", query: Optional[dict], projection: Optional[dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._limit = 0
+        self._results: Optional[Iterator[dict]] = None
+
+    def sort(self, key: Union[str, List[tuple]], direction: int = 1) -> "MemoryCursor":
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    async def _execute(self) -> List[dict]:
+        await self._collection._round_trip()
+        documents = [document for document in self._collection._documents if _matches(document, self._query)]
+        # Stable sorts from the last key to the first give the multi-key order
+        for key, direction in reversed(self._sort):
+            documents.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        if self._limit:
+            documents = documents[:self._limit]
+        return [_project(document, self._projection) for document in documents]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self._results is None:
+            self._results = iter(await self._execute())
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        results = await self._execute()
+        return results if length is None else results[:length]
+
+
+class MemoryCollection:
+    def __init__(self, latency_ms: float = 0.0):
+        self._documents: List[dict] = []
+        self._latency = latency_ms / 1000
+
+    async def _round_trip(self):
+        await asyncio.sleep(self._latency)
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+        await self._round_trip()
+        for document in self._documents:
+            if _matches(document, query):
+                return _project(document, projection)
+        return None
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, query, projection)
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        await self._round_trip()
+        # Like pymongo, the caller's document gets the generated _id
+        document.setdefault("_id", ObjectId())
+        self._documents.append(dict(document))
+        return InsertOneResult(document["_id"], acknowledged=True)
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True) -> InsertManyResult:
+        await self._round_trip()
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self._documents.append(dict(document))
+        return InsertManyResult([document["_id"] for document in documents], acknowledged=True)
+
+    async def count_documents(self, query: dict) -> int:
+        await self._round_trip()
+        return sum(1 for document in self._documents if _matches(document, query))
+
+    async def create_index(self, keys, **kwargs) -> str:
+        keys = [(keys, 1)] if isinstance(keys, str) else keys
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+class MemoryDatabase:
+    def __init__(self, latency_ms: float = 0.0):
+        self._latency_ms = latency_ms
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self._latency_ms)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command: str, **kwargs) -> dict:
+        if command != "ping":
+            raise NotImplementedError(f"MemoryDatabase only supports the ping command, got {command}")
+        await asyncio.sleep(self._latency_ms / 1000)
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    def __init__(self, latency_ms: float = 0.0):
+        self._latency_ms = latency_ms
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self._latency_ms)
+        return self._databases[name]
+
+    def close(self):
+        pass
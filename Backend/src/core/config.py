@@ -27,6 +27,62 @@ class Settings(BaseSettings):
     
     # Debug mode
     DEBUG: bool = False
+    
+    # Emails of users allowed to call the admin endpoints
+    ADMIN_EMAILS: List[str] = []
+    
+    # Prediction micro-batching settings
+    PREDICT_BATCHING_ENABLED: bool = True
+    PREDICT_BATCH_WINDOW_MS: float = 2.0
+    PREDICT_MAX_BATCH_SIZE: int = 64
+    PREDICT_MAX_QUEUE_DEPTH: int = 1024
+    
+    # Model registry settings
+    MODELS_DIR: str = "./src/ml/models"
+    MODEL_REGISTRY_POLL_SECONDS: float = 30.0
+    MODEL_REGISTRY_KEEP_LOADED: int = 2
+    READINESS_DB_TIMEOUT_SECONDS: float = 1.0
+    
+    # Inference executor settings
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_MAX_QUEUE_DEPTH: int = 32
+    INFERENCE_TIMEOUT_SECONDS: float = 10.0
+    INFERENCE_NATIVE_THREADS: int = 1
+    # "ensemble" runs the fitted members; "compiled" memory-maps the flattened numpy
+    # evaluator (shared by all workers on a host, written on first load once it
+    # matches the ensemble to 1e-6, otherwise the version is rejected);
+    # "table" interpolates the precomputed risk table (python -m src.ml.lookup);
+    # "cascade" runs the cheapest members first and stops once the vote is settled
+    # (python -m src.ml.cascade calibrates it; only used with explanations disabled)
+    INFERENCE_ENGINE: str = "ensemble"
+    # Largest recorded table interpolation error accepted by the "table" engine;
+    # rows outside the table's BMI range are scored by the ensemble instead
+    RISK_TABLE_MAX_ERROR: float = 0.001
+    
+    # Per-prediction TreeSHAP contributions instead of the global feature importance
+    PREDICTION_EXPLANATIONS_ENABLED: bool = True
+    
+    # Prediction result cache settings
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_SIZE: int = 10000
+    PREDICTION_CACHE_BMI_DECIMALS: int = 6
+    
+    # Prometheus metrics at /metrics (see src.core.metrics)
+    METRICS_ENABLED: bool = True
+    
+    # Production server settings (python -m src.serve)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # 0 means one worker per CPU core
+    SERVER_WORKERS: int = 0
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_BACKLOG: int = 2048
+    # Seconds a worker gets to finish in-flight requests on restart or shutdown
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_WORKER_TIMEOUT_SECONDS: int = 60
+    # Recycle a worker after this many requests (0 disables), spread by the jitter
+    SERVER_MAX_REQUESTS: int = 0
+    SERVER_MAX_REQUESTS_JITTER: int = 0
 
     class Config:
         env_file = ".env.prod"
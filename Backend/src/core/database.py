@@ -1,5 +1,7 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from src.core.config import settings
+from src.core.metrics import pool_monitor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,7 +13,7 @@ class Database:
     @classmethod
     async def connect_to_database(cls):
         if cls.client is None:
-            cls.client = AsyncIOMotorClient(settings.MONGODB_URL)
+            cls.client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[pool_monitor])
             cls.db = cls.client[settings.MONGODB_DB_NAME]
 
     @classmethod
@@ -21,6 +23,18 @@ class Database:
             cls.client = None
             cls.db = None
 
+    @classmethod
+    async def ping(cls, timeout: float) -> bool:
+        """Whether the server answers a ping within `timeout` seconds."""
+        if cls.db is None:
+            return False
+        try:
+            await asyncio.wait_for(cls.db.command("ping"), timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Database ping failed: {str(e)}")
+            return False
+
     @classmethod
     def get_database(cls):
         if cls.db is None:
@@ -0,0 +1,251 @@
+"""
+Prometheus metrics for the API, served at /metrics.
+
+Recorded while requests run, one histogram observation each (in seconds):
+
+    diarisk_http_request_duration_seconds{method, route, status}
+        every request, labelled by route template so paths with ids share a series
+    diarisk_request_stage_duration_seconds{stage}
+        auth      JWT decode and validation
+        db_read   the user lookup behind every authenticated request
+        features  building the feature rows from the request body
+        inference scoring and explaining, including any wait in the micro-batcher
+                  and inference executor queues
+        db_write  storing predictions
+
+Read when scraped, from the objects that already keep them, so they cost
+nothing per request: the served model version, engine and load time, the
+inference executor's queue depth and counters, the micro-batchers' queue
+depths, the prediction cache counters and MongoDB connection pool usage
+(kept by a pymongo pool event listener).
+
+Under gunicorn with several workers, each worker has its own metrics. Set
+PROMETHEUS_MULTIPROC_DIR to an empty directory before starting the server to
+aggregate the histograms across workers; the scrape-time values then describe
+the worker that answered the scrape.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from pymongo import common, monitoring
+
+STAGES = ("auth", "db_read", "features", "inference", "db_write")
+# 0.5 ms to 10 s: inference and database calls sit at the low end, queued requests at the high end
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "diarisk_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "diarisk_request_stage_duration_seconds",
+    "Latency of each stage of request handling",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+# Resolve the label children once, so timing a stage is a dictionary lookup and an observe
+_stage_histograms = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record the time spent in the block under `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_histograms[stage].observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording each HTTP request's latency under its matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one series
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), status
+            ).observe(time.perf_counter() - started)
+
+
+class ConnectionPoolMonitor(monitoring.ConnectionPoolListener):
+    """Open and checked-out connections of each MongoDB server's pool, kept from pymongo's pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.max_size = {}
+        self.open = Counter()
+        self.checked_out = Counter()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.max_size), dict(self.open), dict(self.checked_out)
+
+    def _address(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        with self._lock:
+            self.max_size[self._address(event)] = event.options.get("maxPoolSize", common.MAX_POOL_SIZE)
+
+    def pool_closed(self, event):
+        address = self._address(event)
+        with self._lock:
+            self.max_size.pop(address, None)
+            self.open.pop(address, None)
+            self.checked_out.pop(address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open[self._address(event)] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open[self._address(event)] -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out[self._address(event)] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out[self._address(event)] -= 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+
+# Passed to the Motor client as an event listener (see src.core.database)
+pool_monitor = ConnectionPoolMonitor()
+
+
+class ServingCollector(Collector):
+    """Scrape-time metrics of the model registry, inference executor, micro-batchers, cache and MongoDB pool."""
+
+    def __init__(self, model_registry, executor, batchers: dict, prediction_cache):
+        self.model_registry = model_registry
+        self.executor = executor
+        self.batchers = batchers
+        self.prediction_cache = prediction_cache
+
+    def collect(self):
+        current = self.model_registry.current
+        model_info = GaugeMetricFamily(
+            "diarisk_model_info", "The served model version (value 1)", labels=["version", "engine", "fast_tier"]
+        )
+        load_seconds = GaugeMetricFamily(
+            "diarisk_model_load_duration_seconds", "Load and warm-up time of the served model version", labels=["version"]
+        )
+        if current is not None:
+            model_info.add_metric([current.name, current.prepared.engine_name, str(current.student is not None).lower()], 1)
+            if current.load_seconds is not None:
+                load_seconds.add_metric([current.name], current.load_seconds)
+        yield model_info
+        yield load_seconds
+
+        executor = self.executor.stats()
+        yield GaugeMetricFamily("diarisk_inference_queue_depth", "Inference jobs waiting for a worker thread", value=executor["queue_depth"])
+        yield GaugeMetricFamily("diarisk_inference_in_flight", "Inference jobs running", value=executor["in_flight"])
+        yield GaugeMetricFamily("diarisk_inference_max_queue_depth", "Inference queue depth beyond which jobs are rejected", value=executor["max_queue_depth"])
+        yield CounterMetricFamily("diarisk_inference_submitted", "Inference jobs submitted", value=executor["submitted"])
+        yield CounterMetricFamily("diarisk_inference_rejected", "Inference jobs rejected with a full queue", value=executor["rejected"])
+        yield CounterMetricFamily("diarisk_inference_timed_out", "Inference jobs that timed out", value=executor["timed_out"])
+
+        batcher_depth = GaugeMetricFamily("diarisk_predict_batcher_queue_depth", "Rows waiting in the micro-batcher", labels=["tier"])
+        batcher_rows = CounterMetricFamily("diarisk_predict_batcher_rows", "Rows scored through the micro-batcher", labels=["tier"])
+        batcher_batches = CounterMetricFamily("diarisk_predict_batcher_batches", "Batches scored by the micro-batcher", labels=["tier"])
+        for tier, batcher in self.batchers.items():
+            stats = batcher.stats()
+            batcher_depth.add_metric([tier], stats["queue_depth"])
+            batcher_rows.add_metric([tier], stats["rows_scored"])
+            batcher_batches.add_metric([tier], stats["batches"])
+        yield batcher_depth
+        yield batcher_rows
+        yield batcher_batches
+
+        cache = self.prediction_cache.stats()
+        yield GaugeMetricFamily("diarisk_prediction_cache_entries", "Cached prediction results", value=cache["entries"])
+        yield CounterMetricFamily("diarisk_prediction_cache_hits", "Prediction cache hits", value=cache["hits"])
+        yield CounterMetricFamily("diarisk_prediction_cache_misses", "Prediction cache misses", value=cache["misses"])
+
+        max_size, open_connections, checked_out = pool_monitor.snapshot()
+        pool_max = GaugeMetricFamily("diarisk_mongodb_pool_max_size", "Largest allowed MongoDB connection pool", labels=["address"])
+        pool_open = GaugeMetricFamily("diarisk_mongodb_pool_connections", "Open MongoDB connections", labels=["address"])
+        pool_used = GaugeMetricFamily("diarisk_mongodb_pool_checked_out", "MongoDB connections in use", labels=["address"])
+        for address in sorted(max_size.keys() | open_connections.keys()):
+            pool_max.add_metric([address], max_size.get(address, common.MAX_POOL_SIZE))
+            pool_open.add_metric([address], open_connections.get(address, 0))
+            pool_used.add_metric([address], checked_out.get(address, 0))
+        yield pool_max
+        yield pool_open
+        yield pool_used
+
+
+_serving_collector = None
+
+
+def register_serving_collector(model_registry, executor, batchers: dict, prediction_cache):
+    global _serving_collector
+    _serving_collector = ServingCollector(model_registry, executor, batchers, prediction_cache)
+    REGISTRY.register(_serving_collector)
+
+
+def render_metrics():
+    """(body, content type) of the metrics exposition, aggregated across workers in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if _serving_collector is not None:
+        registry.register(_serving_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int):
+    """Drop an exited worker's live multiprocess series (gunicorn child_exit hook)."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -2,21 +2,29 @@ from src.core.config import settings
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi import Request, APIRouter
 from contextlib import asynccontextmanager
 
 from src.core.database import db
+from src.core.metrics import MetricsMiddleware, register_serving_collector, render_metrics
 from src.auth.routes.login import router as login_router
 from src.auth.routes.signup import router as signup_router
-from src.api.health_data import router as health_router
+from src.api.health_data import router as health_router, batchers, executor, model_registry, prediction_cache
+from src.api.model_admin import router as model_admin_router
 import os
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await db.connect_to_database()
+    # Load and warm up the model in the background; /readyz reports when it's done
+    model_registry.start()
     yield
+    model_registry.stop()
+    for batcher in batchers.values():
+        await batcher.close()
+    executor.shutdown()
     await db.close_database_connection()
 
 app = FastAPI(
@@ -36,6 +44,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    # Outermost, so the recorded latency covers the whole middleware stack
+    app.add_middleware(MetricsMiddleware)
+    register_serving_collector(model_registry, executor, batchers, prediction_cache)
+
 templates = Jinja2Templates(directory="templates")
 
 # Auth routes
@@ -57,6 +70,43 @@ app.include_router(
     tags=["prediction"]
 )
 
+# Model registry administration
+app.include_router(
+    model_admin_router,
+    prefix=f"{settings.API_V1_STR}/admin/models",
+    tags=["admin"]
+)
+
+@app.get("/healthz", tags=["health"], summary="Liveness Probe")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["health"], summary="Readiness Probe")
+async def readyz():
+    """Ready once a model version is loaded and warmed up and the database answers a ping."""
+    current_model = model_registry.current
+    database_ok = await db.ping(settings.READINESS_DB_TIMEOUT_SECONDS)
+    ready = current_model is not None and database_ok
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not ready",
+            "model": {
+                "loaded": current_model is not None,
+                "version": current_model.name if current_model else None,
+                "warmed_up_at": current_model.loaded_at.isoformat() if current_model else None,
+                "error": model_registry.last_error
+            },
+            "database": {"connected": database_ok}
+        }
+    )
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", tags=["health"], summary="Prometheus Metrics", include_in_schema=False)
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
@@ -67,5 +117,5 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=settings.DEBUG
     ) 
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Directory container for named numpy arrays plus JSON metadata.
+
+Every array is its own .npy file, so readers can np.load it with
+mmap_mode="r": all processes on a host then map the same read-only
+page-cache copy instead of each holding a private one, and opening the
+container only parses meta.json.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+
+def _publish(tmp: Path, path: Path):
+    """
+    Rename the finished container `tmp` to `path`. If `path` already holds a
+    container with the same metadata (another process built the same thing),
+    it is kept and `tmp` is left for the caller to discard, so readers of it
+    are never disturbed. A different container is renamed aside first and
+    removed once the new one is in place; processes that already mapped its
+    arrays keep them.
+    """
+    aside = None
+    if path.exists():
+        try:
+            if load_meta(path) == load_meta(tmp):
+                logger.info(f"{path} already holds the same container; keeping it")
+                return
+        except (OSError, ValueError):
+            pass
+        aside = Path(tempfile.mkdtemp(prefix=f".{path.name}.old.", dir=path.parent))
+        try:
+            os.rename(path, aside / path.name)
+        except FileNotFoundError:
+            pass
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        logger.info(f"{path} was written concurrently; keeping the existing copy")
+    finally:
+        if aside is not None:
+            shutil.rmtree(aside, ignore_errors=True)
+
+
+def save_arrays(path: Path, arrays: Dict[str, np.ndarray], meta: dict):
+    """
+    Write the container to a temporary directory and rename it into place, so
+    readers never see a partial one. An existing container with the same
+    metadata is kept (so does a concurrent writer's copy that lands first);
+    one with different metadata is replaced.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+        with open(tmp / META_FILE, "w") as f:
+            json.dump({**meta, "arrays": sorted(arrays)}, f)
+        _publish(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@contextmanager
+def create_arrays(path: Path, specs: Dict[str, Tuple[tuple, np.dtype]], meta: dict) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Allocate the container's arrays, {name: (shape, dtype)}, as writable
+    memory-mapped files and yield them, so they can be filled piece by piece
+    without holding them in memory. On a clean exit `meta` (which the caller
+    may still update) is written and the container is published like
+    save_arrays does; on an error nothing is published.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        arrays = {
+            name: np.lib.format.open_memmap(tmp / f"{name}.npy", mode="w+", dtype=dtype, shape=shape)
+            for name, (shape, dtype) in specs.items()
+        }
+        yield arrays
+        for array in arrays.values():
+            array.flush()
+        del arrays
+        with open(tmp / META_FILE, "w") as f:
+            json.dump({**meta, "arrays": sorted(specs)}, f)
+        _publish(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_meta(path: Path) -> dict:
+    with open(Path(path) / META_FILE) as f:
+        return json.load(f)
+
+
+def load_arrays(
+    path: Path,
+    mmap_mode: Optional[str] = "r",
+    names: Optional[Iterable[str]] = None
+) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Open the container, memory-mapping every array unless `mmap_mode` is None.
+    With `names`, only those arrays are opened.
+    """
+    path = Path(path)
+    meta = load_meta(path)
+    stored = meta.pop("arrays")
+    if names is not None:
+        missing = set(names) - set(stored)
+        if missing:
+            raise KeyError(f"{path} has no arrays named {', '.join(sorted(missing))}")
+        stored = list(names)
+    arrays = {
+        name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        for name in stored
+    }
+    return arrays, meta
+
+
+def container_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in Path(path).iterdir())
@@ -0,0 +1,142 @@
+"""
+Content-addressed store of fitted ensemble members.
+
+A member's key is the sha256 of everything its fit depends on: the training
+data (the dataset's content hash, the feature list, the target and the
+number of rows held out from fitting), the member's estimator and
+parameters, and the versions of the libraries that fit it. Training looks
+every member up by its key and fits only the missing ones, so changing one
+member's parameters refits that member alone. Thread budgets
+are not part of the key; they change how fast a member fits, not what it
+learns.
+
+The saved artifact records its lineage: the data hash, each member's key, the
+voting setup and the library versions, plus a key over all of them. The
+lineage is stored in the artifact and in a <model>.lineage.json sidecar next
+to it. When the latest artifact's lineage key matches the one a run would
+produce, training saves no new version.
+
+Entries are joblib files named by their key, written under a temporary name
+and renamed, so an interrupted run never leaves a partial entry.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import joblib
+import lightgbm
+import numpy
+import sklearn
+import xgboost
+
+from src.ml.cascade import cascade_holdout_rows
+from src.ml.dataset_cache import dataset_sha256
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+LINEAGE_SUFFIX = ".lineage.json"
+
+
+def artifact_key(**fields) -> str:
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def library_versions() -> Dict[str, str]:
+    """Versions of the libraries whose fitted estimators are stored."""
+    return {
+        "numpy": numpy.__version__,
+        "scikit-learn": sklearn.__version__,
+        "xgboost": xgboost.__version__,
+        "lightgbm": lightgbm.__version__,
+    }
+
+
+def member_key(spec: dict, data_key: str, versions: Dict[str, str]) -> str:
+    """Key of one fitted member; n_jobs and "threads" are left out since they do not change the fit."""
+    params = {name: value for name, value in spec.get("params", {}).items() if name != "n_jobs"}
+    return artifact_key(
+        format_version=FORMAT_VERSION,
+        estimator=spec["estimator"],
+        params=params,
+        data=data_key,
+        versions=versions
+    )
+
+
+def training_lineage(config: dict, data_path: Path) -> dict:
+    """The lineage an artifact trained from `config` on the data at `data_path` will have."""
+    data = config["data"]
+    versions = library_versions()
+    data_fields = {
+        "sha256": dataset_sha256(data_path),
+        "features": data["features"],
+        "target": data["target"],
+        # Rows held out for the cascade calibration are not trained on
+        "holdout_rows": cascade_holdout_rows(config),
+    }
+    data_key = artifact_key(**data_fields)
+    members = {name: member_key(spec, data_key, versions) for name, spec in config["members"].items()}
+    lineage = {
+        "data": {**data_fields, "key": data_key},
+        "members": members,
+        "voting": config.get("voting", "soft"),
+        "weights": config.get("weights"),
+        "library_versions": versions,
+    }
+    return {"key": artifact_key(**lineage), **lineage}
+
+
+class ArtifactStore:
+    """Fitted members as <key>.joblib files in one directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.joblib"
+
+    def get(self, key: str):
+        """The stored object, or None if there is none or it cannot be read."""
+        path = self.path_for(key)
+        if not path.exists():
+            return None
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable artifact {path}: {str(e)}")
+            return None
+
+    def put(self, key: str, obj) -> Path:
+        path = self.path_for(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            joblib.dump(obj, f, protocol=4)
+        os.replace(tmp_path, path)
+        return path
+
+
+def lineage_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(LINEAGE_SUFFIX)
+
+
+def save_lineage(model_path: Path, lineage: dict) -> Path:
+    path = lineage_path_for(model_path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(lineage, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_lineage(model_path: Path) -> Optional[dict]:
+    """The lineage recorded next to an artifact, or None for artifacts trained before lineage was recorded."""
+    path = lineage_path_for(model_path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
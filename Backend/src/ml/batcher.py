@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the micro-batcher already holds its maximum number of pending rows."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one vectorized call.
+
+    Rows submitted within `window_ms` of the first pending row (or until
+    `max_batch_size` rows are waiting) are stacked and scored together with
+    `score_fn`, and each caller's future is resolved with its own row of the result.
+    Batches are flushed as separate tasks, so the next batch can start filling
+    while the previous one is still being scored.
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        window_ms: float,
+        max_batch_size: int,
+        max_queue_depth: int
+    ):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue_depth = max(self.max_batch_size, max_queue_depth)
+
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._has_items: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+        # Counters exposed through stats()
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.rows_scored = 0
+        self.max_observed_batch = 0
+        self.total_wait_seconds = 0.0
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+        self._loop = loop
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        if self._pending:
+            self._has_items.set()
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, row: np.ndarray) -> np.ndarray:
+        """Queue one feature row and wait for its scored output row."""
+        self._ensure_running()
+        if len(self._pending) >= self.max_queue_depth:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Prediction queue is full ({self.max_queue_depth} pending requests)"
+            )
+
+        future = self._loop.create_future()
+        self._pending.append((row, future))
+        self.requests += 1
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+
+            # Give other requests a chance to join, unless the batch is already full
+            started = time.perf_counter()
+            if not self._batch_full.is_set():
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self.total_wait_seconds += time.perf_counter() - started
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+            if not self._pending:
+                self._has_items.clear()
+
+            flush = self._loop.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        live = [(row, future) for row, future in batch if not future.cancelled()]
+        if not live:
+            return
+
+        self.batches += 1
+        self.rows_scored += len(live)
+        self.max_observed_batch = max(self.max_observed_batch, len(live))
+
+        try:
+            outputs = await self.score_fn(np.vstack([row for row, _ in live]))
+        except asyncio.CancelledError:
+            for _, future in live:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Error scoring batch of {len(live)} rows: {str(e)}")
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), output in zip(live, outputs):
+            if not future.done():
+                future.set_result(output)
+
+    async def close(self):
+        """Stop the background flush task and fail anything still waiting."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for flush in list(self._flushes):
+            flush.cancel()
+
+        for _, future in self._pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher shut down"))
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": len(self._pending),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "rows_scored": self.rows_scored,
+            "avg_batch_size": self.rows_scored / self.batches if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "avg_wait_ms": 1000 * self.total_wait_seconds / self.batches if self.batches else 0.0
+        }
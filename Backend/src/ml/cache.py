@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_key(row: np.ndarray, bmi_decimals: int) -> Tuple:
+    """
+    Hashable form of one raw feature row (BMI, Stroke, HeartDiseaseorAttack, Sex, Age).
+
+    BMI is rounded so that float noise from the height/weight division doesn't
+    split identical submissions; the other features are integers.
+    """
+    return (round(float(row[0]), bmi_decimals),) + tuple(int(value) for value in row[1:])
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of scoring results keyed by canonical feature row.
+
+    Entries belong to one model version; looking up or storing under a
+    different version drops everything cached for the previous one, so a newly
+    loaded model artifact never serves stale results.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self.model_version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, model_version: str):
+        if model_version != self.model_version:
+            if self._entries:
+                logger.info(
+                    f"Model version changed to {model_version}; "
+                    f"dropping {len(self._entries)} cached predictions"
+                )
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, model_version: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            self._check_version(model_version)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, model_version: str, key: Hashable, result: Any):
+        """Store a scoring result; callers must not mutate it afterwards."""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._check_version(model_version)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
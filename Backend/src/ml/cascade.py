@@ -0,0 +1,318 @@
+"""
+Confidence-based cascade over the soft-voting ensemble.
+
+Members are evaluated cheapest first. Once `min_members` have voted, a row
+stops early when its argmax is settled: either the remaining members' total
+vote weight can no longer overturn the partial vote's lead (exact, never
+changes the predicted class), or the partial vote's normalised margin
+reaches a threshold. Rows that stop early get the partial vote renormalised
+over the members evaluated, which approximates the full vote's probabilities.
+
+Calibration measures each member's single-row latency to fix the order,
+then picks the cheapest threshold and minimum member count that keep both
+the argmax disagreement with the full ensemble and the largest
+risk_probability error within their bounds on held-out rows. It writes
+<model>.cascade.json with the early-exit and disagreement rates and the
+risk errors. Without a calibration, every row runs the full vote.
+
+Per-row explanations describe the full vote, so the cascade is only served
+while they are disabled (see load_prepared_model).
+
+Usage:
+    python -m src.ml.cascade --model src/ml/models/diaHealth_012.joblib
+    python -m src.ml.cascade --model src/ml/models/diaHealth_012.joblib --data path/to/holdout.csv --max-disagreement 0.001 --max-risk-error 0.02
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_SUFFIX = ".cascade.json"
+# Rows training sets aside, unfitted, to calibrate on
+DEFAULT_HOLDOUT_ROWS = 20000
+
+Member = Tuple[str, Callable[[np.ndarray], np.ndarray], float]
+
+
+def calibration_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(CALIBRATION_SUFFIX)
+
+
+def cascade_holdout_rows(config: dict) -> int:
+    """Rows a training config sets aside for calibrating the cascade (0 when it is not calibrated)."""
+    if not config.get("calibrate_cascade", True):
+        return 0
+    return int(config.get("cascade_holdout_rows", DEFAULT_HOLDOUT_ROWS))
+
+
+def holdout_size(config: dict, n_rows: int) -> int:
+    """The configured holdout, capped at a fifth of the data so most rows are still trained on."""
+    return min(cascade_holdout_rows(config), n_rows // 5)
+
+
+def exit_mask(partial: np.ndarray, consumed: float, threshold: float) -> np.ndarray:
+    """
+    Rows of a partial weighted vote (weights summing to 1 overall, `consumed`
+    of it spent) whose final argmax is settled or whose normalised margin
+    reaches `threshold` (pass np.inf for exact exits only).
+    """
+    top_two = np.partition(partial, -2, axis=1)[:, -2:]
+    margin = top_two[:, 1] - top_two[:, 0]
+    # Remaining members can add at most their weight to the runner-up
+    certain = margin >= (1.0 - consumed) - 1e-12
+    return certain | (margin >= threshold * consumed)
+
+
+def stage_thresholds(n_members: int, threshold: Optional[float], min_members: int) -> List[Optional[float]]:
+    """
+    Margin threshold applied after each member: None (no exits) before
+    `min_members` have voted, then `threshold`, or np.inf (exact exits only)
+    when it is None.
+    """
+    threshold = np.inf if threshold is None else threshold
+    return [None if index + 1 < min_members else threshold for index in range(n_members)]
+
+
+class CascadeEnsemble:
+    """Soft vote evaluated member by member with per-row early exit."""
+
+    def __init__(
+        self,
+        members: List[Member],
+        mean: np.ndarray,
+        std: np.ndarray,
+        n_classes: int,
+        threshold: Optional[float] = None,
+        min_members: int = 1
+    ):
+        self.members = members
+        self.mean = mean
+        self.std = std
+        self.n_classes = n_classes
+        self.thresholds = stage_thresholds(len(members), threshold, min_members)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        scaled = (np.asarray(X, dtype=np.float64) - self.mean) / self.std
+        proba = np.zeros((scaled.shape[0], self.n_classes), dtype=np.float64)
+        active = np.arange(scaled.shape[0])
+        consumed = 0.0
+        for index, (_, predict_proba, weight) in enumerate(self.members):
+            member_proba = predict_proba(scaled[active])
+            proba[active] += weight * member_proba
+            consumed += weight
+            if index == len(self.members) - 1:
+                break
+            if self.thresholds[index] is None:
+                continue
+
+            done = exit_mask(proba[active], consumed, self.thresholds[index])
+            proba[active[done]] /= consumed
+            active = active[~done]
+            if active.size == 0:
+                break
+        return proba
+
+
+def default_order(members: List[Member]) -> List[str]:
+    """Without calibration, linear members (no trees to walk) go first."""
+    linear = [name for name, _, _ in members if "logistic" in name or "linear" in name]
+    return linear + [name for name, _, _ in members if name not in linear]
+
+
+def load_calibration(model_path: Path, source_sha256: str) -> Optional[dict]:
+    path = calibration_path_for(model_path)
+    if not path.exists():
+        logger.warning(f"Cascade calibration {path} not found; run `python -m src.ml.cascade` to build it")
+        return None
+    with open(path) as f:
+        calibration = json.load(f)
+    if calibration.get("source_sha256") != source_sha256:
+        logger.warning(f"Cascade calibration {path} was built from a different model artifact")
+        return None
+    return calibration
+
+
+def load_cascade(model_path: Path, model_data: dict, source_sha256: str) -> CascadeEnsemble:
+    """Cascade over the loaded ensemble, using the calibrated order and threshold when available."""
+    from src.ml.inference import PreparedModel
+
+    prepared = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    members = {name: (name, fn, weight) for name, fn, weight in prepared.members}
+    calibration = load_calibration(model_path, source_sha256)
+    if calibration is None:
+        # Even exact exits move risk_probability, by an amount only calibration measures
+        logger.warning("Cascade runs the full vote for every row until it is calibrated")
+        calibration = {"order": default_order(prepared.members), "threshold": None, "min_members": len(prepared.members)}
+    return CascadeEnsemble(
+        [members[name] for name in calibration["order"]],
+        prepared.mean,
+        prepared.std,
+        prepared.n_classes,
+        threshold=calibration["threshold"],
+        min_members=calibration["min_members"]
+    )
+
+
+def simulate(
+    member_proba: np.ndarray,
+    weights: np.ndarray,
+    costs: np.ndarray,
+    threshold: Optional[float],
+    min_members: int = 1,
+    risk_column: int = 2
+) -> dict:
+    """
+    Replay the cascade on precomputed member probabilities, (members, rows,
+    classes) in cascade order, and compare it with the full vote;
+    `risk_column` is the Diabetes probability's column.
+    """
+    n_members, n_rows, _ = member_proba.shape
+    thresholds = stage_thresholds(n_members, threshold, min_members)
+    full = np.einsum("m,mrk->rk", weights, member_proba)
+    output = np.zeros_like(full)
+    evaluated = np.full(n_rows, n_members)
+    active = np.arange(n_rows)
+    partial = np.zeros_like(full)
+    consumed = 0.0
+    for index in range(n_members - 1):
+        partial[active] += weights[index] * member_proba[index, active]
+        consumed += weights[index]
+        if thresholds[index] is None:
+            continue
+        done = exit_mask(partial[active], consumed, thresholds[index])
+        output[active[done]] = partial[active[done]] / consumed
+        evaluated[active[done]] = index + 1
+        active = active[~done]
+    output[active] = full[active]
+
+    risk_error = np.abs(output[:, risk_column] - full[:, risk_column])
+    cost = np.cumsum(costs)[evaluated - 1]
+    return {
+        "threshold": threshold,
+        "min_members": min_members,
+        "early_exit_rate": float((evaluated < n_members).mean()),
+        "disagreement_rate": float((output.argmax(axis=1) != full.argmax(axis=1)).mean()),
+        "mean_members_evaluated": float(evaluated.mean()),
+        "exits_by_members_evaluated": np.bincount(evaluated, minlength=n_members + 1)[1:].tolist(),
+        "risk_mean_abs_error": float(risk_error.mean()),
+        "risk_p99_abs_error": float(np.quantile(risk_error, 0.99)),
+        "risk_max_abs_error": float(risk_error.max()),
+        "relative_cost": float(cost.mean() / costs.sum()),
+    }
+
+
+def _single_row_ms(predict_proba, scaled: np.ndarray, repeats: int) -> float:
+    predict_proba(scaled[:1])
+    started = time.perf_counter()
+    for i in range(repeats):
+        predict_proba(scaled[i % len(scaled):i % len(scaled) + 1])
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def calibrate_cascade(
+    model_data: dict,
+    X: np.ndarray,
+    max_disagreement: float = 0.001,
+    max_risk_error: float = 0.02,
+    repeats: int = 50
+) -> dict:
+    """
+    Order the members by measured single-row latency, then pick the margin
+    threshold and minimum member count with the lowest expected cost whose
+    argmax disagreement with the full vote on the held-out rows X stays within
+    `max_disagreement` and whose largest risk_probability error stays within
+    `max_risk_error`. If nothing qualifies, every row runs the full vote.
+    Returns the calibration with its holdout report.
+    """
+    from src.ml.inference import DIABETES_CLASS, PreparedModel
+
+    prepared = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    scaled = prepared.scale(np.asarray(X, dtype=np.float64))
+    risk_column = int(np.flatnonzero(prepared.classes == DIABETES_CLASS)[0])
+
+    costs: Dict[str, float] = {
+        name: _single_row_ms(predict_proba, scaled, repeats) for name, predict_proba, _ in prepared.members
+    }
+    members = sorted(prepared.members, key=lambda member: costs[member[0]])
+    member_proba = np.stack([predict_proba(scaled) for _, predict_proba, _ in members])
+    weights = np.array([weight for _, _, weight in members])
+    ordered_costs = np.array([costs[name] for name, _, _ in members])
+
+    def within_bounds(candidate: dict) -> bool:
+        return candidate["disagreement_rate"] <= max_disagreement and candidate["risk_max_abs_error"] <= max_risk_error
+
+    chosen = simulate(member_proba, weights, ordered_costs, None, len(members), risk_column)
+    for min_members in range(1, len(members)):
+        # Exact exits first, then lower thresholds, which exit more often and err more;
+        # stop at the first one over either bound
+        for threshold in [None] + [float(t) for t in np.round(np.arange(0.95, 0.0, -0.05), 2)]:
+            candidate = simulate(member_proba, weights, ordered_costs, threshold, min_members, risk_column)
+            if not within_bounds(candidate):
+                break
+            if candidate["relative_cost"] < chosen["relative_cost"]:
+                chosen = candidate
+
+    return {
+        "order": [name for name, _, _ in members],
+        "member_single_row_ms": {name: costs[name] for name, _, _ in members},
+        "threshold": chosen["threshold"],
+        "min_members": chosen["min_members"],
+        "max_disagreement": max_disagreement,
+        "max_risk_error": max_risk_error,
+        "holdout_rows": int(scaled.shape[0]),
+        "report": chosen,
+        "exact_exits_only": simulate(member_proba, weights, ordered_costs, None, 1, risk_column),
+    }
+
+
+def save_calibration(model_path: Path, source_sha256: str, calibration: dict) -> Path:
+    path = calibration_path_for(model_path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"source_sha256": source_sha256, **calibration}, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate the early-exit cascade over the served ensemble.")
+    parser.add_argument("--model", default=str(Path(__file__).parent / "models" / "diaHealth_012.joblib"))
+    parser.add_argument("--data", default=None, help="CSV with the feature columns of rows the model was not trained on")
+    parser.add_argument("--samples", type=int, default=20000, help="Synthetic holdout rows when no --data is given")
+    parser.add_argument("--max-disagreement", type=float, default=0.001, help="Allowed argmax disagreement with the full vote")
+    parser.add_argument("--max-risk-error", type=float, default=0.02, help="Allowed risk_probability error against the full vote")
+    args = parser.parse_args(argv)
+
+    import joblib
+    import pandas as pd
+    from src.ml.compiled import synthetic_inputs
+    from src.ml.inference import file_sha256
+
+    model_path = Path(args.model)
+    print(f"Loading {model_path}...")
+    with open(model_path, "rb") as f:
+        model_data = joblib.load(f)
+
+    if args.data:
+        X = pd.read_csv(args.data)[list(model_data["feature_names"])].to_numpy(dtype=np.float64)
+    else:
+        X = synthetic_inputs(args.samples)
+
+    calibration = calibrate_cascade(model_data, X, args.max_disagreement, args.max_risk_error)
+    print(json.dumps(calibration, indent=2))
+
+    path = save_calibration(model_path, file_sha256(model_path), calibration)
+    print(f"Saved cascade calibration to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,598 @@
+"""
+Export a trained soft-voting ensemble into flat numpy arrays and evaluate it
+without scikit-learn, XGBoost or LightGBM on the request path.
+
+Every tree of every tree member is stored in one contiguous node table
+(feature, threshold, left, right, leaf value, training cover). Thresholds are rewritten into
+raw feature space, so the StandardScaler disappears, and the logistic
+regression member is folded into a single affine term.
+
+The exported artifact is a directory of .npy arrays plus meta.json (see
+array_store) that serving memory-maps read-only, so every worker on a host
+shares one page-cache copy of the node tables.
+
+Usage:
+    python -m src.ml.compiled --model src/ml/models/diaHealth_012.joblib
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.ml.array_store import container_size, load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 3
+
+# How each member's summed tree outputs become class probabilities
+LINK_SOFTMAX = "softmax"
+LINK_IDENTITY = "identity"
+LINK_OVR = "ovr"
+
+# Serving checks every freshly compiled artifact against its source on this many synthetic rows
+VERIFY_ROWS = 2000
+VERIFY_ATOL = 1e-6
+
+
+class _TreeTable:
+    """Accumulates nodes of many trees into flat arrays with absolute child indices."""
+
+    def __init__(self, n_classes: int):
+        self.n_classes = n_classes
+        self.feature: List[np.ndarray] = []
+        self.threshold: List[np.ndarray] = []
+        self.left: List[np.ndarray] = []
+        self.right: List[np.ndarray] = []
+        self.value: List[np.ndarray] = []
+        self.cover: List[np.ndarray] = []
+        self.roots: List[int] = []
+        self.n_nodes = 0
+        self.max_depth = 0
+
+    def add_tree(self, feature, threshold, left, right, value, cover, depth: int):
+        """
+        Add one tree given per-node arrays with tree-local child indices
+        (-1 for leaves), a (n_nodes, n_classes) leaf value matrix and the
+        training cover (sample count or hessian sum) of each node.
+        """
+        feature = np.asarray(feature, dtype=np.int32)
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        is_leaf = left < 0
+        local = np.arange(len(feature))
+
+        # Leaves point at themselves, so traversal can run a fixed number of steps
+        self.feature.append(np.where(is_leaf, 0, feature).astype(np.int32))
+        self.threshold.append(np.where(is_leaf, np.inf, np.asarray(threshold, dtype=np.float64)))
+        self.left.append((np.where(is_leaf, local, left) + self.n_nodes).astype(np.int32))
+        self.right.append((np.where(is_leaf, local, right) + self.n_nodes).astype(np.int32))
+        self.value.append(np.where(is_leaf[:, None], np.asarray(value, dtype=np.float64), 0.0))
+        self.cover.append(np.asarray(cover, dtype=np.float64))
+        self.roots.append(self.n_nodes)
+        self.n_nodes += len(feature)
+        self.max_depth = max(self.max_depth, depth)
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def _float_key(x: np.ndarray) -> np.ndarray:
+    """Map float64 values onto int64 keys with the same ordering."""
+    bits = x.view(np.int64)
+    return np.where(bits < 0, np.int64(-(2 ** 63)) - bits, bits)
+
+
+def _key_float(key: np.ndarray) -> np.ndarray:
+    bits = np.where(key < 0, np.int64(-(2 ** 63)) - key, key)
+    return bits.view(np.float64)
+
+
+def _scaled_float64(x, mean, scale):
+    return (x - mean) / scale
+
+
+def _scaled_float32(x, mean, scale):
+    return ((x - mean) / scale).astype(np.float32)
+
+
+# Split semantics of each library, applied to raw values x of one feature:
+# go left iff split(scaled(x), threshold)
+SPLIT_RULES = {
+    # XGBoost casts inputs to float32 and splits on `x < t`
+    "xgboost": lambda x, t, mean, scale: _scaled_float32(x, mean, scale) < t.astype(np.float32),
+    # LightGBM (and HistGradientBoosting) compare doubles with `x <= t`
+    "lightgbm": lambda x, t, mean, scale: _scaled_float64(x, mean, scale) <= t,
+    # scikit-learn trees cast inputs to float32 and compare against float64 thresholds
+    "sklearn": lambda x, t, mean, scale: _scaled_float32(x, mean, scale).astype(np.float64) <= t,
+}
+
+
+def _raw_thresholds(features: np.ndarray, thresholds: np.ndarray, mean: np.ndarray, scale: np.ndarray, rule: str) -> np.ndarray:
+    """
+    Rewrite scaled-space split thresholds into raw feature space.
+
+    Returns, per node, the largest float64 raw value r for which the library's
+    own split (including its float32 casts) sends the scaled value left, so
+    `x_raw <= r` reproduces the original decision exactly. Found by bisection
+    over the ordered float64 values around the analytic estimate t * scale + mean.
+    """
+    split = SPLIT_RULES[rule]
+    features = np.asarray(features)
+    result = np.full(len(features), np.inf)
+    internal = features >= 0
+    if not internal.any():
+        return result
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)[internal]
+    mean = mean[features[internal]]
+    scale = scale[features[internal]]
+    estimate = thresholds * scale + mean
+
+    # Bracket [lo, hi] with lo going left and hi going right
+    width = 1e-6 * (np.abs(estimate) + 1.0)
+    lo = estimate - width
+    hi = estimate + width
+    for _ in range(60):
+        lo_bad = ~split(lo, thresholds, mean, scale)
+        hi_bad = split(hi, thresholds, mean, scale)
+        if not (lo_bad.any() or hi_bad.any()):
+            break
+        width = np.where(lo_bad | hi_bad, width * 16, width)
+        lo = np.where(lo_bad, estimate - width, lo)
+        hi = np.where(hi_bad, estimate + width, hi)
+    else:
+        raise ValueError("Could not bracket split thresholds in raw feature space")
+
+    lo_key = _float_key(lo)
+    hi_key = _float_key(hi)
+    while np.any(hi_key - lo_key > 1):
+        mid_key = lo_key + (hi_key - lo_key) // 2
+        goes_left = split(_key_float(mid_key), thresholds, mean, scale)
+        lo_key = np.where(goes_left, mid_key, lo_key)
+        hi_key = np.where(goes_left, hi_key, mid_key)
+    result[internal] = _key_float(lo_key)
+    return result
+
+
+def _export_xgboost(estimator, table: _TreeTable, mean, scale) -> np.ndarray:
+    booster = estimator.get_booster()
+    model = json.loads(booster.save_raw("json"))
+    learner = model["learner"]
+    if learner["gradient_booster"]["name"] != "gbtree":
+        raise NotImplementedError("Only gbtree XGBoost models can be compiled")
+
+    trees = learner["gradient_booster"]["model"]["trees"]
+    tree_info = learner["gradient_booster"]["model"]["tree_info"]
+    for tree, class_index in zip(trees, tree_info):
+        left = np.asarray(tree["left_children"])
+        right = np.asarray(tree["right_children"])
+        feature = np.asarray(tree["split_indices"])
+        condition = np.asarray(tree["split_conditions"], dtype=np.float64)
+
+        threshold = _raw_thresholds(feature, condition, mean, scale, "xgboost")
+        value = np.zeros((len(left), table.n_classes))
+        value[:, class_index] = condition
+        table.add_tree(feature, threshold, left, right, value, tree["sum_hessian"], _tree_depth(left, right))
+
+    base_score = learner["learner_model_param"]["base_score"].strip("[]").split(",")
+    bias = np.asarray([float(v) for v in base_score], dtype=np.float64)
+    return np.broadcast_to(bias, (table.n_classes,)).copy()
+
+
+def _flatten_lightgbm_tree(structure: dict):
+    feature, threshold, left, right, leaf_value, count = [], [], [], [], [], []
+
+    def visit(node: dict) -> int:
+        index = len(feature)
+        feature.append(-1)
+        threshold.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        leaf_value.append(0.0)
+        count.append(node.get("leaf_count", node.get("internal_count", 0)))
+        if "leaf_value" in node:
+            leaf_value[index] = node["leaf_value"]
+            return index
+        if node["decision_type"] != "<=":
+            raise NotImplementedError("Categorical LightGBM splits cannot be compiled")
+        feature[index] = node["split_feature"]
+        threshold[index] = node["threshold"]
+        left[index] = visit(node["left_child"])
+        right[index] = visit(node["right_child"])
+        return index
+
+    visit(structure)
+    return (
+        np.asarray(feature), np.asarray(threshold, dtype=np.float64),
+        np.asarray(left), np.asarray(right), np.asarray(leaf_value, dtype=np.float64),
+        np.asarray(count, dtype=np.float64)
+    )
+
+
+def _export_lightgbm(estimator, table: _TreeTable, mean, scale) -> np.ndarray:
+    dump = estimator.booster_.dump_model()
+    trees_per_iteration = dump["num_tree_per_iteration"]
+    for tree in dump["tree_info"]:
+        feature, threshold, left, right, leaf_value, count = _flatten_lightgbm_tree(tree["tree_structure"])
+        value = np.zeros((len(left), table.n_classes))
+        value[:, tree["tree_index"] % trees_per_iteration] = leaf_value
+        table.add_tree(
+            feature, _raw_thresholds(feature, threshold, mean, scale, "lightgbm"),
+            left, right, value, count, _tree_depth(left, right)
+        )
+    return np.zeros(table.n_classes)
+
+
+def _export_sklearn_tree(tree, table: _TreeTable, value: np.ndarray, mean, scale):
+    table.add_tree(
+        tree.feature,
+        _raw_thresholds(tree.feature, tree.threshold, mean, scale, "sklearn"),
+        tree.children_left,
+        tree.children_right,
+        value,
+        tree.weighted_n_node_samples,
+        int(tree.max_depth)
+    )
+
+
+def _export_random_forest(estimator, table: _TreeTable, mean, scale) -> np.ndarray:
+    n_trees = len(estimator.estimators_)
+    for tree_estimator in estimator.estimators_:
+        tree = tree_estimator.tree_
+        value = tree.value[:, 0, :table.n_classes].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        value = np.divide(value, totals, out=np.zeros_like(value), where=totals > 0)
+        _export_sklearn_tree(tree, table, value / n_trees, mean, scale)
+    return np.zeros(table.n_classes)
+
+
+def _export_gradient_boosting(estimator, table: _TreeTable, mean, scale) -> np.ndarray:
+    init = estimator.init_
+    if init == "zero":
+        bias = np.zeros(table.n_classes)
+    elif hasattr(init, "class_prior_"):
+        # Softmax is shift invariant, so log priors match the loss's symmetric link
+        bias = np.log(np.clip(init.class_prior_, np.finfo(np.float64).eps, None))
+    else:
+        raise NotImplementedError(f"Unsupported GradientBoosting init estimator: {init!r}")
+
+    for stage in estimator.estimators_:
+        for class_index, tree_estimator in enumerate(stage):
+            tree = tree_estimator.tree_
+            value = np.zeros((tree.node_count, table.n_classes))
+            value[:, class_index] = estimator.learning_rate * tree.value[:, 0, 0]
+            _export_sklearn_tree(tree, table, value, mean, scale)
+    return bias
+
+
+def _export_hist_gradient_boosting(estimator, table: _TreeTable, mean, scale) -> np.ndarray:
+    if estimator.n_trees_per_iteration_ != table.n_classes:
+        raise NotImplementedError("Only multiclass HistGradientBoosting models can be compiled")
+
+    for iteration in estimator._predictors:
+        for class_index, predictor in enumerate(iteration):
+            nodes = predictor.nodes
+            if nodes["is_categorical"].any():
+                raise NotImplementedError("Categorical HistGradientBoosting splits cannot be compiled")
+            is_leaf = nodes["is_leaf"].astype(bool)
+            feature = np.where(is_leaf, -1, nodes["feature_idx"].astype(np.int64))
+            left = np.where(is_leaf, -1, nodes["left"].astype(np.int64))
+            right = np.where(is_leaf, -1, nodes["right"].astype(np.int64))
+            value = np.zeros((len(nodes), table.n_classes))
+            # Leaf values already include the learning rate
+            value[:, class_index] = nodes["value"]
+            table.add_tree(
+                feature, _raw_thresholds(feature, nodes["num_threshold"], mean, scale, "lightgbm"),
+                left, right, value, nodes["count"], _tree_depth(left, right)
+            )
+    return np.asarray(estimator._baseline_prediction, dtype=np.float64).ravel()
+
+
+TREE_EXPORTERS = {
+    "XGBClassifier": (_export_xgboost, LINK_SOFTMAX),
+    "LGBMClassifier": (_export_lightgbm, LINK_SOFTMAX),
+    "RandomForestClassifier": (_export_random_forest, LINK_IDENTITY),
+    "GradientBoostingClassifier": (_export_gradient_boosting, LINK_SOFTMAX),
+    "HistGradientBoostingClassifier": (_export_hist_gradient_boosting, LINK_SOFTMAX),
+}
+
+
+def _fold_linear(estimator, mean, scale) -> Tuple[np.ndarray, np.ndarray, str]:
+    """Fold the scaler into the linear member: W (x - mu) / s + b = (W / s) x + (b - W mu / s)."""
+    coef = np.asarray(estimator.coef_, dtype=np.float64)
+    intercept = np.asarray(estimator.intercept_, dtype=np.float64)
+    raw_coef = coef / scale
+    raw_intercept = intercept - raw_coef @ mean
+    multi_class = getattr(estimator, "multi_class", "auto")
+    link = LINK_OVR if multi_class == "ovr" else LINK_SOFTMAX
+    return raw_coef, raw_intercept, link
+
+
+def compile_ensemble(model, scaler, feature_names: List[str]) -> "CompiledEnsemble":
+    """Flatten a fitted soft-voting ensemble and its StandardScaler into a CompiledEnsemble."""
+    from src.ml.inference import ensemble_feature_importance
+
+    if getattr(model, "voting", "soft") != "soft":
+        raise NotImplementedError("Only soft-voting ensembles can be compiled")
+
+    classes = np.asarray(model.classes_)
+    n_classes = len(classes)
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    estimators = list(model.estimators_)
+    names = [name for name, _ in model.estimators]
+    weights = np.ones(len(estimators)) if model.weights is None else np.asarray(model.weights, dtype=np.float64)
+    weights = weights / weights.sum()
+
+    table = _TreeTable(n_classes)
+    members = []
+    tree_members = []
+    linear_coef, linear_intercept, linear_weights, linear_links = [], [], [], []
+
+    for name, estimator, weight in zip(names, estimators, weights):
+        kind = type(estimator).__name__
+        if kind in TREE_EXPORTERS:
+            exporter, link = TREE_EXPORTERS[kind]
+            first_tree = len(table.roots)
+            bias = exporter(estimator, table, mean, scale)
+            tree_members.append((first_tree, bias, link, weight))
+            members.append({"name": name, "kind": kind, "link": link, "weight": float(weight),
+                            "n_trees": len(table.roots) - first_tree})
+        elif hasattr(estimator, "coef_"):
+            coef, intercept, link = _fold_linear(estimator, mean, scale)
+            linear_coef.append(coef)
+            linear_intercept.append(intercept)
+            linear_weights.append(weight)
+            linear_links.append(link)
+            members.append({"name": name, "kind": kind, "link": link, "weight": float(weight)})
+        else:
+            raise NotImplementedError(f"Cannot compile ensemble member {name} ({kind})")
+
+    arrays = {
+        "feature": np.concatenate(table.feature),
+        "threshold": np.concatenate(table.threshold),
+        "left": np.concatenate(table.left),
+        "right": np.concatenate(table.right),
+        "value": np.concatenate(table.value),
+        "cover": np.concatenate(table.cover),
+        "roots": np.asarray(table.roots, dtype=np.int32),
+        "tree_member_starts": np.asarray([start for start, _, _, _ in tree_members], dtype=np.int64),
+        "tree_member_bias": np.asarray([bias for _, bias, _, _ in tree_members], dtype=np.float64),
+        "tree_member_weight": np.asarray([weight for _, _, _, weight in tree_members], dtype=np.float64),
+        "linear_coef": np.asarray(linear_coef, dtype=np.float64).reshape(-1, n_classes, len(feature_names)),
+        "linear_intercept": np.asarray(linear_intercept, dtype=np.float64).reshape(-1, n_classes),
+        "linear_weight": np.asarray(linear_weights, dtype=np.float64),
+        "scaler_mean": mean,
+        "scaler_scale": scale,
+        "classes": classes,
+    }
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "feature_names": list(feature_names),
+        "n_classes": n_classes,
+        "max_depth": table.max_depth,
+        "tree_member_links": [link for _, _, link, _ in tree_members],
+        "linear_links": linear_links,
+        "members": members,
+        "feature_importance": ensemble_feature_importance(estimators, weights, list(feature_names)),
+    }
+    return CompiledEnsemble(arrays, meta)
+
+
+def _softmax(raw: np.ndarray) -> np.ndarray:
+    raw = raw - raw.max(axis=-1, keepdims=True)
+    np.exp(raw, out=raw)
+    raw /= raw.sum(axis=-1, keepdims=True)
+    return raw
+
+
+def _apply_link(raw: np.ndarray, link: str) -> np.ndarray:
+    if link == LINK_SOFTMAX:
+        return _softmax(raw)
+    if link == LINK_OVR:
+        proba = 1.0 / (1.0 + np.exp(-raw))
+        return proba / proba.sum(axis=-1, keepdims=True)
+    return raw
+
+
+class CompiledEnsemble:
+    """Pure-numpy evaluator over the flattened ensemble produced by compile_ensemble."""
+
+    # Rows per traversal chunk; bounds the (rows, trees) index matrices
+    CHUNK_ROWS = 1024
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict):
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format: {meta.get('format_version')}")
+        self.arrays = arrays
+        self.meta = meta
+        self.feature_names = meta["feature_names"]
+        self.n_classes = meta["n_classes"]
+        self.max_depth = meta["max_depth"]
+        for key, value in arrays.items():
+            setattr(self, key, value)
+        # Interleaved (left, right) pairs so each step needs a single gather
+        self._children = np.stack([self.left, self.right], axis=1).ravel()
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def split_thresholds(self, feature_index: int) -> np.ndarray:
+        """Sorted unique raw-space thresholds of all tree splits on one feature."""
+        internal = self.left != np.arange(len(self.left))
+        return np.unique(self.threshold[internal & (self.feature == feature_index)])
+
+    def leaf_indices(self, X: np.ndarray) -> np.ndarray:
+        """Absolute leaf node index reached by each row in each tree, shape (n, n_trees)."""
+        n_rows, n_features = X.shape
+        flat_X = np.ascontiguousarray(X, dtype=np.float64).ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self._children[2 * nodes + go_right]
+        return nodes
+
+    def member_probabilities(self, X: np.ndarray) -> np.ndarray:
+        """Per-member class probabilities, shape (n, n_members, n_classes); tree members first."""
+        X = np.asarray(X, dtype=np.float64)
+        outputs = []
+
+        if self.n_trees:
+            leaves = self.leaf_indices(X)
+            raw = np.add.reduceat(self.value[leaves], self.tree_member_starts, axis=1)
+            raw += self.tree_member_bias
+            for index, link in enumerate(self.meta["tree_member_links"]):
+                outputs.append(_apply_link(raw[:, index, :], link))
+
+        for coef, intercept, link in zip(self.linear_coef, self.linear_intercept, self.meta["linear_links"]):
+            outputs.append(_apply_link(X @ coef.T + intercept, link))
+
+        return np.stack(outputs, axis=1)
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        weights = np.concatenate([self.tree_member_weight, self.linear_weight])
+        return np.einsum("nmk,m->nk", self.member_probabilities(X), weights)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for an (n, n_features) matrix of raw, unscaled features."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.shape[0] <= self.CHUNK_ROWS:
+            return self._predict_chunk(X)
+        return np.concatenate([
+            self._predict_chunk(X[start:start + self.CHUNK_ROWS])
+            for start in range(0, X.shape[0], self.CHUNK_ROWS)
+        ])
+
+    def save(self, path: Path):
+        save_arrays(path, self.arrays, self.meta)
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode: Optional[str] = "r") -> "CompiledEnsemble":
+        """Open a saved artifact; with mmap_mode="r" the arrays stay in the shared page cache."""
+        arrays, meta = load_arrays(path, mmap_mode=mmap_mode)
+        return cls(arrays, meta)
+
+
+def compiled_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(".compiled")
+
+
+def load_or_compile(model_path: Path, source_sha256: str, model_data: Optional[dict] = None) -> CompiledEnsemble:
+    """
+    Memory-map the exported evaluator next to `model_path` if it was built
+    from the same artifact. Otherwise compile the ensemble (unpickling it if
+    `model_data` isn't given), check it against the ensemble's own
+    predict_proba, save it there for other workers and map it. Raises
+    ValueError if the compiled probabilities differ by more than VERIFY_ATOL,
+    so a bad export is never saved or served.
+    """
+    path = compiled_path_for(model_path)
+    if path.exists():
+        try:
+            compiled = CompiledEnsemble.load(path)
+        except (ValueError, OSError, KeyError) as e:
+            logger.warning(f"Cannot use compiled model at {path} ({str(e)}); recompiling")
+        else:
+            if compiled.meta.get("source_sha256") == source_sha256:
+                logger.info(f"Memory-mapped compiled model from {path}")
+                return compiled
+            logger.warning(f"Compiled model at {path} was built from a different artifact; recompiling")
+
+    if model_data is None:
+        import joblib
+        with open(model_path, "rb") as f:
+            model_data = joblib.load(f)
+
+    from src.ml.inference import PreparedModel
+
+    compiled = compile_ensemble(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    reference = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    report = verify_compiled(compiled, reference.predict_proba, synthetic_inputs(VERIFY_ROWS))
+    if report["max_abs_diff"] > VERIFY_ATOL:
+        raise ValueError(
+            f"Compiled model for {model_path} differs from the ensemble by up to "
+            f"{report['max_abs_diff']:.3g} (allowed {VERIFY_ATOL:.3g})"
+        )
+    compiled.meta["source_sha256"] = source_sha256
+    compiled.meta["verification"] = report
+    try:
+        compiled.save(path)
+        return CompiledEnsemble.load(path)
+    except OSError as e:
+        logger.warning(f"Could not save compiled model to {path} ({str(e)}); serving it from process memory")
+        return compiled
+
+
+def synthetic_inputs(n: int, seed: int = 42) -> np.ndarray:
+    """Random raw rows covering the served input space: BMI, three binary flags and the BRFSS age group."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(12.0, 70.0, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(1, 14, n)
+    ]).astype(np.float64)
+
+
+def verify_compiled(compiled: CompiledEnsemble, reference_proba, X: np.ndarray) -> dict:
+    """Compare the compiled evaluator against a reference predict_proba on raw rows X."""
+    expected = reference_proba(X)
+    actual = compiled.predict_proba(X)
+    diff = np.abs(actual - expected)
+    return {
+        "rows": int(X.shape[0]),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "argmax_agreement": float((actual.argmax(axis=1) == expected.argmax(axis=1)).mean()),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compile the served ensemble into flat numpy arrays.")
+    parser.add_argument("--model", default=str(Path(__file__).parent / "models" / "diaHealth_012.joblib"))
+    parser.add_argument("--out", default=None, help="Output directory (default: <model>.compiled)")
+    parser.add_argument("--samples", type=int, default=20000, help="Synthetic rows used for verification")
+    parser.add_argument("--atol", type=float, default=1e-5, help="Maximum allowed probability difference")
+    args = parser.parse_args(argv)
+
+    import joblib
+    from src.ml.inference import PreparedModel, file_sha256
+
+    model_path = Path(args.model)
+    out_path = Path(args.out) if args.out else compiled_path_for(model_path)
+
+    print(f"Loading {model_path}...")
+    model_data = joblib.load(model_path)
+    compiled = compile_ensemble(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    compiled.meta["source_sha256"] = file_sha256(model_path)
+    print(f"Compiled {compiled.n_trees} trees ({len(compiled.feature)} nodes, max depth {compiled.max_depth})")
+
+    prepared = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+    report = verify_compiled(compiled, prepared.predict_proba, synthetic_inputs(args.samples))
+    print(json.dumps(report, indent=2))
+    if report["max_abs_diff"] > args.atol:
+        print(f"Verification failed: max difference {report['max_abs_diff']:.3g} exceeds {args.atol:.3g}")
+        return 1
+
+    compiled.save(out_path)
+    print(f"Saved compiled model to {out_path} ({container_size(out_path) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
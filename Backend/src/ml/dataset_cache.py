@@ -0,0 +1,324 @@
+"""
+Columnar on-disk cache for the training CSVs.
+
+The first time a CSV is read, it is converted in chunks (so files larger
+than memory convert too) and every column is written as its own .npy file
+(an array_store container next to it, <name>.columns) in the smallest dtype
+that holds it exactly: integer columns, and float columns whose values are
+all whole numbers (flags, ages, the BRFSS BMI), become the narrowest integer
+type; other numeric columns become float32; text columns are stored as
+integer category codes. Later reads open only the requested columns,
+memory-mapped, instead of parsing the CSV again.
+
+The container records the sha256 of the CSV it was built from and is
+rebuilt when the source changes.
+
+Datasets that grow over time (such as exported predictions) are stored as a
+directory of segments instead: each append writes one more container and
+then atomically updates manifest.json. Every reader here accepts such a
+directory wherever it accepts a CSV.
+
+Usage (from the Backend directory):
+    python -m src.ml.dataset_cache                  # convert every CSV under src/ml/datasets
+    python -m src.ml.dataset_cache path/to/data.csv
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.ml import array_store
+from src.ml.inference import file_sha256
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".columns"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+DATASETS_DIR = Path(__file__).parent / "datasets"
+
+INTEGER_TYPES = [np.uint8, np.uint16, np.uint32, np.int8, np.int16, np.int32, np.int64]
+# Rows parsed at a time while converting a CSV
+CHUNK_ROWS = 250_000
+# Text columns with more distinct values than this are rejected rather than stored as category codes
+MAX_CATEGORIES = 65_535
+
+
+def cache_path_for(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(CACHE_SUFFIX)
+
+
+def smallest_integer_type(low: int, high: int) -> np.dtype:
+    for dtype in INTEGER_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise ValueError(f"No integer type holds [{low}, {high}]")
+
+
+class ColumnStats:
+    """What one pass over a column's chunks learns about it, enough to choose its stored dtype."""
+
+    def __init__(self):
+        self.text = False
+        self.integer = True
+        self.whole = True
+        self.low = np.inf
+        self.high = -np.inf
+        # Distinct strings, kept until the column is clearly not categorical
+        self.values: Optional[set] = set()
+
+    def update(self, series: pd.Series):
+        if self.values is not None:
+            self.values.update(str(value) for value in series.dropna().unique())
+            if len(self.values) > MAX_CATEGORIES:
+                self.values = None
+        if not pd.api.types.is_numeric_dtype(series.dtype):
+            self.text = True
+            return
+        values = series.to_numpy()
+        if values.size == 0:
+            return
+        if not (np.issubdtype(values.dtype, np.integer) or pd.api.types.is_bool_dtype(values.dtype)):
+            self.integer = False
+            values = values.astype(np.float64)
+            if not np.isfinite(values).all() or not (values == np.round(values)).all():
+                self.whole = False
+        finite = values[np.isfinite(values)] if values.dtype.kind == "f" else values
+        if finite.size:
+            self.low = min(self.low, float(finite.min()))
+            self.high = max(self.high, float(finite.max()))
+
+    def dtype(self, name: str):
+        """(dtype, categories) to store the column in; categories is None unless the column holds text."""
+        if self.text:
+            if self.values is None:
+                raise ValueError(f"Column {name!r} has more than {MAX_CATEGORIES} distinct text values")
+            categories = sorted(self.values)
+            # -1 marks missing values
+            return smallest_integer_type(-1, max(len(categories) - 1, 0)), categories
+        if not self.integer and (not self.whole or max(abs(self.low), abs(self.high)) >= 2 ** 53):
+            return np.dtype(np.float32), None
+        if self.low > self.high:
+            return np.dtype(np.uint8), None
+        return smallest_integer_type(int(self.low), int(self.high)), None
+
+
+def build_cache(csv_path: Path, source_sha256: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> Path:
+    """
+    Convert the CSV to its columnar container in two passes over chunks of
+    `chunk_rows` rows (one to choose the dtypes, one to write), so memory use
+    is bounded by the chunk size rather than the file size.
+    """
+    csv_path = Path(csv_path)
+    source_sha256 = source_sha256 or file_sha256(csv_path)
+    started = time.perf_counter()
+
+    stats: Dict[str, ColumnStats] = {}
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        for name in chunk.columns:
+            stats.setdefault(name, ColumnStats()).update(chunk[name])
+        rows += len(chunk)
+
+    columns, specs, text_columns = [], {}, {}
+    for index, (name, column_stats) in enumerate(stats.items()):
+        dtype, categories = column_stats.dtype(name)
+        # Column names are not always valid file names; arrays are stored by position
+        key = f"c{index:03d}"
+        specs[key] = ((rows,), dtype)
+        columns.append({"name": str(name), "array": key, "dtype": str(dtype), "categories": categories})
+        if categories is not None:
+            text_columns[name] = str
+
+    path = cache_path_for(csv_path)
+    meta = {"format_version": FORMAT_VERSION, "source_sha256": source_sha256, "rows": rows, "columns": columns}
+    with array_store.create_arrays(path, specs, meta) as arrays:
+        offset = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=text_columns):
+            stop = offset + len(chunk)
+            for column in columns:
+                series = chunk[column["name"]]
+                if column["categories"] is not None:
+                    values = pd.Categorical(series, categories=column["categories"]).codes
+                else:
+                    values = series.to_numpy()
+                arrays[column["array"]][offset:stop] = values.astype(column["dtype"])
+            offset = stop
+        meta["csv_parse_seconds"] = time.perf_counter() - started
+
+    logger.info(
+        f"Cached {csv_path.name} as {len(columns)} columns in {path} "
+        f"({array_store.container_size(path) / 1e6:.1f} MB, conversion took {meta['csv_parse_seconds']:.2f}s)"
+    )
+    return path
+
+
+def _fresh_meta(path: Path, source_sha256: str) -> Optional[dict]:
+    if not path.exists():
+        return None
+    try:
+        meta = array_store.load_meta(path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format_version") != FORMAT_VERSION or meta.get("source_sha256") != source_sha256:
+        return None
+    return meta
+
+
+def is_segmented(path: Path) -> bool:
+    return (Path(path) / MANIFEST_FILE).exists()
+
+
+def load_manifest(path: Path) -> dict:
+    """A segmented dataset's manifest; an empty one if the dataset does not exist yet."""
+    manifest_path = Path(path) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {"format_version": FORMAT_VERSION, "columns": None, "rows": 0, "segments": [], "state": {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def append_segment(path: Path, arrays: Dict[str, np.ndarray], state: dict) -> dict:
+    """
+    Append rows to a segmented dataset (created on first use) as a new
+    array_store segment. The manifest, which lists the segments and carries
+    the writer's `state` (such as an export watermark), is replaced
+    atomically afterwards, so the rows and the state move forward together;
+    a segment written by a run that died before that is simply overwritten.
+    """
+    path = Path(path)
+    manifest = load_manifest(path)
+    columns = {name: str(array.dtype) for name, array in arrays.items()}
+    if manifest["columns"] is not None and manifest["columns"] != columns:
+        raise ValueError(f"Segment columns {columns} do not match {path}'s {manifest['columns']}")
+    lengths = {len(array) for array in arrays.values()}
+    if len(lengths) != 1:
+        raise ValueError("Segment columns have different lengths")
+    n_rows = lengths.pop()
+
+    segment = f"segment-{len(manifest['segments']):06d}"
+    # Column names become file names here, unlike in the CSV caches
+    array_store.save_arrays(path / segment, arrays, {"rows": n_rows})
+    manifest = {
+        **manifest,
+        "columns": columns,
+        "rows": manifest["rows"] + n_rows,
+        "segments": manifest["segments"] + [segment],
+        "state": state,
+    }
+    tmp_path = path / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path / MANIFEST_FILE)
+    return manifest
+
+
+def dataset_sha256(path: Path) -> str:
+    """Content hash of a CSV, or of a segmented dataset's manifest (which changes with every append)."""
+    path = Path(path)
+    return file_sha256(path / MANIFEST_FILE if is_segmented(path) else path)
+
+
+def _open_segmented(path: Path, columns: Optional[List[str]], mmap: bool) -> Tuple[Dict[str, np.ndarray], Dict[str, dict]]:
+    manifest = load_manifest(path)
+    names = list(manifest["columns"]) if columns is None else list(columns)
+    missing = [name for name in names if name not in manifest["columns"]]
+    if missing:
+        raise KeyError(f"{path} has no columns named {', '.join(missing)}")
+    segments = [
+        array_store.load_arrays(path / segment, mmap_mode="r" if mmap else None, names=names)[0]
+        for segment in manifest["segments"]
+    ]
+    # A single segment stays memory-mapped; several are concatenated into memory
+    arrays = {
+        name: segments[0][name] if len(segments) == 1 else np.concatenate([segment[name] for segment in segments])
+        for name in names
+    }
+    descriptions = {
+        name: {"name": name, "array": name, "dtype": manifest["columns"][name], "categories": None}
+        for name in names
+    }
+    return arrays, descriptions
+
+
+def open_columns(csv_path: Path, columns: Optional[List[str]] = None, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, dict]]:
+    """
+    The stored arrays of the requested columns (all of them by default),
+    memory-mapped unless `mmap` is False, and each column's description
+    (dtype and categories). The cache is built or rebuilt first if missing or
+    stale. `csv_path` may also be a segmented dataset directory.
+    """
+    csv_path = Path(csv_path)
+    if is_segmented(csv_path):
+        return _open_segmented(csv_path, columns, mmap)
+    source_sha256 = file_sha256(csv_path)
+    path = cache_path_for(csv_path)
+    meta = _fresh_meta(path, source_sha256)
+    if meta is None:
+        logger.info(f"Building columnar cache for {csv_path}")
+        build_cache(csv_path, source_sha256)
+        meta = array_store.load_meta(path)
+
+    by_name = {column["name"]: column for column in meta["columns"]}
+    names = list(by_name) if columns is None else list(columns)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"{csv_path} has no columns named {', '.join(missing)}")
+
+    arrays, _ = array_store.load_arrays(
+        path, mmap_mode="r" if mmap else None, names=[by_name[name]["array"] for name in names]
+    )
+    return {name: arrays[by_name[name]["array"]] for name in names}, {name: by_name[name] for name in names}
+
+
+def load_columns(csv_path: Path, columns: Optional[List[str]] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    The requested columns of a CSV (all of them by default) as a DataFrame,
+    read through its columnar cache. Text columns come back as pandas Categoricals.
+    """
+    arrays, descriptions = open_columns(csv_path, columns, mmap)
+    data = {}
+    for name, array in arrays.items():
+        categories = descriptions[name]["categories"]
+        if categories is not None:
+            data[name] = pd.Categorical.from_codes(np.asarray(array), categories=categories)
+        else:
+            data[name] = array
+    return pd.DataFrame(data, columns=list(arrays), copy=False)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert dataset CSVs to the columnar cache.")
+    parser.add_argument("paths", nargs="*", help=f"CSV files (default: every CSV under {DATASETS_DIR})")
+    args = parser.parse_args(argv)
+
+    paths = [Path(path) for path in args.paths] or sorted(DATASETS_DIR.rglob("*.csv"))
+    for csv_path in paths:
+        sha = file_sha256(csv_path)
+        path = cache_path_for(csv_path)
+        if _fresh_meta(path, sha) is None:
+            build_cache(csv_path, sha)
+        meta = array_store.load_meta(path)
+
+        started = time.perf_counter()
+        load_columns(csv_path)
+        load_seconds = time.perf_counter() - started
+        dtypes = ", ".join(f"{column['name']}:{column['dtype']}" for column in meta["columns"])
+        print(
+            f"{csv_path}: {meta['rows']} rows, CSV {csv_path.stat().st_size / 1e6:.1f} MB -> "
+            f"{array_store.container_size(path) / 1e6:.1f} MB; conversion {meta['csv_parse_seconds']:.3f}s, "
+            f"cached load {load_seconds:.3f}s\n  {dtypes}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
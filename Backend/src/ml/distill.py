@@ -0,0 +1,224 @@
+"""
+Distilled single-model "fast" tier.
+
+A shallow LightGBM student is trained to reproduce the ensemble's soft
+probabilities: each transfer row is expanded into one row per class weighted
+by the teacher's probability for it, so the weighted log-loss the student
+minimises is the cross-entropy against the teacher. The student is wrapped as
+a single-member soft vote and saved with the teacher's scaler, so it loads,
+compiles and explains exactly like the ensemble artifact.
+
+The student is saved next to its teacher as <model>.student.joblib, with a
+<model>.student.json report holding the teacher's sha256 and the fidelity of
+the student against the teacher on held-out rows. The model registry only
+serves a student whose report matches the teacher it is loading.
+
+Usage:
+    python -m src.ml.distill --model src/ml/models/diaHealth_012.joblib
+    python -m src.ml.distill --model src/ml/models/diaHealth_012.joblib --data path/to/labelled.csv
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import VotingClassifier
+from sklearn.model_selection import train_test_split
+
+logger = logging.getLogger(__name__)
+
+STUDENT_SUFFIX = ".student.joblib"
+REPORT_SUFFIX = ".student.json"
+LABEL_COLUMN = "Diabetes_012"
+
+
+def student_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(STUDENT_SUFFIX)
+
+
+def student_report_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(REPORT_SUFFIX)
+
+
+def create_student_model() -> VotingClassifier:
+    """One shallow LightGBM model, as a single-member soft vote like the teacher."""
+    student = lgb.LGBMClassifier(
+        n_estimators=150,
+        learning_rate=0.1,
+        num_leaves=15,
+        max_depth=4,
+        random_state=42,
+        verbose=-1
+    )
+    return VotingClassifier(estimators=[('lightgbm', student)], voting='soft')
+
+
+def soft_label_dataset(X: pd.DataFrame, proba: np.ndarray, classes: np.ndarray):
+    """
+    Expand every row into one row per class weighted by its soft label, so
+    fitting hard labels with these weights minimises cross-entropy against `proba`.
+    """
+    n_rows, n_classes = proba.shape
+    weights = proba.ravel()
+    keep = weights > 1e-6
+    X_expanded = X.iloc[np.repeat(np.arange(n_rows), n_classes)[keep]].reset_index(drop=True)
+    y_expanded = np.tile(classes, n_rows)[keep]
+    return X_expanded, y_expanded, weights[keep]
+
+
+def fidelity_report(
+    teacher_proba: np.ndarray,
+    student_proba: np.ndarray,
+    classes: np.ndarray,
+    y: Optional[np.ndarray] = None
+) -> dict:
+    """
+    Agreement and probability error of the student against the teacher, plus
+    accuracy when labels are known. `classes` labels the probability columns.
+    """
+    from src.ml.inference import DIABETES_CLASS
+
+    classes = np.asarray(classes)
+    if DIABETES_CLASS not in classes:
+        raise ValueError(f"Model classes {classes.tolist()} have no Diabetes class ({DIABETES_CLASS})")
+    risk_column = int(np.flatnonzero(classes == DIABETES_CLASS)[0])
+
+    eps = 1e-12
+    risk_error = np.abs(student_proba[:, risk_column] - teacher_proba[:, risk_column])
+    kl = np.sum(teacher_proba * (np.log(teacher_proba + eps) - np.log(student_proba + eps)), axis=1)
+    report = {
+        "rows": int(teacher_proba.shape[0]),
+        "argmax_agreement": float((student_proba.argmax(axis=1) == teacher_proba.argmax(axis=1)).mean()),
+        "risk_mean_abs_error": float(risk_error.mean()),
+        "risk_max_abs_error": float(risk_error.max()),
+        "mean_kl_divergence": float(kl.mean()),
+    }
+    if y is not None:
+        report["teacher_accuracy"] = float((classes[teacher_proba.argmax(axis=1)] == y).mean())
+        report["student_accuracy"] = float((classes[student_proba.argmax(axis=1)] == y).mean())
+    return report
+
+
+def distill_student(
+    model_data: dict,
+    X: pd.DataFrame,
+    y: Optional[np.ndarray] = None,
+    holdout_fraction: float = 0.2,
+    seed: int = 42
+) -> Tuple[dict, dict]:
+    """
+    Train a student on the teacher's probabilities for the raw rows X and
+    report its fidelity on a held-out split. Returns (student model data, report).
+    """
+    teacher = model_data['model']
+    scaler = model_data['scaler']
+    feature_names = list(model_data['feature_names'])
+
+    X_scaled = pd.DataFrame(scaler.transform(X[feature_names]), columns=feature_names)
+    teacher_proba = teacher.predict_proba(X_scaled)
+
+    indices = np.arange(len(X_scaled))
+    train_idx, holdout_idx = train_test_split(indices, test_size=holdout_fraction, random_state=seed)
+
+    started = time.perf_counter()
+    X_train, y_train, weights = soft_label_dataset(
+        X_scaled.iloc[train_idx], teacher_proba[train_idx], teacher.classes_
+    )
+    student = create_student_model()
+    student.fit(X_train, y_train, sample_weight=weights)
+    fit_seconds = time.perf_counter() - started
+
+    X_holdout = X_scaled.iloc[holdout_idx]
+    started = time.perf_counter()
+    teacher_holdout = teacher.predict_proba(X_holdout)
+    teacher_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    student_holdout = student.predict_proba(X_holdout)
+    student_seconds = time.perf_counter() - started
+
+    report = fidelity_report(
+        teacher_holdout, student_holdout, teacher.classes_, None if y is None else np.asarray(y)[holdout_idx]
+    )
+    report.update({
+        "transfer_rows": int(len(train_idx)),
+        "fit_seconds": fit_seconds,
+        "teacher_predict_seconds": teacher_seconds,
+        "student_predict_seconds": student_seconds,
+    })
+
+    student_data = {
+        'model': student,
+        'scaler': scaler,
+        'feature_names': feature_names
+    }
+    return student_data, report
+
+
+def save_student(model_path: Path, teacher_sha256: str, student_data: dict, report: dict) -> Path:
+    """Write the student and its report next to the teacher, each renamed into place when complete."""
+    path = student_path_for(model_path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'wb') as f:
+        joblib.dump(student_data, f, protocol=4)
+    os.replace(tmp_path, path)
+
+    report_path = student_report_path_for(model_path)
+    tmp_path = report_path.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({"teacher_sha256": teacher_sha256, **report}, f, indent=2)
+    os.replace(tmp_path, report_path)
+    return path
+
+
+def load_student_report(model_path: Path) -> Optional[dict]:
+    path = student_report_path_for(model_path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Distil the served ensemble into a single fast student model.")
+    parser.add_argument("--model", default=str(Path(__file__).parent / "models" / "diaHealth_012.joblib"))
+    parser.add_argument("--data", default=None, help="CSV with the feature columns (and optionally Diabetes_012) to use as transfer set")
+    parser.add_argument("--synthetic-rows", type=int, default=200000, help="Transfer set size when no --data is given")
+    args = parser.parse_args(argv)
+
+    from src.ml.compiled import synthetic_inputs
+    from src.ml.inference import file_sha256
+
+    model_path = Path(args.model)
+    print(f"Loading {model_path}...")
+    with open(model_path, 'rb') as f:
+        model_data = joblib.load(f)
+    feature_names = list(model_data['feature_names'])
+
+    y = None
+    if args.data:
+        df = pd.read_csv(args.data)
+        X = df[feature_names]
+        if LABEL_COLUMN in df:
+            y = df[LABEL_COLUMN].to_numpy()
+    else:
+        X = pd.DataFrame(synthetic_inputs(args.synthetic_rows), columns=feature_names)
+    print(f"Distilling on {len(X)} rows...")
+
+    student_data, report = distill_student(model_data, X, y)
+    print(json.dumps(report, indent=2))
+
+    path = save_student(model_path, file_sha256(model_path), student_data, report)
+    print(f"Saved student model to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
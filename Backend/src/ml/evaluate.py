@@ -0,0 +1,281 @@
+"""
+Cross-validated evaluation of the training config, on quality and on cost.
+
+Runs stratified k-fold on the three-class Diabetes_012 target with the folds
+in parallel processes. In each fold the scaler and every member are fitted
+on the training part exactly as train.py does (one thread each, so fit times
+are comparable), the members are assembled into the soft-voting ensemble and,
+unless the config disables distillation, the fast-tier student is distilled.
+The held-out part is then scored by:
+
+    ensemble   the served ensemble (PreparedModel, member by member)
+    compiled   the same ensemble flattened by the compiled engine
+    student    the distilled fast tier
+    members    each ensemble member on its own
+
+Quality per model: accuracy, macro-F1, per-class recall, one-vs-rest AUC (per
+class and macro) and log loss, as the mean and standard deviation over the
+folds plus every fold's value. Cost: fit time per fold, and single-row (p50
+and p99) and batch inference latency, measured on the first fold's models
+after the pool has finished so the timings do not compete with fitting.
+
+The report is written as JSON so runs can be compared.
+
+Usage (from the Backend directory):
+    python -m src.ml.evaluate
+    python -m src.ml.evaluate --config src/ml/configs/ensemble.tuned.json --folds 5 --out reports/tuned.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.metrics import accuracy_score, f1_score, log_loss, recall_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from src.ml.compiled import compile_ensemble
+from src.ml.distill import distill_student
+from src.ml.inference import PreparedModel
+from src.ml.train import (
+    DEFAULT_CONFIG, ML_DIR, assemble_voting_classifier, create_member, load_config, load_data, total_cores
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUT = ML_DIR / "reports" / "evaluation.json"
+SINGLE_ROW_REPEATS = 500
+BATCH_ROWS = 1000
+BATCH_REPEATS = 5
+
+# Training data of the pool worker processes, set once by the initializer
+_worker_data: Tuple[Optional[pd.DataFrame], Optional[np.ndarray]] = (None, None)
+
+
+def _init_worker(X: pd.DataFrame, y: np.ndarray):
+    global _worker_data
+    _worker_data = (X, y)
+
+
+def quality_metrics(y: np.ndarray, proba: np.ndarray) -> dict:
+    """Quality of class probabilities (n, n_classes) against encoded labels y."""
+    n_classes = proba.shape[1]
+    predicted = proba.argmax(axis=1)
+    auc = [
+        float(roc_auc_score(y == k, proba[:, k])) if 0 < (y == k).sum() < len(y) else float("nan")
+        for k in range(n_classes)
+    ]
+    return {
+        "accuracy": float(accuracy_score(y, predicted)),
+        "macro_f1": float(f1_score(y, predicted, average="macro", labels=np.arange(n_classes), zero_division=0)),
+        "recall": recall_score(y, predicted, average=None, labels=np.arange(n_classes), zero_division=0).tolist(),
+        "auc_ovr": auc,
+        "macro_auc_ovr": float(np.nanmean(auc)),
+        "log_loss": float(log_loss(y, np.clip(proba, 1e-15, 1.0), labels=np.arange(n_classes))),
+    }
+
+
+def _fit_fold(config: dict, fold: int, train_idx: np.ndarray, test_idx: np.ndarray, keep_models: bool) -> dict:
+    """Fit and score everything on one fold; runs in a pool worker process."""
+    X, y = _worker_data
+    feature_names = list(X.columns)
+    X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+    scaler = StandardScaler().fit(X_train)
+    X_train_scaled = pd.DataFrame(scaler.transform(X_train), columns=feature_names)
+    raw_test = X_test.to_numpy(dtype=np.float64)
+    y_test = y[test_idx]
+
+    results: Dict[str, dict] = {"members": {}}
+    fitted = []
+    with threadpool_limits(limits=1):
+        for name, spec in config["members"].items():
+            estimator = create_member(spec, 1)
+            started = time.perf_counter()
+            estimator.fit(X_train_scaled, y[train_idx])
+            fitted.append((name, estimator))
+            results["members"][name] = {"fit_seconds": time.perf_counter() - started}
+
+        ensemble = assemble_voting_classifier(config, fitted, y[train_idx])
+        model_data = {"model": ensemble, "scaler": scaler, "feature_names": feature_names}
+        prepared = PreparedModel(ensemble, scaler, feature_names)
+        scaled_test = prepared.scale(raw_test)
+        for name, predict_proba, _ in prepared.members:
+            results["members"][name].update(quality_metrics(y_test, predict_proba(scaled_test)))
+
+        ensemble_fit = sum(member["fit_seconds"] for member in results["members"].values())
+        results["ensemble"] = {"fit_seconds": ensemble_fit, **quality_metrics(y_test, prepared.predict_proba(raw_test))}
+
+        started = time.perf_counter()
+        compiled = compile_ensemble(ensemble, scaler, feature_names)
+        results["compiled"] = {
+            "fit_seconds": ensemble_fit + time.perf_counter() - started,
+            **quality_metrics(y_test, compiled.predict_proba(raw_test))
+        }
+
+        student_data = None
+        if config.get("distill", True):
+            started = time.perf_counter()
+            student_data, _ = distill_student(model_data, X_train, y[train_idx])
+            student = PreparedModel(student_data["model"], student_data["scaler"], feature_names)
+            results["student"] = {
+                "fit_seconds": time.perf_counter() - started,
+                **quality_metrics(y_test, student.predict_proba(raw_test))
+            }
+
+    return {
+        "fold": fold,
+        "results": results,
+        "models": (model_data, compiled, student_data, raw_test) if keep_models else None,
+    }
+
+
+def _latency(predict_proba: Callable[[np.ndarray], np.ndarray], X: np.ndarray) -> dict:
+    """Single-row p50/p99 and batch latency of a predict_proba over the rows X."""
+    predict_proba(X[:1])
+    single = np.empty(SINGLE_ROW_REPEATS)
+    for i in range(SINGLE_ROW_REPEATS):
+        row = X[i % len(X):i % len(X) + 1]
+        started = time.perf_counter()
+        predict_proba(row)
+        single[i] = time.perf_counter() - started
+
+    batch = np.resize(X, (BATCH_ROWS, X.shape[1]))
+    batch_seconds = []
+    for _ in range(BATCH_REPEATS):
+        started = time.perf_counter()
+        predict_proba(batch)
+        batch_seconds.append(time.perf_counter() - started)
+    best = min(batch_seconds)
+    return {
+        "single_row_p50_ms": float(np.percentile(single, 50) * 1000),
+        "single_row_p99_ms": float(np.percentile(single, 99) * 1000),
+        "batch_rows": BATCH_ROWS,
+        "batch_ms": best * 1000,
+        "batch_us_per_row": best / BATCH_ROWS * 1e6,
+    }
+
+
+def measure_latency(models: tuple) -> Dict[str, dict]:
+    """Latency of every model and member of one fold, single-threaded, in this process."""
+    model_data, compiled, student_data, X = models
+    latency: Dict[str, dict] = {"members": {}}
+    with threadpool_limits(limits=1):
+        prepared = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+        latency["ensemble"] = _latency(prepared.predict_proba, X)
+        latency["compiled"] = _latency(compiled.predict_proba, X)
+        if student_data is not None:
+            student = PreparedModel(student_data["model"], student_data["scaler"], student_data["feature_names"])
+            latency["student"] = _latency(student.predict_proba, X)
+        scaled = prepared.scale(X)
+        for name, predict_proba, _ in prepared.members:
+            latency["members"][name] = _latency(predict_proba, scaled)
+    return latency
+
+
+def summarize(per_fold: List[dict]) -> dict:
+    """Mean and standard deviation of every metric over the folds, plus the per-fold values."""
+    summary = {}
+    for metric in per_fold[0]:
+        values = np.array([fold[metric] for fold in per_fold], dtype=np.float64)
+        summary[metric] = {
+            "mean": np.nanmean(values, axis=0).tolist(),
+            "std": np.nanstd(values, axis=0).tolist(),
+            "folds": values.tolist(),
+        }
+    return summary
+
+
+def evaluate(config: dict, n_folds: int, seed: int, cores: int) -> dict:
+    X, y = load_data(config)
+    classes, y_encoded = np.unique(y.to_numpy(), return_inverse=True)
+    folds = list(StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed).split(X, y_encoded))
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(n_folds, cores)), initializer=_init_worker, initargs=(X, y_encoded)) as pool:
+        futures = [
+            pool.submit(_fit_fold, config, fold, train_idx, test_idx, fold == 0)
+            for fold, (train_idx, test_idx) in enumerate(folds)
+        ]
+        fold_results = [future.result() for future in futures]
+    cv_seconds = time.perf_counter() - started
+
+    latency = measure_latency(fold_results[0]["models"])
+
+    def report_for(select: Callable[[dict], dict], timing: dict) -> dict:
+        return {**summarize([select(fold["results"]) for fold in fold_results]), "latency": timing}
+
+    models = {}
+    for model in ("ensemble", "compiled", "student"):
+        if model in fold_results[0]["results"]:
+            models[model] = report_for(lambda results: results[model], latency[model])
+    members = {
+        name: report_for(lambda results: results["members"][name], latency["members"][name])
+        for name in config["members"]
+    }
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": config,
+        "data": {"rows": int(len(y_encoded)), "classes": classes.tolist(), "class_counts": np.bincount(y_encoded).tolist()},
+        "cv": {"folds": n_folds, "seed": seed, "processes": max(1, min(n_folds, cores)), "wall_seconds": cv_seconds},
+        "environment": {
+            "python": platform.python_version(),
+            "sklearn": sklearn.__version__,
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+        },
+        "models": models,
+        "members": members,
+    }
+
+
+def _print_summary(report: dict):
+    print(f"{'model':<24} {'acc':>7} {'macroF1':>8} {'AUC':>7} {'fit s':>8} {'1-row p50 ms':>13} {'batch us/row':>13}")
+    rows = list(report["models"].items()) + [(f"  {name}", member) for name, member in report["members"].items()]
+    for name, result in rows:
+        print(
+            f"{name:<24} {result['accuracy']['mean']:7.4f} {result['macro_f1']['mean']:8.4f} "
+            f"{result['macro_auc_ovr']['mean']:7.4f} {result['fit_seconds']['mean']:8.2f} "
+            f"{result['latency']['single_row_p50_ms']:13.3f} {result['latency']['batch_us_per_row']:13.2f}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stratified k-fold evaluation of the training config.")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="Training config")
+    parser.add_argument("--data", default=None, help="Override the config's dataset CSV")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel fold processes (-1 for all cores)")
+    parser.add_argument("--out", default=str(DEFAULT_OUT), help="JSON report")
+    args = parser.parse_args(argv)
+
+    config = load_config(Path(args.config))
+    if args.data:
+        config["data"]["path"] = str(Path(args.data).resolve())
+
+    report = evaluate(config, args.folds, args.seed, total_cores(args.n_jobs))
+    _print_summary(report)
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, out_path)
+    print(f"Cross-validated {args.folds} folds in {report['cv']['wall_seconds']:.1f}s; wrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by OpenMP / BLAS runtimes when they first initialise
+NATIVE_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+)
+
+
+class ExecutorBusyError(Exception):
+    """Raised when the inference executor already has its maximum number of queued jobs."""
+
+
+def limit_native_threads(n_threads: int):
+    """
+    Cap the OpenMP/BLAS thread pools used by numpy, scikit-learn, XGBoost and LightGBM.
+
+    Each inference worker thread then runs its native code on `n_threads` cores,
+    so `INFERENCE_WORKERS * INFERENCE_NATIVE_THREADS` bounds total CPU use.
+    """
+    for var in NATIVE_THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(n_threads))
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=n_threads)
+    except ImportError:
+        logger.warning("threadpoolctl not installed; relying on environment variables to limit native threads")
+
+
+def pin_model_threads(model, n_threads: int):
+    """Set n_jobs on every ensemble member that runs its own thread pool at predict time."""
+    for estimator in getattr(model, "estimators_", [model]):
+        if hasattr(estimator, "n_jobs"):
+            estimator.n_jobs = n_threads
+        # XGBoost keeps its own thread count on the booster
+        if hasattr(estimator, "get_booster"):
+            estimator.get_booster().set_param({"nthread": n_threads})
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that keeps model inference off the asyncio event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue_depth` more may
+    wait for a worker; further submissions fail fast with ExecutorBusyError.
+    Callers stop waiting after `timeout_seconds` with asyncio.TimeoutError.
+    """
+
+    def __init__(self, max_workers: int, max_queue_depth: int, timeout_seconds: float):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.timeout = timeout_seconds
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+        return self._pool
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on the pool and await its result."""
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue_depth:
+                self.rejected += 1
+                raise ExecutorBusyError(
+                    f"Inference queue is full ({self.max_queue_depth} jobs waiting)"
+                )
+            self.in_flight += 1
+            self.submitted += 1
+
+        # The slot is released when the job really finishes, even if the caller timed out
+        future = self._get_pool().submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
@@ -0,0 +1,374 @@
+"""
+Per-prediction feature contributions for the soft-voting ensemble.
+
+Tree members use path-dependent TreeSHAP over the compiled node tables:
+for one leaf, the cover-weighted expectation of the tree given a coalition S
+is a product over the features on its path, `prod_{j in S} a_j *
+prod_{j not in S} b_j`, where a_j says whether the row satisfies every split
+on j along the path and b_j is the product of the cover fractions of those
+splits. Those coalition values only change where a row crosses a split
+threshold, so they are box sums over the grid of threshold bins. Over the
+served input domain (BMI continuous, three binary flags, Age as a BRFSS
+group from 1 to 13) that grid is small enough to hold every member's exact TreeSHAP values for every
+cell, computed once per model version; explaining a batch is then a lookup.
+Rows outside the domain fall back to evaluating the Shapley weights of each
+leaf's 32 possible `a` patterns directly.
+
+The logistic member's contributions are closed-form, `coef * (x - mean)` on
+the logit scale. Member contributions are moved from margin to probability
+space through the member's link and averaged with the voting weights, so
+for every row `expected_proba + contributions.sum(axis=1)` equals the
+ensemble's class probabilities.
+"""
+import logging
+from itertools import product
+from math import factorial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ml.compiled import CompiledEnsemble, _apply_link
+
+logger = logging.getLogger(__name__)
+
+# Values the API scores for the discrete features (Age as inference.served_age_group
+# produces it); BMI is continuous
+SERVED_DOMAINS: Dict[str, Sequence[float]] = {
+    "Stroke": (0, 1),
+    "HeartDiseaseorAttack": (0, 1),
+    "Sex": (0, 1),
+    "Age": range(1, 14),
+}
+
+
+def _shapley_weights(n_features: int) -> List[float]:
+    return [
+        factorial(size) * factorial(n_features - size - 1) / factorial(n_features)
+        for size in range(n_features)
+    ]
+
+
+def _leaf_paths(compiled: CompiledEnsemble) -> Tuple[np.ndarray, ...]:
+    """
+    Walk every tree breadth-first and return, per leaf: node index, tree index,
+    the (lo, hi] interval each feature must fall in to reach it, and the
+    product of cover fractions of the splits on each feature.
+    """
+    n_features = len(compiled.feature_names)
+    nodes = compiled.roots.astype(np.int64)
+    trees = np.arange(len(nodes))
+    lo = np.full((len(nodes), n_features), -np.inf)
+    hi = np.full((len(nodes), n_features), np.inf)
+    reach = np.ones((len(nodes), n_features))
+
+    leaves = []
+    for _ in range(compiled.max_depth + 1):
+        is_leaf = compiled.left[nodes] == nodes
+        leaves.append((nodes[is_leaf], trees[is_leaf], lo[is_leaf], hi[is_leaf], reach[is_leaf]))
+        internal = ~is_leaf
+        if not internal.any():
+            break
+
+        parent = nodes[internal]
+        rows = np.arange(len(parent))
+        feature = compiled.feature[parent]
+        threshold = compiled.threshold[parent]
+        left = compiled.left[parent].astype(np.int64)
+        right = compiled.right[parent].astype(np.int64)
+        parent_cover = compiled.cover[parent]
+        safe_cover = np.where(parent_cover > 0, parent_cover, 1.0)
+
+        left_lo, left_hi, left_reach = lo[internal], hi[internal].copy(), reach[internal].copy()
+        left_hi[rows, feature] = np.minimum(left_hi[rows, feature], threshold)
+        left_reach[rows, feature] *= np.where(parent_cover > 0, compiled.cover[left] / safe_cover, 0.5)
+
+        right_lo, right_hi, right_reach = lo[internal].copy(), hi[internal], reach[internal].copy()
+        right_lo[rows, feature] = np.maximum(right_lo[rows, feature], threshold)
+        right_reach[rows, feature] *= np.where(parent_cover > 0, compiled.cover[right] / safe_cover, 0.5)
+
+        nodes = np.concatenate([left, right])
+        trees = np.concatenate([trees[internal], trees[internal]])
+        lo = np.concatenate([left_lo, right_lo])
+        hi = np.concatenate([left_hi, right_hi])
+        reach = np.concatenate([left_reach, right_reach])
+
+    return tuple(np.concatenate(parts) for parts in zip(*leaves))
+
+
+def _pattern_weights(reach: np.ndarray) -> np.ndarray:
+    """
+    Shapley values of the product game of each leaf for every 0/1 pattern `a`,
+    shape (n_leaves, 2**M, M); multiplied by the leaf value they give the leaf's
+    contribution for a row whose satisfied-features pattern is `a`.
+    """
+    n_leaves, n_features = reach.shape
+    patterns = ((np.arange(2 ** n_features)[:, np.newaxis] >> np.arange(n_features)) & 1).astype(np.float64)
+    shapley_weight = _shapley_weights(n_features)
+
+    phi = np.zeros((n_leaves, len(patterns), n_features))
+    for i in range(n_features):
+        others = [j for j in range(n_features) if j != i]
+        # phi_i = (a_i - b_i) * sum_S w(|S|) prod_{j in S} a_j prod_{j in others - S} b_j
+        marginal = patterns[np.newaxis, :, i] - reach[:, i, np.newaxis]
+        total = np.zeros((n_leaves, len(patterns)))
+        for subset in range(2 ** len(others)):
+            chosen = [j for bit, j in enumerate(others) if subset >> bit & 1]
+            rest = [j for j in others if j not in chosen]
+            present = patterns[:, chosen].prod(axis=1)
+            absent = reach[:, rest].prod(axis=1)
+            total += shapley_weight[len(chosen)] * np.outer(absent, present)
+        phi[:, :, i] = marginal * total
+    return phi
+
+
+def _margin_to_probability(expected: np.ndarray, phi: np.ndarray, link: str):
+    """
+    Map one member's margin contributions (n, M, K) through its link.
+
+    Each feature is credited the average of adding it alone to the expected
+    margin and removing it alone from the full margin (exact for linear links);
+    the small remaining interaction is spread in proportion to those credits so
+    the contributions add up to p(x) - p(expected).
+    """
+    full = expected + phi.sum(axis=1)
+    expected_proba = _apply_link(expected.copy(), link)
+    full_proba = _apply_link(full.copy(), link)
+    added = _apply_link(expected + phi, link) - expected_proba
+    removed = full_proba[:, np.newaxis, :] - _apply_link(full[:, np.newaxis, :] - phi, link)
+    contributions = 0.5 * (added + removed)
+
+    residual = (full_proba - expected_proba) - contributions.sum(axis=1)
+    magnitude = np.abs(contributions)
+    total = magnitude.sum(axis=1, keepdims=True)
+    share = np.divide(magnitude, total, out=np.full_like(magnitude, 1.0 / phi.shape[1]), where=total > 0)
+    contributions += residual[:, np.newaxis, :] * share
+    return expected_proba, contributions
+
+
+class _FeatureCells:
+    """
+    Cells of one feature: the bins between its split thresholds, restricted to
+    the bins its allowed values fall in when the feature is discrete.
+    """
+
+    def __init__(self, thresholds: np.ndarray, domain: Optional[Sequence[float]]):
+        self.thresholds = thresholds
+        n_bins = len(thresholds) + 1
+        if domain is None:
+            self.cell_bins = np.arange(n_bins)
+        else:
+            self.cell_bins = np.unique(self.bins(np.asarray(domain, dtype=np.float64)))
+        self.domain = None if domain is None else np.asarray(domain, dtype=np.float64)
+        self.bin_to_cell = np.full(n_bins, -1, dtype=np.int64)
+        self.bin_to_cell[self.cell_bins] = np.arange(len(self.cell_bins))
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.cell_bins)
+
+    def bins(self, x: np.ndarray) -> np.ndarray:
+        # Bin b holds thresholds[b - 1] < x <= thresholds[b]
+        return np.searchsorted(self.thresholds, x, side="left")
+
+    def cells(self, x: np.ndarray) -> np.ndarray:
+        """Cell index per value, or -1 for values outside the domain."""
+        cells = self.bin_to_cell[self.bins(x)]
+        if self.domain is not None:
+            cells = np.where(np.isin(x, self.domain), cells, -1)
+        return cells
+
+    def leaf_ranges(self, lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """First and last cell inside each leaf's (lo, hi] interval (first > last if none)."""
+        first_bin = np.where(np.isfinite(lo), np.searchsorted(self.thresholds, lo, side="left") + 1, 0)
+        last_bin = np.where(np.isfinite(hi), np.searchsorted(self.thresholds, hi, side="left"), len(self.thresholds))
+        first = np.searchsorted(self.cell_bins, first_bin, side="left")
+        last = np.searchsorted(self.cell_bins, last_bin, side="right") - 1
+        return first, last
+
+
+def _coalition_values(
+    features: Tuple[int, ...],
+    first: np.ndarray,
+    last: np.ndarray,
+    weights: np.ndarray,
+    shape: Tuple[int, ...]
+) -> np.ndarray:
+    """
+    Sum of each leaf's weight over the box of cells it covers on `features`,
+    via an inclusion-exclusion scatter into a difference array and cumulative
+    sums. Returns an array broadcastable to `shape + (K,)`.
+    """
+    n_classes = weights.shape[1]
+    if not features:
+        return weights.sum(axis=0).reshape((1,) * len(shape) + (n_classes,))
+
+    dims = tuple(shape[j] for j in features)
+    valid = np.all(first[:, features] <= last[:, features], axis=1)
+    first, last, weights = first[valid], last[valid], weights[valid]
+
+    padded = tuple(d + 1 for d in dims)
+    size = int(np.prod(padded))
+    diff = np.zeros((size, n_classes))
+    for corner in product((0, 1), repeat=len(features)):
+        index = np.ravel_multi_index(
+            [last[:, j] + 1 if upper else first[:, j] for j, upper in zip(features, corner)],
+            padded
+        )
+        sign = -1.0 if sum(corner) % 2 else 1.0
+        for k in range(n_classes):
+            diff[:, k] += sign * np.bincount(index, weights=weights[:, k], minlength=size)
+
+    table = diff.reshape(padded + (n_classes,))
+    for axis in range(len(features)):
+        table = np.cumsum(table, axis=axis)
+    table = table[tuple(slice(0, d) for d in dims)]
+
+    full_shape = [1] * len(shape)
+    for j, d in zip(features, dims):
+        full_shape[j] = d
+    return table.reshape(tuple(full_shape) + (n_classes,))
+
+
+class EnsembleExplainer:
+    """
+    Batched per-row feature contributions towards each class probability.
+
+    Everything that does not depend on the row (cell grid, tabulated tree
+    contributions, expected values) is computed here, once per model.
+    """
+
+    # Rows per chunk of the per-leaf fallback; bounds its (rows, leaves, features) arrays
+    CHUNK_ROWS = 32
+
+    def __init__(self, compiled: CompiledEnsemble, domains: Optional[Dict[str, Sequence[float]]] = None):
+        domains = SERVED_DOMAINS if domains is None else domains
+        self.feature_names: List[str] = list(compiled.feature_names)
+        self.n_features = len(self.feature_names)
+        self.n_classes = compiled.n_classes
+        self.tree_links = compiled.meta["tree_member_links"]
+        self.linear_links = compiled.meta["linear_links"]
+        self.tree_weights = compiled.tree_member_weight
+        self.linear_weights = compiled.linear_weight
+
+        leaf, tree, lo, hi, reach = _leaf_paths(compiled)
+        member = np.searchsorted(compiled.tree_member_starts, tree, side="right") - 1
+        order = np.argsort(member, kind="stable")
+        self.lo, self.hi, self.reach = lo[order], hi[order], reach[order]
+        self.value = compiled.value[leaf[order]]
+        member = member[order]
+        self.member_slices = [
+            slice(int(np.searchsorted(member, m, side="left")), int(np.searchsorted(member, m, side="right")))
+            for m in range(len(self.tree_links))
+        ]
+        self.tree_bias = compiled.tree_member_bias
+
+        # The linear members' background is the training mean the scaler was fitted on
+        self.linear_coef = compiled.linear_coef
+        self.background = compiled.scaler_mean
+        self.linear_expected = compiled.linear_coef @ self.background + compiled.linear_intercept
+
+        self.cells = [
+            _FeatureCells(compiled.split_thresholds(j), domains.get(name))
+            for j, name in enumerate(self.feature_names)
+        ]
+        self.grid_shape = tuple(cells.n_cells for cells in self.cells)
+        self.tree_expected, self.tree_table = self._tabulate_trees()
+
+        self.expected_proba = sum(
+            weight * _apply_link(expected.copy(), link)
+            for weight, expected, link in zip(
+                np.concatenate([self.tree_weights, self.linear_weights]),
+                list(self.tree_expected) + list(self.linear_expected),
+                self.tree_links + self.linear_links
+            )
+        )
+        self._pattern_phi: Optional[np.ndarray] = None
+
+    def _tabulate_trees(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact TreeSHAP values of every tree member for every cell of the grid,
+        moved to probability space and combined with the voting weights.
+        Returns the members' expected margins and a (cells, M, K) table.
+        """
+        M = self.n_features
+        n_cells = int(np.prod(self.grid_shape))
+        shapley_weight = _shapley_weights(M)
+        ranges = [cells.leaf_ranges(self.lo[:, j], self.hi[:, j]) for j, cells in enumerate(self.cells)]
+        first = np.stack([r[0] for r in ranges], axis=1)
+        last = np.stack([r[1] for r in ranges], axis=1)
+
+        expected = np.zeros((len(self.member_slices), self.n_classes))
+        table = np.zeros((n_cells, M, self.n_classes))
+        for m, s in enumerate(self.member_slices):
+            # v(S): expectation of the member's margin given the features in S
+            values = {}
+            for subset in range(2 ** M):
+                features = tuple(j for j in range(M) if subset >> j & 1)
+                absent = [j for j in range(M) if not subset >> j & 1]
+                weights = self.value[s] * self.reach[s][:, absent].prod(axis=1)[:, np.newaxis]
+                values[subset] = _coalition_values(features, first[s], last[s], weights, self.grid_shape)
+
+            phi = np.zeros(self.grid_shape + (M, self.n_classes))
+            for i in range(M):
+                for subset in range(2 ** M):
+                    if subset >> i & 1:
+                        continue
+                    size = bin(subset).count("1")
+                    phi[..., i, :] += shapley_weight[size] * (values[subset | 1 << i] - values[subset])
+
+            expected[m] = self.tree_bias[m] + values[0].reshape(-1)
+            _, contributions = _margin_to_probability(expected[m], phi.reshape(n_cells, M, self.n_classes), self.tree_links[m])
+            table += self.tree_weights[m] * contributions
+        return expected, table
+
+    def _cell_index(self, X: np.ndarray) -> np.ndarray:
+        """Flat grid cell of each row, or -1 if any feature is outside its domain."""
+        cells = np.stack([cells.cells(X[:, j]) for j, cells in enumerate(self.cells)], axis=1)
+        inside = np.all(cells >= 0, axis=1)
+        index = np.full(X.shape[0], -1, dtype=np.int64)
+        if inside.any():
+            index[inside] = np.ravel_multi_index(cells[inside].T, self.grid_shape)
+        return index
+
+    def _fallback_tree_contributions(self, X: np.ndarray) -> np.ndarray:
+        """Per-leaf TreeSHAP for rows outside the tabulated grid, shape (n, M, K)."""
+        if self._pattern_phi is None:
+            self._pattern_phi = _pattern_weights(self.reach).astype(np.float32)
+        bits = (1 << np.arange(self.n_features)).astype(np.int64)
+        leaves = np.arange(len(self.lo))
+
+        contributions = np.zeros((X.shape[0], self.n_features, self.n_classes))
+        for start in range(0, X.shape[0], self.CHUNK_ROWS):
+            chunk = X[start:start + self.CHUNK_ROWS]
+            inside = (chunk[:, np.newaxis, :] > self.lo) & (chunk[:, np.newaxis, :] <= self.hi)
+            phi = self._pattern_phi[leaves, inside @ bits]
+            for m, s in enumerate(self.member_slices):
+                margin_phi = np.matmul(phi[:, s, :].transpose(0, 2, 1), self.value[s])
+                _, member = _margin_to_probability(self.tree_expected[m], margin_phi, self.tree_links[m])
+                contributions[start:start + self.CHUNK_ROWS] += self.tree_weights[m] * member
+        return contributions
+
+    def explain(self, X: np.ndarray) -> np.ndarray:
+        """
+        Contributions of each feature to each class probability for an (n, M)
+        matrix of raw features, shape (n, M, K).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        contributions = np.zeros((X.shape[0], self.n_features, self.n_classes))
+        if X.shape[0] == 0:
+            return contributions
+
+        if self.member_slices:
+            index = self._cell_index(X)
+            inside = index >= 0
+            contributions[inside] = self.tree_table[index[inside]]
+            if not inside.all():
+                contributions[~inside] = self._fallback_tree_contributions(X[~inside])
+
+        for coef, expected, link, weight in zip(
+            self.linear_coef, self.linear_expected, self.linear_links, self.linear_weights
+        ):
+            phi = (X - self.background)[:, :, np.newaxis] * coef.T[np.newaxis, :, :]
+            _, member = _margin_to_probability(expected, phi, link)
+            contributions += weight * member
+        return contributions
@@ -0,0 +1,217 @@
+"""
+Export stored predictions into a training dataset, incrementally.
+
+The predictions collection is read in (created_at, _id) order through a
+batched Motor cursor that projects only the fields needed. Each batch is
+converted to columns with numpy, into the feature row the API scored:
+BMI is computed from Height and Weight and Age in years becomes the BRFSS
+age group, both exactly as build_feature_matrix does, and the stored risk
+level becomes the Diabetes_012 label (the served model's prediction, not a
+diagnosis). Only documents whose age_encoding matches AGE_ENCODING are kept:
+older predictions were scored on age in years, so their label does not
+belong to the converted row. Those and rows with missing or unparseable
+values are dropped and counted.
+
+Converted rows are appended to a segmented columnar dataset (see
+dataset_cache), one segment per `segment_rows` rows, and the manifest stores
+the (created_at, _id) of the last document consumed. The next run resumes
+after that watermark, so a nightly export only reads new documents.
+created_at is set before the insert commits, so concurrent requests can
+commit out of order; only documents older than `settle_seconds` are read,
+so the watermark never passes an insert that is still in flight. An index
+on (created_at, _id) keeps the sorted cursor cheap; --create-index builds it.
+
+Usage (from the Backend directory, with the API's MongoDB settings):
+    python -m src.ml.export_predictions
+    python -m src.ml.export_predictions --out src/ml/datasets/predictions --create-index
+    python -m src.ml.train --data src/ml/datasets/predictions
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from src.ml.dataset_cache import append_segment, load_manifest
+from src.ml.inference import AGE_ENCODING, served_age_group
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUT = Path(__file__).parent / "datasets" / "predictions"
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_SEGMENT_ROWS = 100_000
+# Far longer than any request takes between stamping created_at and committing the insert
+DEFAULT_SETTLE_SECONDS = 300.0
+
+PROJECTION = {"_id": 1, "created_at": 1, "input_data": 1, "risk_level": 1, "risk_probability": 1, "age_encoding": 1}
+INPUT_FIELDS = ["Height", "Weight", "Stroke", "HeartDiseaseorAttack", "Sex", "Age"]
+# Class index of each stored risk level, as in RISK_LEVELS in src/api/health_data.py
+RISK_LEVEL_CLASSES = {"No Diabetes": 0, "Prediabetes": 1, "Diabetes": 2}
+COLUMN_DTYPES = {
+    "BMI": np.float32,
+    "Stroke": np.uint8,
+    "HeartDiseaseorAttack": np.uint8,
+    "Sex": np.uint8,
+    "Age": np.uint8,
+    "Diabetes_012": np.uint8,
+    "risk_probability": np.float32,
+    "created_at_ms": np.int64,
+}
+
+
+def watermark_query(watermark: Optional[dict], settled_before: datetime) -> dict:
+    """
+    Documents strictly after the (created_at, _id) watermark, in the cursor's
+    sort order, and created before `settled_before`.
+    """
+    settled = {"created_at": {"$lt": settled_before}}
+    if not watermark:
+        return settled
+    created_at = datetime.fromisoformat(watermark["created_at"])
+    last_id = ObjectId(watermark["_id"])
+    return {"$and": [
+        settled,
+        {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": last_id}},
+        ]},
+    ]}
+
+
+def batch_to_columns(docs: List[dict]) -> Tuple[Dict[str, np.ndarray], int]:
+    """Training columns for a batch of prediction documents, and how many were dropped."""
+    inputs = [doc.get("input_data") or {} for doc in docs]
+    raw = {field: np.array([row.get(field) for row in inputs], dtype=np.float64) for field in INPUT_FIELDS}
+    label = np.array([RISK_LEVEL_CLASSES.get(doc.get("risk_level"), np.nan) for doc in docs], dtype=np.float64)
+    risk_probability = np.array([doc.get("risk_probability") for doc in docs], dtype=np.float64)
+    created_at = np.array([doc["created_at"] for doc in docs], dtype="datetime64[ms]").astype(np.int64)
+    # Scored with the same age encoding as build_feature_matrix applies here
+    encoded = np.array([doc.get("age_encoding") == AGE_ENCODING for doc in docs], dtype=bool)
+
+    # Same BMI and age group as build_feature_matrix: weight / height^2 with height in cm
+    height_m = raw["Height"] / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = raw["Weight"] / (height_m * height_m)
+    columns = {
+        "BMI": bmi,
+        "Stroke": raw["Stroke"],
+        "HeartDiseaseorAttack": raw["HeartDiseaseorAttack"],
+        "Sex": raw["Sex"],
+        "Age": served_age_group(raw["Age"]),
+        "Diabetes_012": label,
+        "risk_probability": risk_probability,
+    }
+    keep = encoded & np.all(np.isfinite(np.column_stack(list(columns.values()))), axis=1)
+    columns["created_at_ms"] = created_at
+    return {name: values[keep].astype(COLUMN_DTYPES[name]) for name, values in columns.items()}, int((~keep).sum())
+
+
+def _watermark(doc: dict) -> dict:
+    return {"created_at": doc["created_at"].isoformat(), "_id": str(doc["_id"])}
+
+
+async def export_predictions(
+    collection,
+    out_dir: Path,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    segment_rows: int = DEFAULT_SEGMENT_ROWS,
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS
+) -> dict:
+    """
+    Append every document after the stored watermark and older than
+    `settle_seconds` to the dataset at out_dir; returns a run report.
+    """
+    manifest = load_manifest(out_dir)
+    state = dict(manifest["state"])
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+    query = watermark_query(state.get("watermark"), settled_before)
+    cursor = collection.find(query, PROJECTION, batch_size=batch_size)
+    cursor = cursor.sort([("created_at", 1), ("_id", 1)])
+
+    report = {"documents": 0, "rows": 0, "dropped": 0, "segments": 0}
+    pending: List[Dict[str, np.ndarray]] = []
+    pending_rows = 0
+    docs: List[dict] = []
+
+    def flush_segment():
+        nonlocal pending, pending_rows
+        arrays = {name: np.concatenate([part[name] for part in pending]) for name in COLUMN_DTYPES}
+        state["exported_rows"] = state.get("exported_rows", 0) + pending_rows
+        append_segment(out_dir, arrays, state)
+        report["segments"] += 1
+        pending, pending_rows = [], 0
+
+    def convert_batch():
+        nonlocal docs, pending_rows
+        columns, dropped = batch_to_columns(docs)
+        pending.append(columns)
+        pending_rows += len(columns["BMI"])
+        report["documents"] += len(docs)
+        report["rows"] += len(columns["BMI"])
+        report["dropped"] += dropped
+        state["dropped_documents"] = state.get("dropped_documents", 0) + dropped
+        # Dropped documents advance the watermark too, so they are not read again
+        state["watermark"] = _watermark(docs[-1])
+        docs = []
+
+    async for doc in cursor:
+        docs.append(doc)
+        if len(docs) >= batch_size:
+            convert_batch()
+            if pending_rows >= segment_rows:
+                flush_segment()
+    if docs:
+        convert_batch()
+    if pending:
+        flush_segment()
+
+    report["watermark"] = state.get("watermark")
+    report["total_rows"] = load_manifest(out_dir)["rows"]
+    return report
+
+
+async def _run(args) -> dict:
+    from src.core.database import Database
+
+    await Database.connect_to_database()
+    try:
+        collection = Database.get_database().predictions
+        if args.create_index:
+            await collection.create_index([("created_at", 1), ("_id", 1)])
+        return await export_predictions(
+            collection, Path(args.out), args.batch_size, args.segment_rows, args.settle_seconds
+        )
+    finally:
+        await Database.close_database_connection()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Append new stored predictions to the retraining dataset.")
+    parser.add_argument("--out", default=str(DEFAULT_OUT), help="Segmented dataset directory")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Documents per cursor batch")
+    parser.add_argument("--segment-rows", type=int, default=DEFAULT_SEGMENT_ROWS, help="Rows per appended segment")
+    parser.add_argument("--create-index", action="store_true", help="Create the (created_at, _id) index first")
+    parser.add_argument(
+        "--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+        help="Only export documents created at least this long ago, so inserts still in flight are not skipped"
+    )
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = asyncio.run(_run(args))
+    print(
+        f"Exported {report['rows']} rows from {report['documents']} new documents "
+        f"({report['dropped']} dropped) in {report['segments']} segments in {time.perf_counter() - started:.1f}s; "
+        f"{args.out} now holds {report['total_rows']} rows, watermark {report['watermark']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Harmonize the bundled diabetes datasets into the served feature schema.
+
+configs/harmonize.json maps every source CSV onto the model's features
+(BMI, Stroke, HeartDiseaseorAttack, Sex, Age as the BRFSS 5-year age group)
+and its label (Diabetes_012; sources that only record diabetes yes/no map to
+0 and 2). Each output column is declared as one of:
+
+    {"column": c}                  the source column as a number
+    {"column": c, "map": {...}}    source values (text or numbers) to codes
+    {"constant": v}                a fixed value for features a source does not record
+    "transform": name              a named vectorised conversion (see TRANSFORMS)
+    "range": [lo, hi]              values outside it count as missing
+
+Rows with any missing or unmapped value are dropped and counted. Every
+mapping is a whole-column operation over the source's columnar cache, and
+the sources are processed in parallel. Each harmonized source is cached,
+keyed by its CSV's sha256 and its mapping, so a rebuild only redoes the
+sources that changed. The combined set is written as one CSV (with a Source
+column) plus a JSON report, and its columnar cache is built right away, so
+training can point --data at it. The combined labels must cover every class
+in the schema; only BRFSS records prediabetes, so a set without it is
+refused unless --allow-missing-classes is passed.
+
+Usage (from the Backend directory):
+    python -m src.ml.harmonize
+    python -m src.ml.harmonize --sources diahealth pima
+    python -m src.ml.train --data src/ml/datasets/processed/harmonized.csv
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.ml import array_store
+from src.ml.dataset_cache import build_cache, load_columns
+from src.ml.inference import brfss_age_group, file_sha256
+
+logger = logging.getLogger(__name__)
+
+ML_DIR = Path(__file__).parent
+DEFAULT_CONFIG = ML_DIR / "configs" / "harmonize.json"
+CACHE_DIR = ML_DIR / "datasets" / ".harmonized"
+FORMAT_VERSION = 1
+SOURCE_COLUMN = "Source"
+
+TRANSFORMS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "brfss_age_group": brfss_age_group,
+}
+
+
+def _numeric(series: pd.Series) -> np.ndarray:
+    """The column as float64, with unparseable values as NaN; text columns are parsed once per category."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.to_numeric(pd.Series(series.cat.categories.astype(str)), errors="coerce").to_numpy(np.float64)
+        return _take_by_code(categories, series.cat.codes.to_numpy())
+    return pd.to_numeric(series, errors="coerce").to_numpy(np.float64)
+
+
+def _mapped(series: pd.Series, mapping: Dict[str, float]) -> np.ndarray:
+    """Source values to codes through `mapping`; unmapped values become NaN."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = np.array([mapping.get(str(category), np.nan) for category in series.cat.categories], dtype=np.float64)
+        return _take_by_code(categories, series.cat.codes.to_numpy())
+    keys = np.array([float(key) for key in mapping], dtype=np.float64)
+    values = np.array(list(mapping.values()), dtype=np.float64)
+    numbers = _numeric(series)
+    order = np.argsort(keys)
+    position = np.clip(np.searchsorted(keys[order], numbers), 0, len(keys) - 1)
+    found = keys[order][position] == numbers
+    return np.where(found, values[order][position], np.nan)
+
+
+def _take_by_code(categories: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    # Code -1 marks a missing value
+    return np.where(codes >= 0, categories[np.maximum(codes, 0)], np.nan)
+
+
+def evaluate_column(frame: pd.DataFrame, spec: dict, n_rows: int) -> np.ndarray:
+    """One declared output column as float64, NaN where missing or invalid."""
+    if "constant" in spec:
+        return np.full(n_rows, float(spec["constant"]))
+    series = frame[spec["column"]]
+    values = _mapped(series, spec["map"]) if "map" in spec else _numeric(series)
+    if "transform" in spec:
+        values = TRANSFORMS[spec["transform"]](values)
+    if "range" in spec:
+        low, high = spec["range"]
+        values = np.where((values >= low) & (values <= high), values, np.nan)
+    return values
+
+
+def source_columns(source: dict) -> List[str]:
+    specs = list(source["columns"].values()) + [source["label"]]
+    return sorted({spec["column"] for spec in specs if "column" in spec})
+
+
+def harmonize_source(name: str, source: dict, schema: dict) -> Tuple[pd.DataFrame, dict]:
+    """Apply one source's mapping; returns its rows in the output schema and a report."""
+    started = time.perf_counter()
+    frame = load_columns(ML_DIR / source["path"], source_columns(source))
+    n_rows = len(frame)
+
+    output = {
+        feature: evaluate_column(frame, source["columns"][feature], n_rows)
+        for feature in schema["features"]
+    }
+    target = next(iter(schema["target"]))
+    output[target] = evaluate_column(frame, source["label"], n_rows)
+
+    missing = {column: int(np.isnan(values).sum()) for column, values in output.items()}
+    keep = ~np.any(np.isnan(np.column_stack(list(output.values()))), axis=1)
+    dtypes = {**schema["features"], **schema["target"]}
+    harmonized = pd.DataFrame({column: values[keep].astype(dtypes[column]) for column, values in output.items()})
+
+    report = {
+        "path": source["path"],
+        "source_rows": n_rows,
+        "rows": int(keep.sum()),
+        "dropped_rows": int(n_rows - keep.sum()),
+        "missing_by_column": {column: count for column, count in missing.items() if count},
+        "constant_features": [feature for feature in schema["features"] if "constant" in source["columns"][feature]],
+        "label_counts": {str(int(label)): int(count) for label, count in zip(*np.unique(harmonized[target], return_counts=True))},
+        "seconds": time.perf_counter() - started,
+    }
+    return harmonized, report
+
+
+def source_key(source: dict, schema: dict, source_sha256: str) -> str:
+    fields = {"format_version": FORMAT_VERSION, "source": source, "schema": schema, "sha256": source_sha256}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def load_or_harmonize(name: str, source: dict, schema: dict, cache_dir: Path) -> Tuple[pd.DataFrame, dict]:
+    """A source's harmonized rows from the cache when its CSV and mapping are unchanged, otherwise rebuilt and cached."""
+    key = source_key(source, schema, file_sha256(ML_DIR / source["path"]))
+    path = Path(cache_dir) / name
+    if path.exists():
+        try:
+            arrays, meta = array_store.load_arrays(path, mmap_mode=None)
+            if meta.get("key") == key:
+                return pd.DataFrame(arrays)[meta["columns"]], {**meta["report"], "cached": True}
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Ignoring unreadable harmonized cache {path}")
+
+    harmonized, report = harmonize_source(name, source, schema)
+    array_store.save_arrays(
+        path,
+        {column: harmonized[column].to_numpy() for column in harmonized.columns},
+        {"key": key, "columns": list(harmonized.columns), "report": report}
+    )
+    return harmonized, {**report, "cached": False}
+
+
+def build_training_set(
+    config: dict,
+    names: Optional[List[str]] = None,
+    n_jobs: int = -1,
+    cache_dir: Path = CACHE_DIR,
+    allow_missing_classes: bool = False
+) -> Tuple[pd.DataFrame, Dict[str, dict]]:
+    """
+    Harmonize the enabled sources (or `names`) in parallel and stack them,
+    tagged with their source. Raises if the labels are not exactly the
+    schema's classes; with `allow_missing_classes`, absent classes are only
+    warned about.
+    """
+    sources = config["sources"]
+    if names is None:
+        names = [name for name, source in sources.items() if source.get("enabled", True)]
+    for name in list(names):
+        if not (ML_DIR / sources[name]["path"]).exists():
+            if not sources[name].get("optional", False):
+                raise FileNotFoundError(f"Source {name}: {sources[name]['path']} not found")
+            logger.warning(f"Skipping optional source {name}: {sources[name]['path']} not found")
+            names.remove(name)
+    if not names:
+        raise ValueError("No sources to harmonize")
+
+    workers = max(1, min(len(names), n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(load_or_harmonize, name, sources[name], config["schema"], cache_dir)
+            for name in names
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+    combined = pd.concat([frame for frame, _ in results.values()], ignore_index=True)
+    target = next(iter(config["schema"]["target"]))
+    labels = set(np.unique(combined[target]).tolist())
+    unexpected = sorted(labels - set(config["schema"]["classes"]))
+    if unexpected:
+        raise ValueError(f"{target} has values {unexpected} outside the schema's classes")
+    absent = sorted(set(config["schema"]["classes"]) - labels)
+    if absent:
+        # The API serves a model over every class; only BRFSS records prediabetes
+        message = f"No rows with {target} in {absent}; a model trained on this set will lack those classes"
+        if not allow_missing_classes:
+            raise ValueError(f"{message} (pass --allow-missing-classes to write it anyway)")
+        logger.warning(message)
+    combined[SOURCE_COLUMN] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(names)), [len(frame) for frame, _ in results.values()]),
+        categories=names
+    )
+    return combined, {name: report for name, (_, report) in results.items()}
+
+
+def write_training_set(combined: pd.DataFrame, reports: Dict[str, dict], output: Path) -> Path:
+    """Write the CSV and its report, each renamed into place, then build the CSV's columnar cache."""
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_suffix(".csv.tmp")
+    combined.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output)
+
+    report_path = output.with_suffix(".json")
+    tmp_path = report_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"rows": int(len(combined)), "sha256": file_sha256(output), "sources": reports}, f, indent=2)
+    os.replace(tmp_path, report_path)
+
+    build_cache(output)
+    return output
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Harmonize the bundled datasets into the served feature schema.")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="Source mappings")
+    parser.add_argument("--sources", nargs="+", default=None, help="Sources to include (default: all enabled)")
+    parser.add_argument("--out", default=None, help="Combined CSV (default: the config's output)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel source processes (-1 for all cores)")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR), help="Per-source harmonized cache")
+    parser.add_argument(
+        "--allow-missing-classes", action="store_true",
+        help="Write the set even if some classes have no rows (train.py will still refuse it)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = json.load(f)
+    unknown = set(args.sources or []) - set(config["sources"])
+    if unknown:
+        parser.error(f"Unknown sources: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    combined, reports = build_training_set(
+        config, args.sources, args.n_jobs, Path(args.cache_dir), args.allow_missing_classes
+    )
+    harmonized_seconds = time.perf_counter() - started
+    output = write_training_set(combined, reports, Path(args.out) if args.out else ML_DIR / config["output"])
+
+    for name, report in reports.items():
+        timing = "cached" if report["cached"] else f"{report['seconds']:.2f}s"
+        print(f"  {name:<24} {report['rows']:>8} of {report['source_rows']:>8} rows  ({timing})")
+    print(
+        f"Harmonized {len(combined)} rows from {len(reports)} sources in {harmonized_seconds:.2f}s; "
+        f"wrote {output} in {time.perf_counter() - started - harmonized_seconds:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
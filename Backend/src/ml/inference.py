@@ -0,0 +1,368 @@
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Diabetes_012 labels (No Diabetes, Prediabetes, Diabetes); the API indexes
+# probability columns by them, so every served model must have exactly these
+SERVED_CLASSES = (0, 1, 2)
+# The label behind risk_probability
+DIABETES_CLASS = 2
+# Lower bounds of the BRFSS _AGEG5YR groups 2..13 (group 1 is 18-24, group 13 is 80+)
+BRFSS_AGE_BOUNDS = np.arange(25, 85, 5)
+# How build_feature_matrix encodes Age; stored with every prediction so exports
+# can tell rows scored this way from those scored on age in years
+AGE_ENCODING = "brfss_group"
+
+
+def file_sha256(path: Path) -> str:
+    """Content hash of a model artifact, used to tie derived artifacts to their source."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _forest_proba_fn(forest) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Average the trees' probabilities directly instead of going through
+    RandomForestClassifier.predict_proba, whose joblib dispatch dominates
+    the cost of scoring a handful of rows.
+    """
+    trees = list(forest.estimators_)
+    n_trees = len(trees)
+
+    def predict_proba(X: np.ndarray) -> np.ndarray:
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        proba = trees[0].predict_proba(X32, check_input=False)
+        for tree in trees[1:]:
+            proba += tree.predict_proba(X32, check_input=False)
+        proba /= n_trees
+        return proba
+
+    return predict_proba
+
+
+def _member_proba_fn(estimator) -> Callable[[np.ndarray], np.ndarray]:
+    if type(estimator).__name__ == "RandomForestClassifier":
+        return _forest_proba_fn(estimator)
+    return estimator.predict_proba
+
+
+def ensemble_feature_importance(estimators, weights: np.ndarray, feature_names: List[str]) -> Dict[str, float]:
+    """
+    Voting-weighted average of each member's normalised importance vector.
+
+    Tree members contribute feature_importances_, linear members the mean
+    absolute coefficient (comparable because the inputs are standardised).
+    """
+    total = np.zeros(len(feature_names))
+    total_weight = 0.0
+    for estimator, weight in zip(estimators, weights):
+        if hasattr(estimator, "feature_importances_"):
+            vector = np.abs(np.asarray(estimator.feature_importances_, dtype=np.float64))
+        elif hasattr(estimator, "coef_"):
+            vector = np.abs(np.asarray(estimator.coef_, dtype=np.float64)).reshape(-1, len(feature_names)).mean(axis=0)
+        else:
+            continue
+        if vector.sum() > 0:
+            total += weight * vector / vector.sum()
+            total_weight += weight
+
+    if total_weight == 0:
+        total = np.full(len(feature_names), 1.0 / len(feature_names))
+    else:
+        total /= total_weight
+
+    return dict(sorted(
+        zip(feature_names, total.tolist()),
+        key=lambda x: x[1],
+        reverse=True
+    ))
+
+
+class PreparedModel:
+    """
+    Inference-ready view of a trained soft-voting ensemble, built once at load time.
+
+    Scaling is done with numpy on preallocated per-thread buffers, the members'
+    probabilities are combined with the voting weights in a single pass (the
+    predicted class is its argmax), and the ensemble-wide feature importance is
+    computed and sorted up front.
+
+    An alternative `engine` (any object with predict_proba over raw features,
+    such as a CompiledEnsemble) can replace the member-by-member evaluation.
+    `version` identifies the source artifact (its sha256 when loaded from disk),
+    and `explainer` (an EnsembleExplainer) provides per-row feature contributions.
+    """
+
+    def __init__(
+        self,
+        model,
+        scaler,
+        feature_names: List[str],
+        engine=None,
+        version: Optional[str] = None,
+        explainer=None
+    ):
+        self.model = model
+        self.version = version
+        self.explainer = explainer
+        self.scaler = scaler
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.classes = np.asarray(model.classes_)
+        self.n_classes = len(self.classes)
+
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.std = np.asarray(scaler.scale_, dtype=np.float64)
+
+        estimators = list(model.estimators_)
+        weights = np.ones(len(estimators)) if model.weights is None else np.asarray(model.weights, dtype=np.float64)
+        weights = weights / weights.sum()
+
+        # Column order is fixed by feature_names, so the per-call name check is redundant
+        for estimator in estimators:
+            if "feature_names_in_" in vars(estimator):
+                del estimator.feature_names_in_
+
+        self.members: List[Tuple[str, Callable[[np.ndarray], np.ndarray], float]] = [
+            (name, _member_proba_fn(estimator), float(weight))
+            for (name, _), estimator, weight in zip(model.estimators, estimators, weights)
+        ]
+        self.feature_importance = ensemble_feature_importance(estimators, weights, self.feature_names)
+        self.engine = engine
+        self.engine_name = "ensemble" if engine is None else type(engine).__name__
+        self._local = threading.local()
+
+    @classmethod
+    def from_compiled(cls, compiled, version: Optional[str] = None, explainer=None) -> "PreparedModel":
+        """
+        Serve straight from a (memory-mapped) CompiledEnsemble, without the
+        pickled estimators; only the artifact's metadata is read up front.
+        """
+        prepared = cls.__new__(cls)
+        prepared.model = None
+        prepared.scaler = None
+        prepared.version = version
+        prepared.explainer = explainer
+        prepared.feature_names = list(compiled.feature_names)
+        prepared.n_features = len(prepared.feature_names)
+        prepared.classes = np.asarray(compiled.classes)
+        prepared.n_classes = len(prepared.classes)
+        prepared.mean = np.asarray(compiled.scaler_mean, dtype=np.float64)
+        prepared.std = np.asarray(compiled.scaler_scale, dtype=np.float64)
+        prepared.members = []
+        prepared.feature_importance = dict(compiled.meta["feature_importance"])
+        prepared.engine = compiled
+        prepared.engine_name = type(compiled).__name__
+        prepared._local = threading.local()
+        return prepared
+
+    def _buffers(self):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = (
+                np.empty((1, self.n_features), dtype=np.float64),
+                np.empty((1, self.n_classes), dtype=np.float64)
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def scale(self, X: np.ndarray) -> np.ndarray:
+        # Same operation order as StandardScaler.transform, so results are bit-identical
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.std
+
+    def predict_one(self, row: np.ndarray) -> np.ndarray:
+        """Class probabilities for a single raw feature row."""
+        if self.engine is not None:
+            return self.engine.predict_proba(np.asarray(row, dtype=np.float64)[np.newaxis, :])[0]
+
+        scaled, proba = self._buffers()
+        np.subtract(row, self.mean, out=scaled[0])
+        np.divide(scaled[0], self.std, out=scaled[0])
+
+        proba.fill(0.0)
+        for _, predict_proba, weight in self.members:
+            member_proba = predict_proba(scaled)
+            member_proba *= weight
+            proba += member_proba
+        return proba[0].copy()
+
+    def explain(self, X: np.ndarray) -> Optional[np.ndarray]:
+        """Per-row contributions of each feature to each class probability, (n, n_features, n_classes)."""
+        if self.explainer is None:
+            return None
+        return self.explainer.explain(X)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for an (n, n_features) matrix of raw features."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.engine is not None:
+            return self.engine.predict_proba(X)
+        if X.shape[0] == 1:
+            return self.predict_one(X[0])[np.newaxis, :]
+
+        scaled = self.scale(X)
+        proba = np.zeros((X.shape[0], self.n_classes), dtype=np.float64)
+        for _, predict_proba, weight in self.members:
+            member_proba = predict_proba(scaled)
+            member_proba *= weight
+            proba += member_proba
+        return proba
+
+
+def brfss_age_group(years: np.ndarray) -> np.ndarray:
+    """Age in years to the BRFSS 5-year group (1-13); under 18 is outside the survey and becomes missing."""
+    groups = (np.digitize(years, BRFSS_AGE_BOUNDS) + 1).astype(np.float64)
+    groups[~(years >= 18)] = np.nan
+    return groups
+
+
+def served_age_group(years: np.ndarray) -> np.ndarray:
+    """The Age feature the served model scores for ages in years: the BRFSS group, with under-18s in the youngest."""
+    return brfss_age_group(np.maximum(years, 18))
+
+
+def build_feature_matrix(records) -> np.ndarray:
+    """
+    Build the (n, 5) raw feature matrix from request records (anything with
+    Height, Weight, Stroke, HeartDiseaseorAttack, Sex and Age attributes),
+    computing BMI and the BRFSS age group the models are trained on for all
+    rows at once.
+    """
+    raw = np.array(
+        [
+            (r.Height, r.Weight, r.Stroke, r.HeartDiseaseorAttack, r.Sex, r.Age)
+            for r in records
+        ],
+        dtype=np.float64
+    ).reshape(-1, 6)
+
+    # BMI = weight / height^2, with height converted from cm to m
+    height_m = raw[:, 0] / 100
+    features = np.empty((raw.shape[0], 5), dtype=np.float64)
+    features[:, 0] = raw[:, 1] / (height_m * height_m)
+    features[:, 1:4] = raw[:, 2:5]
+    # Requests give age in years
+    features[:, 4] = served_age_group(raw[:, 5])
+    return features
+
+
+def explain_risk(prepared: PreparedModel, contributions: Optional[np.ndarray]) -> Tuple[Dict[str, float], Optional[float]]:
+    """
+    Return (feature_importance, baseline_risk_probability) for one row: the
+    features' contributions to the Diabetes probability sorted by magnitude,
+    or the model's global importance when per-row explanations are unavailable.
+    """
+    if contributions is None:
+        return prepared.feature_importance, None
+    # Contributions to class 2 (Diabetes), the class behind risk_probability
+    risk = contributions[:, 2]
+    names = prepared.feature_names
+    feature_importance = {names[i]: float(risk[i]) for i in np.argsort(-np.abs(risk), kind="stable")}
+    return feature_importance, float(prepared.explainer.expected_proba[2])
+
+
+def _load_risk_table(model_path: Path, source_sha256: str, max_error: float, fallback=None):
+    """
+    The precomputed risk table for this model, or None if it is missing, stale
+    or too inaccurate. Rows outside the table's domain go to `fallback`.
+    """
+    from src.ml.lookup import RiskTable, table_path_for
+
+    table_path = table_path_for(model_path)
+    if not table_path.exists():
+        logger.warning(f"Risk table {table_path} not found; run `python -m src.ml.lookup` to build it")
+        return None
+
+    risk_table = RiskTable.load(table_path, fallback=fallback)
+    if risk_table.meta.get("source_sha256") != source_sha256:
+        logger.warning(f"Risk table {table_path} was built from a different model artifact")
+        return None
+    if risk_table.max_abs_error is None or risk_table.max_abs_error > max_error:
+        logger.warning(
+            f"Risk table max interpolation error {risk_table.max_abs_error} exceeds "
+            f"RISK_TABLE_MAX_ERROR={max_error}"
+        )
+        return None
+    return risk_table
+
+
+def _build_explainer(model_path: Path, model_data: dict, version: str, compiled=None):
+    """TreeSHAP explainer over the compiled ensemble, or None if the ensemble can't be compiled."""
+    from src.ml.compiled import load_or_compile
+    from src.ml.explain import EnsembleExplainer
+
+    try:
+        if compiled is None:
+            compiled = load_or_compile(model_path, version, model_data)
+        return EnsembleExplainer(compiled)
+    except Exception as e:
+        logger.warning(f"Per-prediction explanations unavailable for {model_path}: {str(e)}")
+        return None
+
+
+def load_prepared_model(
+    model_path: Path,
+    engine: str = "ensemble",
+    table_max_error: float = 0.0,
+    explain: bool = False
+) -> PreparedModel:
+    """
+    Load a joblib training artifact and prepare it for serving with the given engine.
+
+    The "compiled" engine serves from the memory-mapped compiled artifact next
+    to the model and never keeps the unpickled estimators. The "table" engine
+    is only used when its recorded error is within `table_max_error`;
+    otherwise serving falls back to the ensemble, which also scores the rows
+    outside the table's domain. The "cascade" engine runs the members
+    cheapest first with per-row early exit, unless `explain` is set: the
+    TreeSHAP explainer it adds for per-row contributions describes the full
+    vote, so the ensemble is served instead.
+    """
+    import joblib
+
+    model_path = Path(model_path)
+    version = file_sha256(model_path)
+
+    if engine == "compiled":
+        from src.ml.compiled import load_or_compile
+        compiled = load_or_compile(model_path, version)
+        explainer = _build_explainer(model_path, None, version, compiled) if explain else None
+        return PreparedModel.from_compiled(compiled, version=version, explainer=explainer)
+
+    with open(model_path, "rb") as f:
+        model_data = joblib.load(f)
+
+    engine_impl = None
+    if engine == "cascade" and explain:
+        # Explanations add up to the full vote, which an early exit would not return
+        logger.warning("The cascade engine is not used while explanations are enabled; serving the ensemble")
+    elif engine == "cascade":
+        from src.ml.cascade import load_cascade
+        engine_impl = load_cascade(model_path, model_data, version)
+    elif engine == "table":
+        ensemble = PreparedModel(model_data["model"], model_data["scaler"], model_data["feature_names"])
+        engine_impl = _load_risk_table(model_path, version, table_max_error, fallback=ensemble.predict_proba)
+        if engine_impl is None:
+            logger.warning("Falling back to the ensemble inference engine")
+    elif engine != "ensemble":
+        raise ValueError(f"Unknown inference engine: {engine}")
+
+    explainer = _build_explainer(model_path, model_data, version) if explain else None
+
+    return PreparedModel(
+        model_data["model"],
+        model_data["scaler"],
+        model_data["feature_names"],
+        engine=engine_impl,
+        version=version,
+        explainer=explainer
+    )
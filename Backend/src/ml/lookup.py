@@ -0,0 +1,200 @@
+"""
+Precomputed risk lookup table over the served feature space.
+
+Stroke, HeartDiseaseorAttack and Sex are binary and Age is a BRFSS age group
+from 1 to 13 (see inference.served_age_group), so only BMI is continuous. The build step scores every combination
+of the discrete features over a fine BMI grid with the real ensemble and
+stores the probabilities as a float32 table; serving then interpolates
+linearly along BMI with no ML library on the request path.
+
+The BMI grid is a uniform grid plus knots on both sides of every BMI split
+threshold in the tree members, so the trees' jumps fall between two adjacent
+knots instead of being smeared across a grid cell.
+
+The recorded error only holds on the table's domain: BMI within
+[bmi_min, bmi_max] (recorded in the metadata), an integer Age from 1 to 13
+and 0/1 flags. Rows outside it are scored by the `fallback` predict_proba
+(the ensemble, when serving) rather than extrapolated.
+
+Usage:
+    python -m src.ml.lookup --model src/ml/models/diaHealth_012.joblib
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.ml.array_store import container_size, load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+FEATURE_NAMES = ["BMI", "Stroke", "HeartDiseaseorAttack", "Sex", "Age"]
+# BRFSS age groups, which is what the API scores
+AGE_MIN, AGE_MAX = 1, 13
+
+
+class RiskTable:
+    """predict_proba over raw features by table lookup and linear interpolation in BMI."""
+
+    def __init__(self, table: np.ndarray, bmi_knots: np.ndarray, meta: dict, fallback=None):
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported risk table format: {meta.get('format_version')}")
+        # Shape: (Stroke, HeartDiseaseorAttack, Sex, Age, BMI knot, classes)
+        self.table = table
+        self.bmi_knots = bmi_knots
+        self.meta = meta
+        self.max_abs_error = meta.get("max_abs_error")
+        # predict_proba for the rows outside the table's domain
+        self.fallback = fallback
+
+    def in_domain(self, X: np.ndarray) -> np.ndarray:
+        """Mask of the rows on the table's grid, where the recorded error holds."""
+        bmi, age = X[:, 0], X[:, 4]
+        return (
+            np.isin(X[:, 1:4], (0.0, 1.0)).all(axis=1)
+            & (age == np.rint(age)) & (age >= AGE_MIN) & (age <= AGE_MAX)
+            & (bmi >= self.bmi_knots[0]) & (bmi <= self.bmi_knots[-1])
+        )
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        inside = self.in_domain(X)
+        if inside.all():
+            return self._interpolate(X)
+        if self.fallback is None:
+            raise ValueError(f"{int((~inside).sum())} rows are outside the risk table's domain and there is no fallback")
+
+        proba = np.empty((X.shape[0], self.table.shape[-1]), dtype=np.float64)
+        proba[~inside] = self.fallback(X[~inside])
+        if inside.any():
+            proba[inside] = self._interpolate(X[inside])
+        return proba
+
+    def _interpolate(self, X: np.ndarray) -> np.ndarray:
+        stroke = X[:, 1].astype(np.intp)
+        heart = X[:, 2].astype(np.intp)
+        sex = X[:, 3].astype(np.intp)
+        age = X[:, 4].astype(np.intp) - AGE_MIN
+
+        knots = self.bmi_knots
+        bmi = X[:, 0]
+        lower = np.clip(np.searchsorted(knots, bmi, side="right") - 1, 0, len(knots) - 2)
+        fraction = ((bmi - knots[lower]) / (knots[lower + 1] - knots[lower]))[:, np.newaxis]
+
+        below = self.table[stroke, heart, sex, age, lower]
+        above = self.table[stroke, heart, sex, age, lower + 1]
+        return (1 - fraction) * below + fraction * above
+
+    def save(self, path: Path):
+        save_arrays(path, {"table": self.table, "bmi_knots": self.bmi_knots}, self.meta)
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode: Optional[str] = "r", fallback=None) -> "RiskTable":
+        arrays, meta = load_arrays(path, mmap_mode=mmap_mode)
+        return cls(arrays["table"], arrays["bmi_knots"], meta, fallback=fallback)
+
+
+def _grid_rows(bmi_values: np.ndarray) -> np.ndarray:
+    """All (BMI, Stroke, HeartDiseaseorAttack, Sex, Age) rows in table order."""
+    binary = np.array([0.0, 1.0])
+    ages = np.arange(AGE_MIN, AGE_MAX + 1, dtype=np.float64)
+    stroke, heart, sex, age, bmi = np.meshgrid(binary, binary, binary, ages, bmi_values, indexing="ij")
+    return np.column_stack([bmi.ravel(), stroke.ravel(), heart.ravel(), sex.ravel(), age.ravel()])
+
+
+def _score_in_chunks(predict_proba, X: np.ndarray, chunk_rows: int = 20000) -> np.ndarray:
+    return np.concatenate([
+        predict_proba(X[start:start + chunk_rows])
+        for start in range(0, X.shape[0], chunk_rows)
+    ])
+
+
+def bmi_knots(bmi_min: float, bmi_max: float, bmi_step: float, breakpoints=None) -> np.ndarray:
+    """Uniform BMI grid plus, for each split threshold t, knots at t and just above it."""
+    n_uniform = int(round((bmi_max - bmi_min) / bmi_step)) + 1
+    knots = [bmi_min + bmi_step * np.arange(n_uniform)]
+    if breakpoints is not None:
+        breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        breakpoints = breakpoints[(breakpoints >= bmi_min) & (breakpoints < bmi_max)]
+        knots += [breakpoints, np.nextafter(breakpoints, np.inf)]
+    return np.unique(np.concatenate(knots))
+
+
+def build_risk_table(predict_proba, knots: np.ndarray) -> RiskTable:
+    """
+    Score the full discrete grid with `predict_proba` at every BMI knot and
+    measure the table's error at the midpoints between knots, where linear
+    interpolation is furthest from the grid.
+    """
+    grid = _grid_rows(knots)
+    proba = _score_in_chunks(predict_proba, grid)
+    n_classes = proba.shape[1]
+    table = proba.astype(np.float32).reshape(2, 2, 2, AGE_MAX - AGE_MIN + 1, len(knots), n_classes)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "feature_names": FEATURE_NAMES,
+        "bmi_min": float(knots[0]),
+        "bmi_max": float(knots[-1]),
+        "n_bmi_knots": int(len(knots)),
+    }
+    risk_table = RiskTable(table, knots, meta)
+
+    midpoints = _grid_rows((knots[:-1] + knots[1:]) / 2)
+    error = np.abs(risk_table.predict_proba(midpoints) - _score_in_chunks(predict_proba, midpoints))
+    worst = np.unravel_index(error.argmax(), error.shape)[0]
+    meta.update({
+        "max_abs_error": float(error.max()),
+        "mean_abs_error": float(error.mean()),
+        "p99_abs_error": float(np.quantile(error.max(axis=1), 0.99)),
+        "worst_row": midpoints[worst].tolist(),
+    })
+    return risk_table
+
+
+def table_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(".risk_table")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute the risk lookup table for the served ensemble.")
+    parser.add_argument("--model", default=str(Path(__file__).parent / "models" / "diaHealth_012.joblib"))
+    parser.add_argument("--out", default=None, help="Output directory (default: <model>.risk_table)")
+    parser.add_argument("--bmi-min", type=float, default=10.0)
+    parser.add_argument("--bmi-max", type=float, default=100.0)
+    parser.add_argument("--bmi-step", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    from src.ml.compiled import compile_ensemble
+    from src.ml.inference import file_sha256, load_prepared_model
+
+    model_path = Path(args.model)
+    out_path = Path(args.out) if args.out else table_path_for(model_path)
+
+    print(f"Loading {model_path}...")
+    prepared = load_prepared_model(model_path)
+
+    # Tree split points on BMI become extra knots
+    compiled = compile_ensemble(prepared.model, prepared.scaler, prepared.feature_names)
+    knots = bmi_knots(args.bmi_min, args.bmi_max, args.bmi_step, compiled.split_thresholds(0))
+
+    started = time.perf_counter()
+    risk_table = build_risk_table(prepared.predict_proba, knots)
+    risk_table.meta["source_sha256"] = file_sha256(model_path)
+    print(f"Built table {risk_table.table.shape} in {time.perf_counter() - started:.1f}s")
+    print(json.dumps({k: v for k, v in risk_table.meta.items() if "error" in k or k == "worst_row"}, indent=2))
+
+    risk_table.save(out_path)
+    print(f"Saved risk table to {out_path} ({container_size(out_path) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,27 +5,25 @@ import xgboost as xgb
 import joblib
 import logging
 from pathlib import Path
-from typing import Dict, List, Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
+
+from src.ml.registry import ModelRegistry
 
 logger = logging.getLogger(__name__)
 
 class DiabetesRiskModel:
-    def __init__(self):
+    def __init__(self, model_path: Optional[str] = None):
         self.model = None
         self.scaler = None
         self.feature_names = None
-        self.load_model()
-        
-    def load_model(self) -> None:
-        """Load the trained model and scaler from disk."""
-        model_path = Path(__file__).parent / "models" / "diabetes_risk_model.joblib"
-        if not model_path.exists():
-            raise FileNotFoundError(f"Model file not found at {model_path}")
         
-        model_data = joblib.load(model_path)
-        self.model = model_data['rf_model']
-        self.scaler = model_data['scaler']
-        self.feature_names = model_data['feature_names']
+        # Default to the latest versioned artifact, the same one the API serves
+        if model_path is None:
+            artifacts = ModelRegistry(Path(__file__).parent / "models").scan()
+            if not artifacts:
+                raise FileNotFoundError(f"No model artifact found in {Path(__file__).parent / 'models'}")
+            model_path = list(artifacts.values())[-1]
+        self.load_model(model_path)
         
     def train(self, X: np.ndarray, y: np.ndarray):
         """Train the model with given data."""
@@ -0,0 +1,349 @@
+"""
+Versioned model registry with background loading and hot-swap.
+
+Artifacts are the joblib files in one models directory, named
+`<name>_<NNN>.joblib` (e.g. diaHealth_012.joblib); the highest version number
+is the latest. A background thread rescans the directory, loads and warms up a
+new version off the request path, then swaps it in with a single reference
+assignment. Requests that already hold the previous ModelVersion finish on it.
+
+A distilled student saved next to an artifact (see src.ml.distill) is loaded
+with it and serves the "fast" tier of that version.
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.ml.inference import SERVED_CLASSES, PreparedModel, file_sha256, load_prepared_model
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIX = ".joblib"
+VERSION_PATTERN = re.compile(r"^(?P<name>.+?)_(?P<number>\d+)$")
+
+
+def version_number(path: Path) -> int:
+    match = VERSION_PATTERN.match(Path(path).stem)
+    return int(match.group("number")) if match else -1
+
+
+def _file_stat(path: Path):
+    stat = Path(path).stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _student_stat(path: Path):
+    """Stat of the student artifact next to `path`, or None if there is none."""
+    from src.ml.distill import student_path_for
+
+    student_path = student_path_for(path)
+    return _file_stat(student_path) if student_path.exists() else None
+
+
+class ModelVersion:
+    """One loaded, warmed-up artifact, with its distilled student if it has one."""
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        sha256: str,
+        prepared: PreparedModel,
+        student: Optional[PreparedModel] = None,
+        load_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.path = path
+        self.sha256 = sha256
+        self.file_stat = _file_stat(path)
+        self.student_stat = _student_stat(path)
+        self.prepared = prepared
+        self.student = student
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def tier(self, name: str) -> Tuple[str, PreparedModel]:
+        """(tier actually served, model) for a requested tier; "fast" falls back to "full" without a student."""
+        if name == "fast" and self.student is not None:
+            return "fast", self.student
+        return "full", self.prepared
+
+    def describe(self) -> dict:
+        return {
+            "version": self.name,
+            "sha256": self.sha256,
+            "engine": self.prepared.engine_name,
+            "fast_tier": self.student is not None,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at.isoformat()
+        }
+
+
+class ModelRegistry:
+    """
+    Tracks the versioned artifacts in `models_dir` and the one being served.
+
+    The served version is the pinned one if set, otherwise the latest. The
+    most recent `keep_loaded` versions stay in memory so rollback is instant.
+    """
+
+    def __init__(
+        self,
+        models_dir: Path,
+        engine: str = "ensemble",
+        table_max_error: float = 0.0,
+        native_threads: int = 1,
+        poll_seconds: float = 30.0,
+        keep_loaded: int = 2,
+        explain: bool = False
+    ):
+        self.models_dir = Path(models_dir)
+        self.engine = engine
+        self.table_max_error = table_max_error
+        self.native_threads = native_threads
+        self.poll_seconds = poll_seconds
+        self.keep_loaded = max(1, keep_loaded)
+        self.explain = explain
+
+        self._current: Optional[ModelVersion] = None
+        self._loaded: Dict[str, ModelVersion] = {}
+        self._history: List[str] = []
+        # Version name -> (file stat, error) of the last failed load
+        self._failed: Dict[str, tuple] = {}
+        self.pinned: Optional[str] = None
+        # Why the pinned/latest version isn't being served, if it isn't
+        self.last_error: Optional[str] = None
+
+        # Serialises loads and swaps; readers only touch self._current
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> Optional[ModelVersion]:
+        return self._current
+
+    def scan(self) -> Dict[str, Path]:
+        """Versioned artifacts on disk by version name, oldest first."""
+        from src.ml.distill import STUDENT_SUFFIX
+
+        if not self.models_dir.is_dir():
+            return {}
+        paths = sorted(
+            (path for path in self.models_dir.glob(f"*{ARTIFACT_SUFFIX}") if not path.name.endswith(STUDENT_SUFFIX)),
+            key=lambda path: (version_number(path), path.stat().st_mtime)
+        )
+        return {path.stem: path for path in paths}
+
+    def latest(self) -> Optional[str]:
+        artifacts = self.scan()
+        return next(reversed(artifacts), None) if artifacts else None
+
+    def _warm_up(self, prepared: PreparedModel):
+        """
+        Check the model's classes, then run single-row and batch predictions so
+        first requests don't pay one-off costs.
+        """
+        from src.ml.compiled import synthetic_inputs
+
+        if prepared.classes.tolist() != list(SERVED_CLASSES):
+            raise ValueError(f"Model classes {prepared.classes.tolist()} are not the served classes {list(SERVED_CLASSES)}")
+        rows = synthetic_inputs(64, seed=0)
+        for proba in (prepared.predict_proba(rows[:1]), prepared.predict_proba(rows)):
+            if not np.all(np.isfinite(proba)) or not np.allclose(proba.sum(axis=1), 1.0, atol=1e-3):
+                raise ValueError("Warm-up produced invalid probabilities")
+        prepared.explain(rows)
+
+    def load(self, name: str) -> ModelVersion:
+        """Load and warm up one version, reusing it if the artifact on disk hasn't changed."""
+        path = self.scan().get(name)
+        if path is None:
+            raise KeyError(f"Model version {name} not found in {self.models_dir}")
+
+        # Only rehash when the file was touched since it was loaded
+        loaded = self._loaded.get(name)
+        if loaded is not None and loaded.student_stat == _student_stat(path):
+            if loaded.file_stat == _file_stat(path):
+                return loaded
+            sha256 = file_sha256(path)
+            if loaded.sha256 == sha256:
+                loaded.file_stat = _file_stat(path)
+                return loaded
+        else:
+            sha256 = file_sha256(path)
+
+        from src.ml.executor import pin_model_threads
+
+        started = time.perf_counter()
+        prepared = load_prepared_model(
+            path,
+            engine=self.engine,
+            table_max_error=self.table_max_error,
+            explain=self.explain
+        )
+        pin_model_threads(prepared.model, self.native_threads)
+        self._warm_up(prepared)
+        student = self._load_student(path, sha256)
+        version = ModelVersion(name, path, sha256, prepared, student, load_seconds=time.perf_counter() - started)
+        logger.info(
+            f"Loaded model version {name} ({prepared.engine_name}) "
+            f"in {version.load_seconds:.2f}s"
+        )
+
+        with self._lock:
+            self._loaded[name] = version
+            self._failed.pop(name, None)
+        return version
+
+    def _load_student(self, path: Path, sha256: str) -> Optional[PreparedModel]:
+        """The warmed-up distilled student for the artifact at `path`, or None if it has no usable one."""
+        from src.ml.distill import load_student_report, student_path_for
+        from src.ml.executor import pin_model_threads
+
+        student_path = student_path_for(path)
+        if not student_path.exists():
+            return None
+        try:
+            report = load_student_report(path)
+            if report is None or report.get("teacher_sha256") != sha256:
+                logger.warning(f"Student model {student_path} was distilled from a different artifact; fast tier disabled")
+                return None
+            # The risk table and the cascade only apply to the ensemble
+            engine = "ensemble" if self.engine in ("table", "cascade") else self.engine
+            student = load_prepared_model(student_path, engine=engine, explain=self.explain)
+            pin_model_threads(student.model, self.native_threads)
+            self._warm_up(student)
+            return student
+        except Exception as e:
+            logger.error(f"Failed to load student model {student_path}: {str(e)}; fast tier disabled")
+            return None
+
+    def _activate(self, version: ModelVersion):
+        with self._lock:
+            previous = self._current
+            if previous is version:
+                return
+            self._current = version
+            if version.name in self._history:
+                self._history.remove(version.name)
+            self._history.append(version.name)
+
+            # Drop versions beyond keep_loaded, never the one being served
+            while len(self._loaded) > self.keep_loaded:
+                oldest = next(name for name in self._history + list(self._loaded) if name in self._loaded)
+                if oldest == version.name:
+                    break
+                del self._loaded[oldest]
+                if oldest in self._history:
+                    self._history.remove(oldest)
+
+        logger.info(
+            f"Serving model version {version.name}"
+            + (f" (was {previous.name})" if previous is not None else "")
+        )
+
+    def refresh(self) -> Optional[ModelVersion]:
+        """Serve the pinned or latest version, loading it first if needed."""
+        with self._lock:
+            target = self.pinned or self.latest()
+            path = self.scan().get(target) if target else None
+            if path is None:
+                self.last_error = f"Model version {target} not found" if target else f"No model artifacts found in {self.models_dir}"
+                return self._current
+
+            # Don't retry a broken artifact until it is rewritten
+            failed = self._failed.get(target)
+            if failed is not None and failed[0] == _file_stat(path):
+                return self._current
+
+            try:
+                self._activate(self.load(target))
+                self.last_error = None
+            except Exception as e:
+                logger.error(f"Failed to load model version {target}: {str(e)}")
+                self._failed[target] = (_file_stat(path), str(e))
+                self.last_error = f"Failed to load model version {target}: {str(e)}"
+            return self._current
+
+    def pin(self, name: str) -> ModelVersion:
+        """Serve `name` until unpinned, regardless of newer artifacts."""
+        with self._lock:
+            version = self.load(name)
+            self.pinned = name
+            self._activate(version)
+            return version
+
+    def unpin(self) -> Optional[ModelVersion]:
+        with self._lock:
+            self.pinned = None
+            return self.refresh()
+
+    def rollback(self) -> ModelVersion:
+        """Serve (and pin) the version that was active before the current one."""
+        with self._lock:
+            if len(self._history) < 2:
+                raise LookupError("No previous model version to roll back to")
+            return self.pin(self._history[-2])
+
+    def list_versions(self) -> List[dict]:
+        current = self._current
+        versions = []
+        for name, path in self.scan().items():
+            loaded = self._loaded.get(name)
+            versions.append({
+                "version": name,
+                "path": str(path),
+                "size_bytes": path.stat().st_size,
+                "modified_at": datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat(),
+                "loaded": loaded is not None,
+                "sha256": loaded.sha256 if loaded else None,
+                "active": current is not None and current.name == name,
+                "pinned": self.pinned == name,
+                "error": self._failed[name][1] if name in self._failed else None
+            })
+        return versions
+
+    def _poll(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing model registry: {str(e)}")
+                self.last_error = str(e)
+            if self._stop.wait(self.poll_seconds):
+                return
+
+    def start(self):
+        """
+        Load the initial version, then rescan the models directory every
+        `poll_seconds`, all in a daemon thread so startup doesn't wait for it.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "models_dir": str(self.models_dir),
+            "current": current.describe() if current else None,
+            "pinned": self.pinned,
+            "last_error": self.last_error,
+            "loaded": list(self._loaded),
+            "history": list(self._history),
+            "poll_seconds": self.poll_seconds
+        }
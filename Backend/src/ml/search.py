@@ -0,0 +1,279 @@
+"""
+Successive-halving hyperparameter search for the ensemble members.
+
+Each member is tuned on its own. A fixed, seeded set of candidates is
+sampled from the member's grid in configs/search_space.json (the current
+training config's parameters are always the first candidate). Every round
+scores the surviving candidates with stratified k-fold cross-validation on a
+nested subsample of the training rows, keeps the best 1/eta and multiplies
+the rows by eta, until the last round runs on all rows.
+
+Folds run in parallel across processes. Each fold score is cached on disk,
+keyed by member, parameters, data hash, subsample size and fold, so an
+interrupted search, or one rerun with more candidates or rounds, only
+computes what is missing.
+
+The result is written as a training config (the base config with the
+chosen parameters) that train.py consumes directly.
+
+Usage (from the Backend directory):
+    python -m src.ml.search
+    python -m src.ml.search --members xgboost lightgbm --out src/ml/configs/ensemble.tuned.json
+    python -m src.ml.train --config src/ml/configs/ensemble.tuned.json
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, log_loss
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from src.ml.dataset_cache import dataset_sha256
+from src.ml.train import DEFAULT_CONFIG, ML_DIR, create_member, load_config, total_cores
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPACE = ML_DIR / "configs" / "search_space.json"
+DEFAULT_CACHE_DIR = ML_DIR / "search_cache"
+
+
+def sample_candidates(space: Dict[str, list], base_params: dict, n_candidates: int, seed: int) -> List[dict]:
+    """
+    The base parameters plus up to n_candidates - 1 distinct grid points,
+    drawn with a fixed seed so reruns see the same candidates in the same order.
+    """
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    rng = np.random.default_rng(seed)
+    candidates = [dict(base_params)]
+    for index in rng.permutation(len(grid)):
+        if len(candidates) >= n_candidates:
+            break
+        params = {**base_params, **grid[index]}
+        if params not in candidates:
+            candidates.append(params)
+    return candidates
+
+
+def halving_schedule(n_candidates: int, n_rows: int, min_rows: int, eta: int) -> List[Tuple[int, int]]:
+    """(candidates, rows) per round; the last round always uses every row."""
+    schedule = []
+    candidates, rows = n_candidates, min(min_rows, n_rows)
+    while True:
+        schedule.append((candidates, rows))
+        if rows >= n_rows or candidates <= 1:
+            break
+        candidates = max(1, candidates // eta)
+        rows = min(n_rows, rows * eta)
+    if schedule[-1][1] < n_rows:
+        schedule.append((1, n_rows))
+    return schedule
+
+
+class FoldCache:
+    """One JSON file per fold result, written atomically so parallel or interrupted runs never see partial entries."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(**fields) -> str:
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self.directory / f"{key}.json"
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key: str, result: dict):
+        path = self.directory / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+
+# Training data of the pool worker processes, set once by the initializer
+_worker_data: Tuple[Optional[pd.DataFrame], Optional[np.ndarray]] = (None, None)
+
+
+def _init_worker(X: pd.DataFrame, y: np.ndarray):
+    global _worker_data
+    _worker_data = (X, y)
+
+
+def _score_fold(spec: dict, train_idx: np.ndarray, test_idx: np.ndarray, metric: str) -> dict:
+    """Fit one candidate on one fold (single-threaded) and score it on the held-out part."""
+    X, y = _worker_data
+    started = time.perf_counter()
+    # Fit the scaler on the training part only, as train.py does on all its data
+    scaler = StandardScaler().fit(X.iloc[train_idx])
+    X_train = pd.DataFrame(scaler.transform(X.iloc[train_idx]), columns=X.columns)
+    X_test = pd.DataFrame(scaler.transform(X.iloc[test_idx]), columns=X.columns)
+    with threadpool_limits(limits=1):
+        estimator = create_member(spec, threads=1)
+        estimator.fit(X_train, y[train_idx])
+        proba = estimator.predict_proba(X_test)
+
+    if metric == "neg_log_loss":
+        score = -log_loss(y[test_idx], proba, labels=np.arange(proba.shape[1]))
+    elif metric == "accuracy":
+        score = accuracy_score(y[test_idx], proba.argmax(axis=1))
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+    return {"score": float(score), "seconds": time.perf_counter() - started}
+
+
+def successive_halving(
+    member: str,
+    estimator: str,
+    candidates: List[dict],
+    y: np.ndarray,
+    data_hash: str,
+    search: dict,
+    pool: ProcessPoolExecutor,
+    cache: FoldCache
+) -> Tuple[dict, List[dict]]:
+    """Run the halving rounds for one member; returns the best parameters and a per-round report."""
+    n_folds, eta, metric = search["n_folds"], search["eta"], search["metric"]
+    # Nested subsamples: every round's rows include the previous round's
+    order = np.random.default_rng(search["seed"]).permutation(len(y))
+    schedule = halving_schedule(len(candidates), len(y), search["min_rows"], eta)
+
+    survivors = list(range(len(candidates)))
+    rounds = []
+    for round_index, (n_keep, n_rows) in enumerate(schedule):
+        survivors = survivors[:n_keep]
+        rows = np.sort(order[:n_rows])
+        folds = list(StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=search["seed"]).split(rows, y[rows]))
+
+        started = time.perf_counter()
+        pending = {}
+        scores = {candidate: [None] * n_folds for candidate in survivors}
+        cached = 0
+        for candidate in survivors:
+            for fold, (train_idx, test_idx) in enumerate(folds):
+                key = FoldCache.key(
+                    member=member, estimator=estimator, params=candidates[candidate], data=data_hash,
+                    rows=int(n_rows), fold=fold, n_folds=n_folds, seed=search["seed"], metric=metric
+                )
+                result = cache.get(key)
+                if result is not None:
+                    scores[candidate][fold] = result["score"]
+                    cached += 1
+                    continue
+                spec = {"estimator": estimator, "params": candidates[candidate]}
+                future = pool.submit(_score_fold, spec, rows[train_idx], rows[test_idx], metric)
+                pending[future] = (candidate, fold, key)
+
+        for future, (candidate, fold, key) in pending.items():
+            result = future.result()
+            cache.put(key, result)
+            scores[candidate][fold] = result["score"]
+
+        mean_scores = {candidate: float(np.mean(fold_scores)) for candidate, fold_scores in scores.items()}
+        # Best first; ties keep the earlier (base-first) candidate
+        survivors = sorted(survivors, key=lambda candidate: -mean_scores[candidate])
+        best = survivors[0]
+        rounds.append({
+            "round": round_index,
+            "candidates": len(scores),
+            "rows": int(n_rows),
+            "folds_computed": len(pending),
+            "folds_cached": cached,
+            "seconds": time.perf_counter() - started,
+            "best_score": mean_scores[best],
+            "best_params": candidates[best],
+        })
+        print(
+            f"  {member} round {round_index}: {len(scores)} candidates on {n_rows} rows, "
+            f"{len(pending)} folds computed, {cached} cached, best {metric}={mean_scores[best]:.5f} "
+            f"({time.perf_counter() - started:.1f}s)"
+        )
+
+    return candidates[survivors[0]], rounds
+
+
+def run_search(config: dict, space: dict, members: List[str], cores: int, cache: FoldCache) -> dict:
+    """Tune the given members and return `config` with their chosen parameters and the search report."""
+    from src.ml.train import load_data
+
+    X, y = load_data(config)
+    classes, y_encoded = np.unique(y.to_numpy(), return_inverse=True)
+    data_path = ML_DIR / config["data"]["path"]
+    data_hash = FoldCache.key(
+        file=dataset_sha256(data_path), features=config["data"]["features"], target=config["data"]["target"]
+    )
+
+    tuned = json.loads(json.dumps(config))
+    report = {}
+    with ProcessPoolExecutor(max_workers=cores, initializer=_init_worker, initargs=(X, y_encoded)) as pool:
+        for member in members:
+            spec = config["members"][member]
+            candidates = sample_candidates(
+                space["members"].get(member, {}), spec.get("params", {}), space["n_candidates"], space["seed"]
+            )
+            print(f"Searching {member} ({spec['estimator']}) over {len(candidates)} candidates...")
+            best_params, rounds = successive_halving(
+                member, spec["estimator"], candidates, y_encoded, data_hash, space, pool, cache
+            )
+            tuned["members"][member]["params"] = best_params
+            report[member] = {"score": rounds[-1]["best_score"], "rounds": rounds}
+
+    tuned["search"] = {"metric": space["metric"], "data_sha256": data_hash, "members": report}
+    return tuned
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search over the ensemble members.")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="Base training config")
+    parser.add_argument("--space", default=str(DEFAULT_SPACE), help="Search space and halving settings")
+    parser.add_argument("--data", default=None, help="Override the config's dataset CSV")
+    parser.add_argument("--members", nargs="+", default=None, help="Members to tune (default: all in the config)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel fold processes (-1 for all cores)")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Fold score cache")
+    parser.add_argument("--out", default=str(ML_DIR / "configs" / "ensemble.tuned.json"), help="Tuned training config")
+    args = parser.parse_args(argv)
+
+    config = load_config(Path(args.config))
+    if args.data:
+        config["data"]["path"] = str(Path(args.data).resolve())
+    with open(args.space) as f:
+        space = json.load(f)
+    members = args.members or list(config["members"])
+    unknown = set(members) - set(config["members"])
+    if unknown:
+        parser.error(f"Unknown members: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    tuned = run_search(config, space, members, total_cores(args.n_jobs), FoldCache(Path(args.cache_dir)))
+    print(f"Search finished in {time.perf_counter() - started:.1f}s")
+
+    out_path = Path(args.out)
+    tmp_path = out_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(tuned, f, indent=2)
+    os.replace(tmp_path, out_path)
+    for member in members:
+        print(f"  {member}: {json.dumps(tuned['members'][member]['params'])}")
+    print(f"Wrote tuned training config to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
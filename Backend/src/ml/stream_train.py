@@ -0,0 +1,417 @@
+"""
+Out-of-core ("streaming") training for datasets larger than memory.
+
+The dataset is read through its columnar cache (built from the CSV in
+chunks), whose memory-mapped columns are consumed a chunk of rows at a time:
+
+    scaler               StandardScaler.partial_fit over the chunks
+    XGBoost              ExtMemQuantileDMatrix fed by a DataIter; the quantised
+                         pages live in a temporary on-disk cache
+    LightGBM             Dataset built from a lightgbm.Sequence, which samples
+                         rows for the bin boundaries and then bins one batch at a
+                         time (the binned matrix, one byte per value, stays in memory)
+    logistic regression  the exact LogisticRegression objective minimised with
+                         L-BFGS, accumulating loss and gradient chunk by chunk
+    random forest        grown with warm_start, each group of trees on its own
+                         random sample of at most chunk_rows rows
+    other members        fitted on one random sample of at most sample_rows rows
+
+As in in-memory training, random rows are held out of fitting for the
+cascade calibration; the remaining rows are copied to a temporary columnar
+dataset first.
+
+Members are fitted one after another, each with every core, so only one
+chunk's working set is alive at a time. The boosted members are wrapped in
+their scikit-learn classes and assembled into the same VotingClassifier
+artifact as in-memory training, so the API, the compiled engine and the
+cascade load it unchanged. On data smaller than one chunk, every member sees
+all rows.
+
+Usage (from the Backend directory):
+    python -m src.ml.train --stream
+    python -m src.ml.train --stream --chunk-rows 100000 --data path/to/pooled.csv
+"""
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scipy.optimize import minimize
+from scipy.special import logsumexp, softmax
+from sklearn.ensemble import VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from src.ml import array_store
+from src.ml.cascade import holdout_size
+from src.ml.dataset_cache import open_columns
+from src.ml.train import (
+    ML_DIR, assemble_voting_classifier, check_classes, create_member, publish_model, total_cores
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 250_000
+DEFAULT_SAMPLE_ROWS = 1_000_000
+# Rows per class in the tiny fit that sets up a scikit-learn wrapper before its booster is swapped in
+SHELL_ROWS_PER_CLASS = 20
+
+
+def split_holdout(
+    columns: Dict[str, np.ndarray],
+    n_holdout: int,
+    chunk_rows: int,
+    directory: Path,
+    seed: int = 42
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Set `n_holdout` random rows aside. The other rows are copied chunk by
+    chunk into memory-mapped columns under `directory`; returns those and the
+    held-out rows, which are loaded into memory.
+    """
+    n_rows = len(next(iter(columns.values())))
+    held_out = np.sort(np.random.default_rng(seed).choice(n_rows, size=n_holdout, replace=False))
+    specs = {name: ((n_rows - n_holdout,), column.dtype) for name, column in columns.items()}
+    with array_store.create_arrays(directory, specs, {}) as kept:
+        position = 0
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            keep = np.ones(stop - start, dtype=bool)
+            keep[held_out[np.searchsorted(held_out, start):np.searchsorted(held_out, stop)] - start] = False
+            n_kept = int(keep.sum())
+            for name, column in columns.items():
+                kept[name][position:position + n_kept] = column[start:stop][keep]
+            position += n_kept
+    training, _ = array_store.load_arrays(directory)
+    return training, {name: np.asarray(column[held_out]) for name, column in columns.items()}
+
+
+class ChunkedDataset:
+    """
+    Feature and label columns of a dataset, memory-mapped (from its columnar
+    cache or split_holdout) and read a chunk of rows at a time. The first
+    pass fits the scaler and collects the classes.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], features: List[str], target: str, chunk_rows: int):
+        self.features = list(features)
+        self.columns = [columns[name] for name in features]
+        self.target = columns[target]
+        self.n_rows = len(self.target)
+        self.n_features = len(features)
+        self.chunk_rows = chunk_rows
+
+        self.scaler = StandardScaler()
+        classes = set()
+        for start, stop in self.chunks():
+            self.scaler.partial_fit(self.raw(start, stop))
+            classes.update(np.unique(self.target[start:stop]).tolist())
+        self.classes = np.array(sorted(classes))
+
+    def chunks(self) -> Iterator[Tuple[int, int]]:
+        for start in range(0, self.n_rows, self.chunk_rows):
+            yield start, min(start + self.chunk_rows, self.n_rows)
+
+    def raw(self, start: int, stop: int) -> np.ndarray:
+        return np.column_stack([column[start:stop] for column in self.columns]).astype(np.float64)
+
+    def scaled(self, start: int, stop: int) -> np.ndarray:
+        # What scaler.transform computes, without its per-call validation (LightGBM samples row by row)
+        return (self.raw(start, stop) - self.scaler.mean_) / self.scaler.scale_
+
+    def labels(self, start: int, stop: int) -> np.ndarray:
+        """Labels encoded as class indices, as the members are trained on."""
+        return np.searchsorted(self.classes, self.target[start:stop])
+
+    def take(self, indices: np.ndarray, scaled: bool = True) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Rows at sorted `indices` as a (features, encoded labels) pair."""
+        X = np.column_stack([column[indices] for column in self.columns]).astype(np.float64)
+        if scaled:
+            X = (X - self.scaler.mean_) / self.scaler.scale_
+        return pd.DataFrame(X, columns=self.features), np.searchsorted(self.classes, self.target[indices])
+
+    def sample(self, n_rows: int, seed: int) -> np.ndarray:
+        """Sorted indices of a uniform random sample of at most n_rows rows (all rows if fewer)."""
+        if n_rows >= self.n_rows:
+            return np.arange(self.n_rows)
+        return np.sort(np.random.default_rng(seed).choice(self.n_rows, size=n_rows, replace=False))
+
+    def shell_rows(self) -> np.ndarray:
+        """A few rows of every class, enough to put a scikit-learn wrapper in its fitted state."""
+        found: Dict[int, List[int]] = {index: [] for index in range(len(self.classes))}
+        for start, stop in self.chunks():
+            labels = self.labels(start, stop)
+            for index, rows in found.items():
+                needed = SHELL_ROWS_PER_CLASS - len(rows)
+                if needed > 0:
+                    rows.extend((start + np.flatnonzero(labels == index)[:needed]).tolist())
+            if all(len(rows) >= SHELL_ROWS_PER_CLASS for rows in found.values()):
+                break
+        return np.sort(np.concatenate([np.asarray(rows, dtype=np.int64) for rows in found.values()]))
+
+
+class _XGBoostChunks(xgb.DataIter):
+    """Feeds the scaled chunks to XGBoost, which quantises them into on-disk pages."""
+
+    def __init__(self, dataset: ChunkedDataset, cache_prefix: str):
+        self.dataset = dataset
+        self._chunks = list(dataset.chunks())
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._position == len(self._chunks):
+            return False
+        start, stop = self._chunks[self._position]
+        input_data(
+            data=self.dataset.scaled(start, stop),
+            label=self.dataset.labels(start, stop),
+            feature_names=self.dataset.features
+        )
+        self._position += 1
+        return True
+
+    def reset(self):
+        self._position = 0
+
+
+class _LightGBMRows(lgb.Sequence):
+    """Scaled rows for LightGBM's Dataset construction: random access for sampling, ranges for binning."""
+
+    def __init__(self, dataset: ChunkedDataset):
+        self.dataset = dataset
+        self.batch_size = dataset.chunk_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self.dataset.n_rows)
+            return self.dataset.scaled(start, stop)
+        if isinstance(index, (list, np.ndarray)):
+            return self.dataset.take(np.asarray(index))[0].to_numpy()
+        return self.dataset.scaled(index, index + 1)[0]
+
+    def __len__(self) -> int:
+        return self.dataset.n_rows
+
+
+def _booster_objective(n_classes: int, library: str) -> dict:
+    if library == "xgboost":
+        if n_classes > 2:
+            return {"objective": "multi:softprob", "num_class": n_classes}
+        return {"objective": "binary:logistic"}
+    if n_classes > 2:
+        return {"objective": "multiclass", "num_class": n_classes}
+    return {"objective": "binary"}
+
+
+def _wrap_booster(spec: dict, booster, dataset: ChunkedDataset, threads: int):
+    """
+    The scikit-learn wrapper for a booster trained outside it: the wrapper is
+    fitted for one round on a few rows of every class, which sets its classes
+    and feature metadata, and then given the real booster.
+    """
+    shell = create_member(spec, threads)
+    n_estimators = shell.get_params()["n_estimators"]
+    X, y = dataset.take(dataset.shell_rows())
+    shell.set_params(n_estimators=1)
+    shell.fit(X, y)
+    shell.set_params(n_estimators=n_estimators)
+    shell._Booster = booster
+    return shell
+
+
+def fit_xgboost(spec: dict, dataset: ChunkedDataset, threads: int):
+    params = dict(spec.get("params", {}))
+    rounds = params.pop("n_estimators", 100)
+    params.update(_booster_objective(len(dataset.classes), "xgboost"), nthread=threads)
+    if "random_state" in params:
+        params["seed"] = params.pop("random_state")
+    cache_dir = tempfile.mkdtemp(prefix="xgb-pages-")
+    try:
+        matrix = xgb.ExtMemQuantileDMatrix(
+            _XGBoostChunks(dataset, str(Path(cache_dir) / "cache")), max_bin=params.get("max_bin", 256)
+        )
+        booster = xgb.train(params, matrix, num_boost_round=rounds)
+        del matrix
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return _wrap_booster(spec, booster, dataset, threads)
+
+
+def fit_lightgbm(spec: dict, dataset: ChunkedDataset, threads: int):
+    params = dict(spec.get("params", {}))
+    rounds = params.pop("n_estimators", 100)
+    params.update(_booster_objective(len(dataset.classes), "lightgbm"), num_threads=threads)
+    labels = np.concatenate([dataset.labels(start, stop) for start, stop in dataset.chunks()]).astype(np.float32)
+    train_set = lgb.Dataset(
+        [_LightGBMRows(dataset)], label=labels, feature_name=dataset.features, params={"verbose": -1}
+    )
+    booster = lgb.train(params, train_set, num_boost_round=rounds)
+    return _wrap_booster(spec, booster, dataset, threads)
+
+
+def fit_logistic_regression(spec: dict, dataset: ChunkedDataset) -> LogisticRegression:
+    """
+    Minimise LogisticRegression's L2-penalised multinomial (or binomial) log
+    loss, accumulating the loss and its gradient over the chunks each
+    iteration, so the result matches an in-memory fit up to solver tolerance.
+    """
+    estimator = create_member(spec, 1)
+    C, max_iter, tol = estimator.C, estimator.max_iter, estimator.tol
+    n_classes, n_features = len(dataset.classes), dataset.n_features
+    # Binary problems have one coefficient row; its class-0 logit is fixed at zero
+    n_rows_coef = 1 if n_classes == 2 else n_classes
+
+    def loss_and_gradient(theta: np.ndarray) -> Tuple[float, np.ndarray]:
+        coef = theta[:n_rows_coef * n_features].reshape(n_rows_coef, n_features)
+        intercept = theta[n_rows_coef * n_features:]
+        loss = 0.0
+        grad_coef = np.zeros_like(coef)
+        grad_intercept = np.zeros_like(intercept)
+        for start, stop in dataset.chunks():
+            X, y = dataset.scaled(start, stop), dataset.labels(start, stop)
+            logits = X @ coef.T + intercept
+            if n_classes == 2:
+                logits = np.column_stack([np.zeros(len(X)), logits])
+            loss += float(np.sum(logsumexp(logits, axis=1) - logits[np.arange(len(X)), y]))
+            residual = softmax(logits, axis=1)
+            residual[np.arange(len(X)), y] -= 1.0
+            if n_classes == 2:
+                residual = residual[:, 1:]
+            grad_coef += residual.T @ X
+            grad_intercept += residual.sum(axis=0)
+        loss += 0.5 / C * float(np.sum(coef ** 2))
+        grad_coef += coef / C
+        # Scaled by the row count for conditioning; the minimiser is unchanged
+        return loss / dataset.n_rows, np.concatenate([grad_coef.ravel(), grad_intercept]) / dataset.n_rows
+
+    result = minimize(
+        loss_and_gradient,
+        np.zeros(n_rows_coef * (n_features + 1)),
+        jac=True,
+        method="L-BFGS-B",
+        options={"maxiter": max_iter, "gtol": tol}
+    )
+    if not result.success:
+        logger.warning(f"Streaming logistic regression did not converge: {result.message}")
+
+    estimator.coef_ = result.x[:n_rows_coef * n_features].reshape(n_rows_coef, n_features)
+    estimator.intercept_ = result.x[n_rows_coef * n_features:]
+    estimator.classes_ = np.arange(n_classes)
+    estimator.n_features_in_ = n_features
+    estimator.feature_names_in_ = np.asarray(dataset.features, dtype=object)
+    estimator.n_iter_ = np.array([result.nit], dtype=np.int32)
+    return estimator
+
+
+def fit_random_forest(spec: dict, dataset: ChunkedDataset, threads: int, seed: int = 42):
+    """Grow the forest with warm_start, a group of trees per random sample of at most chunk_rows rows."""
+    estimator = create_member(spec, threads)
+    n_trees = estimator.n_estimators
+    n_groups = min(n_trees, max(1, -(-dataset.n_rows // dataset.chunk_rows)))
+    estimator.set_params(warm_start=True)
+    for group in range(n_groups):
+        indices = dataset.sample(dataset.chunk_rows, seed + group)
+        X, y = dataset.take(indices)
+        if len(np.unique(y)) != len(dataset.classes):
+            raise ValueError("A random forest sample is missing a class; increase chunk_rows")
+        estimator.set_params(n_estimators=n_trees * (group + 1) // n_groups)
+        estimator.fit(X, y)
+    estimator.set_params(warm_start=False)
+    return estimator
+
+
+def fit_on_sample(spec: dict, dataset: ChunkedDataset, threads: int, sample_rows: int, seed: int = 42):
+    """Members without an incremental interface are fitted on a bounded uniform sample."""
+    X, y = dataset.take(dataset.sample(sample_rows, seed))
+    if len(X) < dataset.n_rows:
+        logger.info(f"Fitting {spec['estimator']} on a sample of {len(X)} of {dataset.n_rows} rows")
+    estimator = create_member(spec, threads)
+    with threadpool_limits(limits=threads):
+        estimator.fit(X, y)
+    return estimator
+
+
+def fit_member_streaming(spec: dict, dataset: ChunkedDataset, threads: int, sample_rows: int):
+    estimator = spec["estimator"]
+    if estimator == "XGBClassifier":
+        return fit_xgboost(spec, dataset, threads)
+    if estimator == "LGBMClassifier":
+        return fit_lightgbm(spec, dataset, threads)
+    if estimator == "LogisticRegression":
+        return fit_logistic_regression(spec, dataset)
+    if estimator == "RandomForestClassifier":
+        return fit_random_forest(spec, dataset, threads)
+    return fit_on_sample(spec, dataset, threads, sample_rows)
+
+
+def streaming_accuracy(ensemble: VotingClassifier, dataset: ChunkedDataset) -> float:
+    correct = 0
+    for start, stop in dataset.chunks():
+        X = pd.DataFrame(dataset.scaled(start, stop), columns=dataset.features)
+        correct += int(np.sum(ensemble.predict(X) == dataset.classes[dataset.labels(start, stop)]))
+    return correct / dataset.n_rows
+
+
+def train_model_streaming(config: dict, model_dir: Path = ML_DIR / "models") -> Path:
+    stream = config.get("stream", {})
+    chunk_rows = stream.get("chunk_rows", DEFAULT_CHUNK_ROWS)
+    sample_rows = stream.get("sample_rows", DEFAULT_SAMPLE_ROWS)
+    data = config["data"]
+
+    columns, _ = open_columns(ML_DIR / data["path"], data["features"] + [data["target"]])
+    n_holdout = holdout_size(config, len(columns[data["target"]]))
+    holdout_dir = Path(tempfile.mkdtemp(prefix="stream-holdout-"))
+    try:
+        X_holdout = None
+        if n_holdout:
+            # Rows set aside, unfitted, for calibrating the cascade
+            print(f"Holding out {n_holdout} rows...")
+            columns, held_out = split_holdout(columns, n_holdout, chunk_rows, holdout_dir / "training")
+            X_holdout = np.column_stack([held_out[name] for name in data["features"]]).astype(np.float64)
+        return _train_streaming(config, model_dir, columns, X_holdout, chunk_rows, sample_rows)
+    finally:
+        shutil.rmtree(holdout_dir, ignore_errors=True)
+
+
+def _train_streaming(
+    config: dict,
+    model_dir: Path,
+    columns: Dict[str, np.ndarray],
+    X_holdout: Optional[np.ndarray],
+    chunk_rows: int,
+    sample_rows: int
+) -> Path:
+    data = config["data"]
+    print(f"Scanning data in chunks of {chunk_rows} rows...")
+    dataset = ChunkedDataset(columns, data["features"], data["target"], chunk_rows)
+    print(f"{dataset.n_rows} rows, classes {dataset.classes.tolist()}")
+    check_classes(dataset.classes)
+
+    cores = total_cores(config.get("n_jobs", -1))
+    fitted = []
+    started = time.perf_counter()
+    for name, spec in config["members"].items():
+        member_started = time.perf_counter()
+        fitted.append((name, fit_member_streaming(spec, dataset, cores, sample_rows)))
+        print(f"  {name:<22} {time.perf_counter() - member_started:8.2f}s  (streaming, {cores} threads)")
+    print(f"Fitted ensemble in {time.perf_counter() - started:.2f}s")
+    ensemble_model = assemble_voting_classifier(config, fitted, dataset.classes)
+
+    ensemble_model_data = {
+        'model': ensemble_model,
+        'scaler': dataset.scaler,
+        'feature_names': dataset.features
+    }
+    print(f"Training accuracy: {streaming_accuracy(ensemble_model, dataset):.4f}")
+
+    # The student and the cascade calibration work from a bounded sample of raw rows
+    X_sample, y_sample = dataset.take(dataset.sample(sample_rows, 42), scaled=False)
+    return publish_model(config, ensemble_model_data, model_dir, X_sample, dataset.classes[y_sample], X_holdout)
@@ -1,87 +1,299 @@
+"""
+Train the soft-voting ensemble, distil its fast-tier student and calibrate
+its early-exit cascade, all driven by a JSON config (configs/ensemble.json).
+
+The ensemble members are fitted concurrently in a process pool. Each member
+gets a thread budget so that together they use the configured number of
+cores without oversubscribing them, and the tree members use histogram-based
+split finding (XGBoost tree_method="hist", LightGBM, HistGradientBoosting).
+The members are then assembled into a fitted VotingClassifier, so the saved
+artifact is the same as before. Up to "cascade_holdout_rows" random rows (a
+fifth of the data at most) are kept out of fitting to calibrate the cascade on.
+
+Fitted members are kept in a content-addressed store (see artifacts.py), so
+a run refits only the members whose data, parameters or library versions
+changed, and saves no new version when nothing did. --no-cache fits
+everything afresh.
+
+With --stream (or "stream": {"enabled": true} in the config) training runs
+out of core, reading the data in chunks; see stream_train.py.
+
+Usage (from the Backend directory):
+    python -m src.ml.train
+    python -m src.ml.train --config src/ml/configs/ensemble.json --n-jobs 8
+    python -m src.ml.train --stream --chunk-rows 250000
+"""
+import argparse
 import joblib
+import json
 import pandas as pd
 import numpy as np
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 import xgboost as xgb
 import lightgbm as lgb
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import VotingClassifier
+from sklearn.utils import Bunch
+from threadpoolctl import threadpool_limits
 
 import os
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.ml.artifacts import ArtifactStore, load_lineage, save_lineage, training_lineage
+from src.ml.cascade import calibrate_cascade, calibration_path_for, holdout_size, save_calibration
+from src.ml.dataset_cache import load_columns
+from src.ml.distill import distill_student, save_student, student_path_for, student_report_path_for
+from src.ml.inference import SERVED_CLASSES, file_sha256
 
 # Set random seed for reproducibility
 np.random.seed(42)
 
-def create_ensemble_model(X_train, y_train):
-    # Initialize base models
-    xgb_model = xgb.XGBClassifier(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        random_state=42
-    )
-    
-    lgb_model = lgb.LGBMClassifier(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        random_state=42
-    )
-    
-    rf_model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=5,
-        random_state=42
-    )
-    
-    gb_model = GradientBoostingClassifier(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        random_state=42
-    )
-    
-    lr_model = LogisticRegression(
-        C=1.0,
-        max_iter=1000,
-        random_state=42
-    )
-    
-    # Create voting classifier
-    ensemble = VotingClassifier(
+ML_DIR = Path(__file__).parent
+DEFAULT_CONFIG = ML_DIR / "configs" / "ensemble.json"
+
+ESTIMATORS = {
+    "XGBClassifier": xgb.XGBClassifier,
+    "LGBMClassifier": lgb.LGBMClassifier,
+    "RandomForestClassifier": RandomForestClassifier,
+    "GradientBoostingClassifier": GradientBoostingClassifier,
+    "HistGradientBoostingClassifier": HistGradientBoostingClassifier,
+    "LogisticRegression": LogisticRegression,
+}
+# Estimators that size their own thread pool from n_jobs; the rest are capped with threadpoolctl
+N_JOBS_ESTIMATORS = {"XGBClassifier", "LGBMClassifier", "RandomForestClassifier"}
+# Estimators that fit on a single core whatever their budget
+SINGLE_THREADED_ESTIMATORS = {"GradientBoostingClassifier", "LogisticRegression"}
+
+def _model_versions(model_dir: Path, name: str) -> List[int]:
+    return [
+        int(path.stem.rsplit("_", 1)[1])
+        for path in model_dir.glob(f"{name}_*.joblib")
+        if path.stem.rsplit("_", 1)[1].isdigit()
+    ]
+
+def latest_model_path(model_dir: Path, name: str = "diaHealth") -> Optional[Path]:
+    """The highest versioned artifact, the one the API's model registry serves, or None."""
+    numbers = _model_versions(model_dir, name)
+    return model_dir / f"{name}_{max(numbers):03d}.joblib" if numbers else None
+
+def next_model_path(model_dir: Path, name: str = "diaHealth") -> Path:
+    """Next versioned artifact path (<name>_NNN.joblib); the API's model registry serves the highest."""
+    return model_dir / f"{name}_{max(_model_versions(model_dir, name), default=0) + 1:03d}.joblib"
+
+def load_config(path: Path = DEFAULT_CONFIG) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def total_cores(n_jobs: int) -> int:
+    """Cores available to training: n_jobs if positive, otherwise all of them."""
+    return n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1
+
+def thread_budgets(members: Dict[str, dict], cores: int) -> Dict[str, int]:
+    """
+    Split `cores` between the members fitted side by side. Explicit
+    "threads" in a member's config win; single-threaded estimators get one
+    core and the rest share what is left evenly.
+    """
+    budgets: Dict[str, Optional[int]] = {}
+    for name, spec in members.items():
+        if "threads" in spec:
+            budgets[name] = spec["threads"]
+        elif spec["estimator"] in SINGLE_THREADED_ESTIMATORS:
+            budgets[name] = 1
+        else:
+            budgets[name] = None
+    flexible = [name for name, threads in budgets.items() if threads is None]
+    if flexible:
+        spare = max(cores - sum(threads for threads in budgets.values() if threads), len(flexible))
+        for i, name in enumerate(flexible):
+            budgets[name] = spare // len(flexible) + (1 if i < spare % len(flexible) else 0)
+    return budgets
+
+def create_member(spec: dict, threads: int):
+    """Instantiate one ensemble member from its config entry."""
+    estimator = spec["estimator"]
+    params = dict(spec.get("params", {}))
+    if estimator in N_JOBS_ESTIMATORS:
+        params["n_jobs"] = threads
+    return ESTIMATORS[estimator](**params)
+
+def create_ensemble_model(config: dict, threads: Optional[Dict[str, int]] = None) -> VotingClassifier:
+    """Unfitted VotingClassifier with the configured members (for sequential fitting or inspection)."""
+    threads = threads or {}
+    return VotingClassifier(
         estimators=[
-            ('xgboost', xgb_model),
-            ('lightgbm', lgb_model),
-            ('random_forest', rf_model),
-            ('gradient_boosting', gb_model),
-            ('logistic_regression', lr_model)
+            (name, create_member(spec, threads.get(name, 1)))
+            for name, spec in config["members"].items()
         ],
-        voting='soft'  
+        voting=config.get("voting", "soft"),
+        weights=config.get("weights")
     )
-    
-    
+
+def _fit_member(name: str, estimator, X: pd.DataFrame, y: np.ndarray, threads: int):
+    """Fit one member under its thread budget; runs in a pool worker process."""
+    started = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        estimator.fit(X, y)
+    return name, estimator, time.perf_counter() - started
+
+def fit_members(
+    config: dict,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    cores: int
+) -> Tuple[List[Tuple[str, object]], Dict[str, float]]:
+    """
+    Fit all members concurrently, at most `cores` processes at a time.
+    Returns the fitted (name, estimator) pairs in config order and each
+    member's wall-clock fit time.
+    """
+    members = config["members"]
+    budgets = thread_budgets(members, cores)
+    ensemble = create_ensemble_model(config, budgets)
+
+    fitted: Dict[str, object] = {}
+    timings: Dict[str, float] = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(len(members), cores))) as pool:
+        futures = [
+            pool.submit(_fit_member, name, estimator, X, y, budgets[name])
+            for name, estimator in ensemble.estimators
+        ]
+        for future in futures:
+            name, estimator, seconds = future.result()
+            fitted[name] = estimator
+            timings[name] = seconds
+            print(f"  {name:<22} {seconds:8.2f}s  ({budgets[name]} threads)")
+    return [(name, fitted[name]) for name in members], timings
+
+def assemble_voting_classifier(config: dict, fitted: List[Tuple[str, object]], y: np.ndarray) -> VotingClassifier:
+    """A VotingClassifier in the fitted state VotingClassifier.fit would leave it in."""
+    ensemble = VotingClassifier(
+        estimators=fitted,
+        voting=config.get("voting", "soft"),
+        weights=config.get("weights")
+    )
+    ensemble.le_ = LabelEncoder().fit(y)
+    ensemble.classes_ = ensemble.le_.classes_
+    ensemble.estimators_ = [estimator for _, estimator in fitted]
+    ensemble.named_estimators_ = Bunch(**dict(fitted))
     return ensemble
 
-def load_data():
-    data_path = "./datasets/processed/diabetes_012_health_indicators.csv"
+def load_data(config: dict):
+    data = config["data"]
+    data_path = ML_DIR / data["path"]
     
-    df = pd.read_csv(data_path)
+    # Read from the columnar cache, parsing the CSV only when it is new or changed
+    df = load_columns(data_path, data["features"] + [data["target"]])
     
     # Separate features and target
-    X = df[['BMI', 'Stroke', 'HeartDiseaseorAttack', 'Sex', 'Age']]
-    y = df['Diabetes_012']
+    X = df[data["features"]]
+    y = df[data["target"]]
     
     return X, y
 
-def train_model():
+def check_classes(labels) -> None:
+    """Raise unless the labels are exactly the classes the API serves, before anything is fitted on them."""
+    found = sorted(np.unique(labels).tolist())
+    if found != list(SERVED_CLASSES):
+        raise ValueError(
+            f"Training labels are {found}, but the API serves classes {list(SERVED_CLASSES)}; "
+            "check the dataset (a harmonized set without BRFSS has no prediabetes rows)"
+        )
+
+def publish_model(
+    config: dict,
+    model_data: dict,
+    model_dir: Path,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    X_holdout: Optional[np.ndarray]
+) -> Path:
+    """
+    Save the artifact as the next version, building its sidecars (see
+    build_sidecars) before the artifact itself appears under its final name,
+    so the serving registry never picks up a version without them. If a
+    sidecar fails, nothing is published.
+    """
+    model_dir.mkdir(exist_ok=True)
+    model_path = next_model_path(model_dir)
+    
+    # Write under a temporary name and rename, so the serving registry never sees a partial file
+    print(f"Saving model to {model_path}...")
+    tmp_path = model_path.with_suffix(".joblib.tmp")
+    with open(tmp_path, 'wb') as f:
+        joblib.dump(model_data, f, protocol=4)
+    try:
+        build_sidecars(config, model_data, model_path, file_sha256(tmp_path), X, y, X_holdout)
+        os.replace(tmp_path, model_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        for path in (student_path_for(model_path), student_report_path_for(model_path), calibration_path_for(model_path)):
+            path.unlink(missing_ok=True)
+        raise
+    print("Model saved successfully!")
+    return model_path
+
+def split_holdout(config: dict, X: pd.DataFrame, y: pd.Series) -> Tuple[pd.DataFrame, pd.Series, Optional[np.ndarray]]:
+    """
+    Set aside random rows for calibrating the cascade (see cascade.holdout_size);
+    returns the rows to train on and the held-out raw features, or None when
+    nothing is held out.
+    """
+    n_holdout = holdout_size(config, len(X))
+    if n_holdout == 0:
+        return X, y, None
+    held_out = np.zeros(len(X), dtype=bool)
+    held_out[np.random.default_rng(42).choice(len(X), size=n_holdout, replace=False)] = True
+    return (
+        X[~held_out].reset_index(drop=True),
+        y[~held_out].reset_index(drop=True),
+        X[held_out].to_numpy(dtype=np.float64)
+    )
+
+def fit_members_cached(
+    config: dict,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    cores: int,
+    store: ArtifactStore,
+    keys: Dict[str, str]
+) -> Tuple[List[Tuple[str, object]], Dict[str, float]]:
+    """fit_members for only the members missing from `store` (by their `keys`); the rest are loaded from it."""
+    cached = {name: store.get(keys[name]) for name in config["members"]}
+    for name, estimator in cached.items():
+        if estimator is not None:
+            print(f"  {name:<22}   cached  ({keys[name][:12]})")
+    missing = {name: spec for name, spec in config["members"].items() if cached[name] is None}
+
+    timings: Dict[str, float] = {}
+    if missing:
+        fitted, timings = fit_members({**config, "members": missing}, X, y, cores)
+        for name, estimator in fitted:
+            store.put(keys[name], estimator)
+            cached[name] = estimator
+    return [(name, cached[name]) for name in config["members"]], timings
+
+def train_model(config: dict, model_dir: Path = ML_DIR / "models") -> Path:
+    cache = config.get("artifact_cache", {})
+    lineage = None
+    if cache.get("enabled", True):
+        lineage = training_lineage(config, ML_DIR / config["data"]["path"])
+        latest = latest_model_path(model_dir) if model_dir.exists() else None
+        latest_lineage = load_lineage(latest) if latest else None
+        if latest_lineage and latest_lineage["key"] == lineage["key"]:
+            print(f"Data, members and library versions are unchanged since {latest}; nothing to train")
+            return latest
+
     print("Loading data...")
-    X, y = load_data()
+    X, y = load_data(config)
+    X, y, X_holdout = split_holdout(config, X, y)
+    check_classes(y)
     
     # Scale the features
     scaler = StandardScaler()
@@ -89,192 +301,99 @@ def train_model():
     # Convert to DataFrame to preserve feature names
     X_train_scaled_df = pd.DataFrame(X_train_scaled, columns=X.columns)
     
-    # Create and train ensemble model
-    ensemble_model = create_ensemble_model(X_train_scaled_df, y)
-    ensemble_model.fit(X_train_scaled_df, y)
+    # Fit the members side by side, then assemble the ensemble
+    cores = total_cores(config.get("n_jobs", -1))
+    print(f"Fitting {len(config['members'])} members on {cores} cores...")
+    started = time.perf_counter()
+    label_encoder = LabelEncoder().fit(y)
+    if lineage:
+        store = ArtifactStore(ML_DIR / cache.get("path", "artifact_store"))
+        fitted, timings = fit_members_cached(
+            config, X_train_scaled_df, label_encoder.transform(y), cores, store, lineage["members"]
+        )
+    else:
+        fitted, timings = fit_members(config, X_train_scaled_df, label_encoder.transform(y), cores)
+    wall = time.perf_counter() - started
+    print(f"Fitted ensemble in {wall:.2f}s wall clock ({sum(timings.values()):.2f}s summed over members)")
+    ensemble_model = assemble_voting_classifier(config, fitted, y)
     
     ensemble_model_data = {
         'model': ensemble_model,
         'scaler': scaler,
         'feature_names': list(X.columns)
     }
+    if lineage:
+        ensemble_model_data['lineage'] = lineage
     
     # Calculate and print training accuracy
     train_accuracy = ensemble_model_data['model'].score(X_train_scaled_df, y)
     print(f"Training accuracy: {train_accuracy:.4f}")
     
-    # Save the model and scaler
-    model_dir = Path(__file__).parent / "models"
-    model_dir.mkdir(exist_ok=True)
-    model_path = model_dir / "diaHealth_012.joblib"
+    model_path = publish_model(config, ensemble_model_data, model_dir, X, y.to_numpy(), X_holdout)
+    if lineage:
+        # Written last, so an interrupted run is retrained rather than taken as complete
+        print(f"Lineage saved to {save_lineage(model_path, lineage)}")
+    return model_path
+
+def build_sidecars(
+    config: dict,
+    model_data: dict,
+    model_path: Path,
+    sha256: str,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    X_holdout: Optional[np.ndarray]
+):
+    """
+    Distil the student from raw rows X and labels y, and calibrate the cascade
+    on the held-out raw rows, for the artifact `sha256` at `model_path`.
+    """
+    if config.get("distill", True):
+        # Distil the fast tier from the ensemble's soft probabilities
+        print("Distilling student model...")
+        student_data, report = distill_student(model_data, X, y)
+        print(json.dumps(report, indent=2))
+        student_path = save_student(model_path, sha256, student_data, report)
+        print(f"Student model saved to {student_path}")
     
-    print(f"Saving model to {model_path}...")
-    with open(model_path, 'wb') as f:
-        joblib.dump(ensemble_model_data, f, protocol=4)
-    print("Model saved successfully!")
+    if config.get("calibrate_cascade", True) and X_holdout is None:
+        print("Too few rows to hold any out; the cascade stays uncalibrated and runs the full vote")
+    elif config.get("calibrate_cascade", True):
+        # Calibrate the early-exit cascade (INFERENCE_ENGINE=cascade) on rows the ensemble was not fitted on
+        print(f"Calibrating cascade on {len(X_holdout)} held-out rows...")
+        calibration = calibrate_cascade(model_data, X_holdout)
+        print(json.dumps(calibration["report"], indent=2))
+        calibration_path = save_calibration(model_path, sha256, calibration)
+        print(f"Cascade calibration saved to {calibration_path}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the diabetes risk ensemble from a JSON config.")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="Training config (default: configs/ensemble.json)")
+    parser.add_argument("--data", default=None, help="Override the config's dataset CSV")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Override the config's core budget (-1 for all cores)")
+    parser.add_argument("--model-dir", default=str(ML_DIR / "models"), help="Where to write the versioned artifact")
+    parser.add_argument("--stream", action="store_true", help="Train out of core, reading the data in chunks")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per chunk when streaming")
+    parser.add_argument("--no-cache", action="store_true", help="Fit every member afresh, ignoring the artifact store")
+    args = parser.parse_args(argv)
+
+    config = load_config(Path(args.config))
+    if args.data:
+        config["data"]["path"] = str(Path(args.data).resolve())
+    if args.n_jobs is not None:
+        config["n_jobs"] = args.n_jobs
+
+    if args.chunk_rows is not None:
+        config.setdefault("stream", {})["chunk_rows"] = args.chunk_rows
+    if args.no_cache:
+        config.setdefault("artifact_cache", {})["enabled"] = False
+
+    if args.stream or config.get("stream", {}).get("enabled", False):
+        from src.ml.stream_train import train_model_streaming
+        train_model_streaming(config, Path(args.model_dir))
+    else:
+        train_model(config, Path(args.model_dir))
+    return 0
 
 if __name__ == "__main__":
-    train_model()
-
-
-# from pydoc import cli
-# from statistics import variance
-# import pandas as pd
-# import numpy as np
-# import pandas as pd
-# import numpy as np
-# import seaborn as sns
-# from sklearn.calibration import LabelEncoder
-# import xgboost as xgb
-# import lightgbm as lgb
-# from sklearn.model_selection import train_test_split, GridSearchCV, RandomizedSearchCV, StratifiedKFold
-# from sklearn.preprocessing import OneHotEncoder, StandardScaler, MinMaxScaler
-# from sklearn.impute import KNNImputer, SimpleImputer
-# from sklearn.tree import DecisionTreeClassifier
-# from sklearn.decomposition import PCA
-# from sklearn.feature_selection import RFE, VarianceThreshold
-# from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, AdaBoostClassifier, VotingClassifier
-# from sklearn.linear_model import Lasso, LogisticRegression
-# from sklearn.svm import SVC
-# import joblib
-# import os
-
-
-# data = "diabetes_012_health_indicators.csv"
-
-
-
-
-# def evaluate_model(model, X, y):
-#     skf = StratifiedKFold(n_splits=5)
-#     accuracy, precision, recall, f1, roc_auc, mcc = [], [], [], [], [], []
-    
-#     mean_fpr = np.linspace(0, 1, 100)  # To interpolate ROC curve
-
-#     tprs = []  # Store true positive rates for each fold
-
-#     for train_index, test_index in skf.split(X, y):
-#         X_train, X_test = X[train_index], X[test_index]
-#         y_train, y_test = y[train_index], y[test_index]
-        
-#         model.fit(X_train, y_train)
-        
-#         y_pred = model.predict(X_test)
-#         y_prob = model.predict_proba(X_test)[:, 1]
-
-#         # Compute evaluation metrics
-#         accuracy.append(accuracy_score(y_test, y_pred))
-#         precision.append(precision_score(y_test, y_pred))
-#         recall.append(recall_score(y_test, y_pred))
-#         f1.append(f1_score(y_test, y_pred))
-#         mcc.append(matthews_corrcoef(y_test, y_pred))
-        
-#         # Compute ROC and AUC
-#         fpr, tpr, _ = roc_curve(y_test, y_prob)
-#         roc_auc.append(auc(fpr, tpr))
-
-#         # Interpolate tpr and store it
-#         tprs.append(np.interp(mean_fpr, fpr, tpr))
-#         tprs[-1][0] = 0.0
-
-#     # Plotting the ROC curve
-    
-#     mean_tpr = np.mean(tprs, axis=0)
-#     mean_tpr[-1] = 1.0
-#     mean_auc = auc(mean_fpr, mean_tpr)
-
-
-#     prettytable = PrettyTable(['Accuracy', 'Precision', 'Recall', 'AUC'])
-#     prettytable.add_row([np.mean(accuracy), np.mean(precision), np.mean(recall), np.mean(roc_auc)])
-#     print(prettytable)
-    
-#     cm = conf(y_test, y_pred)
-#     disp = cmd(confusion_matrix=cm)
-#     disp.plot()
-    
-#     return [str(model), np.mean(accuracy), np.mean(precision), np.mean(recall), np.mean(roc_auc)]
-
-
-# def label_encode(data):
-#     label_encoder = LabelEncoder()
-#     for col in data.columns:
-#         if data[col].dtype == 'object':
-#             data[col] = label_encoder.fit_transform(data[col])
-#             mapping = dict(zip(label_encoder.classes_, label_encoder.transform(label_encoder.classes_)))
-#     return data
-
-# def create_ensemble_model(X_train, y_train):
-#     # Initialize base models
-#     xgb_model = xgb.XGBClassifier(
-#         n_estimators=100,
-#         learning_rate=0.1,
-#         max_depth=5,
-#         random_state=42
-#     )
-    
-#     lgb_model = lgb.LGBMClassifier(
-#         n_estimators=100,
-#         learning_rate=0.1,
-#         max_depth=5,
-#         random_state=42
-#     )
-    
-#     rf_model = RandomForestClassifier(
-#         n_estimators=100,
-#         max_depth=5,
-#         random_state=42
-#     )
-    
-#     gb_model = GradientBoostingClassifier(
-#         n_estimators=100,
-#         learning_rate=0.1,
-#         max_depth=5,
-#         random_state=42
-#     )
-    
-#     lr_model = LogisticRegression(
-#         C=1.0,
-#         max_iter=1000,
-#         random_state=42
-#     )
-    
-#     # Create voting classifier
-#     ensemble = VotingClassifier(
-#         estimators=[
-#             ('xgboost', xgb_model),
-#             ('lightgbm', lgb_model),
-#             ('random_forest', rf_model),
-#             ('gradient_boosting', gb_model),
-#             ('logistic_regression', lr_model)
-#         ],
-#         voting='soft'  
-#     )
-    
-#     ensemble.fit(X_train, y_train)
-#     if not os.path.exists('models'):
-#         os.makedirs('models')
-    
-#     print("\nSaving the trained model...")
-#     joblib.dump(ensemble, 'models/diaHealth_012.joblib')
-    
-#     return ensemble
-
-
-# if __name__ == "__main__":
-    
-#       data_set = pd.read_csv(data)
-#       X = data_set[['BMI', 'Stroke', 'HeartDiseaseorAttack', 'Sex', 'Age']]
-#       y = data_set['Diabetes_012']
-#       scaler = StandardScaler()
-#       X = scaler.fit_transform(X)
-
-#       model = create_ensemble_model(X, y)
-# # age,gender,bmi,cardiovascular_disease,stroke,diabetic
-
-
-
-# # BMI,Stroke,HeartDiseaseorAttack,Sex,Age,Diabetes_012
-
-
-
-
+    sys.exit(main())
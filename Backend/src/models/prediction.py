@@ -1,15 +1,24 @@
 from datetime import datetime
-from typing import Dict, Any
-from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict, Field
 from bson import ObjectId
 
 class PredictionCreate(BaseModel):
+    # model_version is a field, not pydantic's model_ namespace
+    model_config = ConfigDict(protected_namespaces=())
+
     user_id: str
     risk_probability: float
     risk_level: str
     confidence_score: float
     feature_importance: Dict[str, float]
     input_data: Dict[str, Any]
+    model_version: Optional[str] = None
+    # "full" (ensemble) or "fast" (distilled student)
+    tier: Optional[str] = None
+    # How input_data's Age was encoded for scoring (src.ml.inference.AGE_ENCODING);
+    # missing on predictions scored on age in years
+    age_encoding: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Prediction(PredictionCreate):
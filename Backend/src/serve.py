@@ -0,0 +1,133 @@
+"""
+Production server: a gunicorn master process with uvicorn workers.
+
+The master imports the app and loads and warms up the served model version
+once, before forking, so every worker starts with the model already in
+memory and shares its pages copy-on-write (the "compiled" engine's arrays are
+also mapped from disk, so they stay shared even after a worker writes nearby
+objects). Each worker then connects to MongoDB and starts the registry poller
+in its own lifespan; the poller finds the preloaded version unchanged on disk
+and keeps serving it. Versions published later are loaded per worker.
+
+The preload runs on a single native thread, since OpenMP thread pools
+started before a fork can deadlock the workers; each worker switches to
+INFERENCE_NATIVE_THREADS once forked.
+
+Signals, sent to the master:
+    HUP          start fresh workers, then stop the old ones gracefully. The
+                 preloaded app and model are kept; new artifacts are still
+                 picked up by each worker's registry poller.
+    TERM         graceful shutdown; workers finish in-flight requests for up
+                 to SERVER_GRACEFUL_TIMEOUT_SECONDS
+    TTIN / TTOU  add / remove one worker
+
+To aggregate /metrics across workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory before starting (see src.core.metrics).
+
+Usage:
+    python -m src.serve
+    python -m src.serve --workers 4 --port 8000
+"""
+import argparse
+import logging
+import multiprocessing
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count(configured: int) -> int:
+    """The configured worker count, or one per CPU core when it is 0."""
+    return configured if configured > 0 else multiprocessing.cpu_count()
+
+
+def _post_fork(server, worker):
+    from src.api.health_data import model_registry
+    from src.ml.executor import limit_native_threads, pin_model_threads
+
+    # The master preloaded single-threaded; this process starts its own native thread pools
+    model_registry.native_threads = settings.INFERENCE_NATIVE_THREADS
+    limit_native_threads(settings.INFERENCE_NATIVE_THREADS)
+    current = model_registry.current
+    if current is not None:
+        pin_model_threads(current.prepared.model, settings.INFERENCE_NATIVE_THREADS)
+        if current.student is not None:
+            pin_model_threads(current.student.model, settings.INFERENCE_NATIVE_THREADS)
+
+
+def _child_exit(server, worker):
+    from src.core.metrics import mark_worker_dead
+    mark_worker_dead(worker.pid)
+
+
+def server_options(workers: int = None, host: str = None, port: int = None) -> dict:
+    """Gunicorn settings from Settings, with optional command line overrides."""
+    return {
+        "bind": f"{host or settings.SERVER_HOST}:{port or settings.SERVER_PORT}",
+        "workers": worker_count(settings.SERVER_WORKERS if workers is None else workers),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "keepalive": settings.SERVER_KEEPALIVE_SECONDS,
+        "backlog": settings.SERVER_BACKLOG,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        "timeout": settings.SERVER_WORKER_TIMEOUT_SECONDS,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "accesslog": "-" if settings.DEBUG else None,
+        "post_fork": _post_fork,
+        # Drops an exited worker's metrics when PROMETHEUS_MULTIPROC_DIR is set
+        "child_exit": _child_exit,
+    }
+
+
+class ProductionServer(BaseApplication):
+    """Gunicorn application that preloads the API and its model in the master process."""
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from src.main import app
+        from src.api.health_data import model_registry
+        from src.ml.executor import limit_native_threads
+
+        # Runs once in the master because preload_app is set. OpenMP thread pools
+        # started here would not exist in the forked workers and can deadlock their
+        # first parallel prediction, so the warm-up runs on one native thread and
+        # each worker restores INFERENCE_NATIVE_THREADS after the fork (_post_fork)
+        model_registry.native_threads = 1
+        limit_native_threads(1)
+        current = model_registry.refresh()
+        if current is None:
+            logger.warning(
+                f"No model loaded before forking workers ({model_registry.last_error}); "
+                f"each worker will keep retrying in the background"
+            )
+        else:
+            logger.info(f"Preloaded model version {current.name} before forking workers")
+        return app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with preloaded model and multiple workers.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: SERVER_WORKERS)")
+    parser.add_argument("--host", default=None, help="Bind address (default: SERVER_HOST)")
+    parser.add_argument("--port", type=int, default=None, help="Bind port (default: SERVER_PORT)")
+    args = parser.parse_args(argv)
+
+    ProductionServer(server_options(args.workers, args.host, args.port)).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())